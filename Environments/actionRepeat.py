@@ -0,0 +1,90 @@
+from typing import Any, SupportsFloat
+
+import gymnasium as gym
+from gymnasium.core import ActType, ObsType
+from gymnasium.wrappers import OrderEnforcing, PassiveEnvChecker, TimeLimit
+
+# wrappers that the fast path may bypass, their checks and the time limit are applied by ActionRepeatWrapper
+_BYPASSED_WRAPPERS = (TimeLimit, OrderEnforcing, PassiveEnvChecker)
+
+
+class ActionRepeatWrapper(gym.Wrapper):
+    """
+    Repeats every action for repeat steps (frame skip) and returns the summed reward.
+    The repetition stops early when the episode terminates or is truncated.
+
+    For envs of the FindTargetEnv family (with a _transition method) the repeated steps only advance the state:
+    the observation, the info dict and the human mode frame are built once per decision, after the last repeated step.
+    The previous distance of the observation is the distance at the previous decision.
+    The time limit of a TimeLimit wrapper counts the repeated steps. Other envs are stepped repeat times.
+    If other wrappers sit between the FindTargetEnv and this wrapper, every repeated step goes through them,
+    the observation still has the previous distance of the previous decision unless a wrapper transforms it.
+    """
+
+    def __init__(self, env: gym.Env, repeat: int = 4):
+        """
+
+        :param env: The env, e.g. gym.make("FindTargetEnv-v0")
+        :param repeat: Number of steps per action
+        """
+        super().__init__(env)
+        assert repeat >= 1
+        self.repeat = repeat
+        self._max_episode_steps = None
+        self._elapsed_steps = 0
+        self._fast = hasattr(env.unwrapped, "_transition")
+        # whether the slow path can rebuild the observation of a FindTargetEnv with the decision distance
+        self._rebuild_obs = self._fast and env.observation_space is env.unwrapped.observation_space
+        wrapper = env
+        while wrapper is not env.unwrapped:
+            if not isinstance(wrapper, _BYPASSED_WRAPPERS):
+                # another wrapper has to see every step
+                self._fast = False
+            if isinstance(wrapper, gym.ObservationWrapper):
+                self._rebuild_obs = False
+            if isinstance(wrapper, TimeLimit):
+                self._max_episode_steps = wrapper._max_episode_steps
+            wrapper = wrapper.env
+
+    def reset(self, **kwargs) -> tuple[ObsType, dict[str, Any]]:
+        self._elapsed_steps = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action: ActType) -> tuple[ObsType, SupportsFloat, bool, bool, dict[str, Any]]:
+        if not self._fast:
+            return self._step_repeatedly(action)
+
+        env = self.env.unwrapped
+        decision_distance = int(env.distance[0])
+        total_reward = 0
+        terminated = truncated = False
+        for repeated in range(1, self.repeat + 1):
+            reward, terminated = env._transition(action)
+            total_reward += reward
+            self._elapsed_steps += 1
+            truncated = self._max_episode_steps is not None and self._elapsed_steps >= self._max_episode_steps
+            if terminated or truncated:
+                break
+        env.previous_distance[0] = decision_distance
+        obs = env._get_obs()
+        info = env._get_step_info(terminated, truncated)
+        info["repeated_steps"] = repeated
+        env._render_frame_for_humans_if_needed()
+        return obs, total_reward, terminated, truncated, info
+
+    def _step_repeatedly(self, action: ActType) -> tuple[ObsType, SupportsFloat, bool, bool, dict[str, Any]]:
+        if self._rebuild_obs:
+            decision_distance = int(self.env.unwrapped.distance[0])
+        total_reward = 0
+        for repeated in range(1, self.repeat + 1):
+            obs, reward, terminated, truncated, info = self.env.step(action)
+            total_reward += reward
+            if terminated or truncated:
+                break
+        if self._rebuild_obs:
+            # the same observation as on the fast path
+            env = self.env.unwrapped
+            env.previous_distance[0] = decision_distance
+            obs = env._get_obs()
+        info["repeated_steps"] = repeated
+        return obs, total_reward, terminated, truncated, info
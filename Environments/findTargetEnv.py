@@ -4,9 +4,7 @@ import gymnasium as gym
 from gymnasium import spaces
 from gymnasium.core import ObsType, ActType, RenderFrame
 
-from rendering import Renderer
 import numpy as np
-import pygame
 
 
 class FindTargetEnv(gym.Env):
@@ -30,13 +28,12 @@ class FindTargetEnv(gym.Env):
                                             shape=observation_shape, 
                                             dtype=int)
 
-        # rendering
-        self.renderer = Renderer(meta_data=self.metadata, grid_size=self.size, render_mode=render_mode)
+        # rendering, the renderer (and pygame) is only loaded when the env is rendered
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        self.render_mode = render_mode
+        self.renderer = None
         self._set_up()
         self._new_episode = False
-        self.renderer = Renderer(
-            meta_data=self.metadata, grid_size=self.size, render_mode=render_mode
-        )
 
     def _set_up(self):
         """
@@ -127,12 +124,23 @@ class FindTargetEnv(gym.Env):
 
     # rendering
 
+    def _get_renderer(self):
+        if self.renderer is None:
+            from rendering import Renderer
+
+            self.renderer = Renderer(
+                meta_data=self.metadata, grid_size=self.size, render_mode=self.render_mode
+            )
+        return self.renderer
+
     def render(self) -> RenderFrame | list[RenderFrame] | None:
-        self.renderer.render(agent_location=self._agent_location, new_episode=self._new_episode, targets=self._targets,
+        if self.render_mode is None:
+            return None
+        return self._get_renderer().render(agent_location=self._agent_location, new_episode=self._new_episode, targets=self._targets,
                              visited_cells_count=self._counted_positions)
 
     def _render_frame(self):
-        return self.renderer.render_frame(
+        return self._get_renderer().render_frame(
             agent_location=self._agent_location,
             new_episode=self._new_episode,
             targets=self._targets,
@@ -140,7 +148,9 @@ class FindTargetEnv(gym.Env):
         )
 
     def _render_frame_for_humans_if_needed(self):
-        return self.renderer.render_frame_for_humans_if_needed(
+        if self.render_mode != "human":
+            return None
+        return self._get_renderer().render_frame_for_humans_if_needed(
             agent_location=self._agent_location,
             new_episode=self._new_episode,
             targets=self._targets,
@@ -154,6 +164,5 @@ class FindTargetEnv(gym.Env):
             self._counted_positions[position] = 1
 
     def close(self):
-        if self.renderer.window is not None:
-            pygame.display.quit()
-            pygame.quit()
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()
\ No newline at end of file
@@ -4,16 +4,114 @@ import gymnasium as gym
 from gymnasium import spaces
 from gymnasium.core import ObsType, ActType, RenderFrame
 
-from rendering import Renderer
 import numpy as np
-import pygame
+
+from Environments import stepKernels
+from Environments.gridMaps import MAP_KINDS, DistanceFieldCache, generate_map
+from Environments.observationEncoding import ObservationEncoder
+
+
+# "step": info on every step, "episode_end": only on the step that terminates the episode, "none": never
+INFO_MODES = ("step", "episode_end", "none")
+
+# Bytes of target grids an env caches for the layouts of its layout bank
+LAYOUT_CACHE_BYTES = 64 * 2**20
 
 
 class FindTargetEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
 
-    def __init__(self, size:int = 5, render_mode=None):
-        self.size = size
+    def __init__(
+        self,
+        size: int = 5,
+        render_mode=None,
+        copy_obs: bool = True,
+        render_backend: str = "pygame",
+        window_size: int = 512,
+        num_targets: int = 1,
+        target_rewards: int | list[int] = 10,
+        target_velocity: float = 0.0,
+        target_direction: tg.DirectionType | None = None,
+        step_backend: str = "numpy",
+        obs_encoding: str = "full",
+        obs_dtype: str = "int64",
+        view_radius: int = 2,
+        recent_positions: int = 8,
+        layout_bank: int | np.ndarray | None = None,
+        layout_seed: int | None = None,
+        layout_order: str = "random",
+        map_kind: str = "empty",
+        wall_density: float = 0.2,
+        map_seed: int = 0,
+        num_maps: int = 1,
+        distance_shaping: float = 0.0,
+        max_size: int | None = None,
+        info_mode: str = "step",
+    ):
+        """
+
+        :param size: The size of the grid in cells (e.g. 5)
+        :param render_mode: "human", "rgb_array" or None
+        :param copy_obs: If False, reset and step return the internal observation buffer instead of a copy
+        :param render_backend: "pygame" or "numpy" (pygame free, only for render_mode "rgb_array")
+        :param window_size: The size of the rendered window / frames in pixels
+        :param num_targets: Number of targets, the episode terminates when all targets are collected
+        :param target_rewards: Reward for collecting a target, one value for all targets or one per target
+        :param target_velocity: Velocity of the targets (see target.Target), 0 for static targets
+        :param target_direction: Movement of the targets, None for a random moving direction per target
+        :param step_backend: "numpy" or "numba" (JIT compiled step, falls back to numpy if Numba is not installed)
+        :param obs_encoding: "full" (visit counts of all cells), "window" (visit counts around the agent)
+            or "recent" (the last cells the agent left), see ObservationEncoder
+        :param obs_dtype: "int64", "int16" or "uint8", compact dtypes saturate the visit counts
+        :param view_radius: Radius of the "window" encoding
+        :param recent_positions: Number of positions of the "recent" encoding
+        :param layout_bank: Number of start layouts (target and agent positions) that are sampled up front,
+            or a (num_layouts, num_targets + 1, 2) array of layouts (agent last, e.g. from sample_layouts).
+            reset then draws a layout from the bank instead of sampling one. None samples a new layout every reset
+        :param layout_seed: Seed of a sampled bank. If None, the bank is sampled again from the seed passed to reset
+        :param layout_order: "random" (draw a random layout every reset) or "sequential" (cycle through the bank,
+            from the start after every seeded reset), options={"layout_index": i} selects a layout directly
+        :param map_kind: "empty", "obstacles" or "maze", see gridMaps.generate_map. On maps with walls the distance
+            is the shortest path length around the walls (a cached BFS distance field)
+        :param wall_density: Fraction of wall cells of "obstacles" maps
+        :param map_seed: Seed of the first map
+        :param num_maps: Number of maps (seeds map_seed ... map_seed + num_maps - 1), every reset draws one of them
+        :param distance_shaping: Adds distance_shaping * (previous distance - distance) to the reward of every step
+        :param max_size: Largest grid size of a curriculum (see set_curriculum). The observations always have the
+            shape of a max_size grid, a smaller grid is its top left corner and the cells around it are walls
+        :param info_mode: "step" (the info dict of every step has the distance), "episode_end" (only the step that
+            ends the episode, truncations need the time limit from set_time_limit) or "none".
+            The other steps return an empty dict, which saves building and merging dicts in vectorized envs.
+            reset always returns the full info
+        """
+        assert map_kind in MAP_KINDS
+        assert info_mode in INFO_MODES
+        self.info_mode = info_mode
+        # the time limit of the TimeLimit wrapper (see set_time_limit) and the steps of the current episode
+        self.time_limit = None
+        self._elapsed_steps = 0
+        if max_size is not None and max_size < size:
+            raise ValueError("max_size must not be smaller than size")
+        if map_kind != "empty" and target_velocity != 0:
+            raise ValueError("Moving targets are only supported on empty maps")
+        if num_maps > 1 and layout_bank is not None:
+            raise ValueError("A layout bank needs a single map (num_maps=1)")
+        # size of the grid of the observations and the active grid of the current curriculum stage
+        self.size = size if max_size is None else max_size
+        self.active_size = size
+        self.max_size = max_size
+        self.map_kind = map_kind
+        self.wall_density = wall_density
+        self.map_seed = map_seed
+        self.num_maps = num_maps
+        self.distance_shaping = distance_shaping
+        self._distance_fields = DistanceFieldCache()
+        self._pending_curriculum = None
+        self.num_targets = num_targets
+        self._build_maps()
+        self.target_rewards = target_rewards
+        self.target_velocity = target_velocity
+        self.target_direction = target_direction
         # define the action space
         self.action_space = spaces.Discrete(4)
         # The actions are mapped to left, right, up, down
@@ -22,64 +120,333 @@ class FindTargetEnv(gym.Env):
             1: np.array([0, -1]), 
             2: np.array([1,0]), 
             3: np.array([-1, 0])}
+        self._use_numba = stepKernels.use_numba(step_backend)
+        self._action_directions = [tuple(int(d) for d in self.action_to_direction[a]) for a in range(4)]
 
-        self.previous_distance = np.array([0])
-        self.distance = np.array([0])
-        
         #observation space
-        observation_shape = (2 + self.size**2 +2,)
-        self.observation_space = spaces.Box(low=0, 
-                                            high=25,
-                                            shape=observation_shape, 
-                                            dtype=int)
+        self._encoder = ObservationEncoder(
+            self.size,
+            encoding=obs_encoding,
+            dtype=obs_dtype,
+            view_radius=view_radius,
+            recent_positions=recent_positions,
+            max_distance=self._max_distance(),
+        )
+        self.observation_space = self._encoder.observation_space
+        # the full int64 observation is the internal state buffer itself and needs no encoding
+        self._encode_obs = obs_encoding != "full" or obs_dtype != "int64"
 
-        # rendering
-        self.renderer = Renderer(meta_data=self.metadata, grid_size=self.size, render_mode=render_mode)
+        # The state is kept in the full observation buffer, memory and distances are views into it
+        observation_shape = (2 + self.size**2 + 2,)
+        self.copy_obs = copy_obs
+        self._obs = np.zeros(observation_shape, dtype=int)
+        self._memory = self._obs[2 : 2 + self.size**2].reshape(self.size, self.size)
+        self.distance = self._obs[-2:-1]
+        self.previous_distance = self._obs[-1:]
+
+        # rendering, the renderer (and pygame) is only loaded when the env is rendered
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        assert render_backend in ("pygame", "numpy")
+        assert render_backend == "pygame" or render_mode in (None, "rgb_array")
+        self.render_mode = render_mode
+        self.render_backend = render_backend
+        self.window_size = window_size
+        self.renderer = None
+
+        assert layout_order in ("random", "sequential")
+        self.layout_seed = layout_seed
+        self.layout_order = layout_order
+        self._layout_bank_size = None
+        self._layouts = None
+        if isinstance(layout_bank, (int, np.integer)):
+            self._layout_bank_size = int(layout_bank)
+            self._sample_layout_bank(np.random.default_rng(layout_seed))
+        elif layout_bank is not None:
+            layouts = np.array(layout_bank, dtype=int)
+            if layouts.ndim != 3 or layouts.shape[1:] != (num_targets + 1, 2):
+                raise ValueError(f"layout_bank must have the shape (num_layouts, {num_targets + 1}, 2)")
+            layouts.flags.writeable = False
+            self._layouts = layouts
+        self._layout_cursor = 0
+        self._layout_index = None
+        # target grids of the start layouts of the bank (the same for every reset to a layout)
+        self._layout_cache = {}
+        self._layout_cache_bytes = 0
+
+        self._targets = None
         self._set_up()
         self._new_episode = False
-        self.renderer = Renderer(
-            meta_data=self.metadata, grid_size=self.size, render_mode=render_mode
-        )
 
-    def _get_distance(self) -> np.ndarray:
-        return np.expand_dims(int(np.linalg.norm(self._agent_location - self._targets[0].position, ord=1)), axis=0)
+    def _build_maps(self):
+        """
+        Generates (or takes from the cache) the maps of the current grid size
+        """
+        self._maps = [
+            generate_map(self.active_size, self.map_kind, self.map_seed + i, self.wall_density, self.size)
+            for i in range(self.num_maps)
+        ]
+        free_cells = min(len(grid_map.free_cells) for grid_map in self._maps)
+        if self.num_targets >= free_cells:
+            raise ValueError(f"num_targets must be smaller than the number of free cells ({free_cells})")
+        # walls of the map itself or around a grid that is smaller than max_size
+        self._has_walls = self.map_kind != "empty" or self.active_size < self.size
+        self._map = self._maps[0]
+        self._walls = self._map.walls
+
+    def _max_distance(self) -> int | None:
+        """
+        :return: Bound of the distances in the observation, None for the L1 diameter of the grid
+        """
+        if self.map_kind == "empty":
+            # the L1 distance within the active square
+            return None
+        if self.max_size is None:
+            # a shortest path around walls visits every free cell at most once
+            return max(len(grid_map.free_cells) for grid_map in self._maps) - 1
+        return self.size**2 - 1
+
+    def set_time_limit(self, max_episode_steps: int | None):
+        """
+        Tells the env the time limit of its TimeLimit wrapper (gym.make does not pass it to the env),
+        so that info_mode "episode_end" also builds the info of the step that truncates the episode.
+        None only builds it on terminations
+        """
+        assert max_episode_steps is None or max_episode_steps >= 1
+        self.time_limit = max_episode_steps
 
-    def _set_up(self):
+    def set_curriculum(
+        self, size: int | None = None, num_targets: int | None = None, target_velocity: float | None = None
+    ):
+        """
+        Changes the grid size, the number of targets and the target velocity from the next reset on,
+        e.g. from curriculum.CurriculumCallback through env_method("set_curriculum", ...) in live worker processes.
+        The observation space does not change, sizes up to max_size use the top left corner of the max_size grid.
+        None keeps the current value
+        """
+        size = self.active_size if size is None else size
+        num_targets = self.num_targets if num_targets is None else num_targets
+        target_velocity = self.target_velocity if target_velocity is None else target_velocity
+        if size > self.size:
+            raise ValueError(f"size must not be larger than max_size ({self.size})")
+        if self.map_kind != "empty" and target_velocity != 0:
+            raise ValueError("Moving targets are only supported on empty maps")
+        if num_targets >= size**2:
+            raise ValueError(f"num_targets must be smaller than the number of cells ({size**2})")
+        if not np.isscalar(self.target_rewards) and num_targets != self.num_targets:
+            raise ValueError("Changing the number of targets needs a single target reward for all targets")
+        if self._layouts is not None and self._layout_bank_size is None and size != self.active_size:
+            raise ValueError("A given layout bank cannot be used with a different size")
+        self._pending_curriculum = (size, num_targets, target_velocity)
+
+    def _apply_curriculum(self):
+        size, num_targets, target_velocity = self._pending_curriculum
+        self._pending_curriculum = None
+        changed = (size, num_targets) != (self.active_size, self.num_targets)
+        self.active_size, self.num_targets, self.target_velocity = size, num_targets, target_velocity
+        # the targets are created again with the new count and velocity
+        self._targets = None
+        if changed:
+            self._build_maps()
+            if self._layout_bank_size is not None:
+                self._sample_layout_bank(self.np_random)
+
+    def _get_distance(self) -> int:
+        if self._distance_from_positions:
+            # moving targets on an empty map: the L1 distance to the nearest target, O(num_targets)
+            positions = self._targets.positions
+            on_grid = ((positions >= 0) & (positions < self.size)).all(axis=1)
+            if not on_grid.any():
+                return int(self.distance[0])
+            return int(np.abs(positions[on_grid] - self._agent_location).sum(axis=1).min())
+        return int(self._distance_field[self._agent_location[0], self._agent_location[1]])
+
+    @property
+    def layouts(self) -> np.ndarray | None:
+        """
+        :return: The read-only (num_layouts, num_targets + 1, 2) layout bank (agent last), or None
+        """
+        return self._layouts
+
+    def _sample_layout_bank(self, rng: np.random.Generator):
+        layouts = sample_layouts(self.size, self.num_targets, self._layout_bank_size, rng, self._map.free_cells)
+        layouts.flags.writeable = False
+        self._layouts = layouts
+        self._layout_cursor = 0
+        self._layout_cache = {}
+        self._layout_cache_bytes = 0
+
+    def _next_layout_index(self) -> int:
+        if self.layout_order == "sequential":
+            index = self._layout_cursor
+            self._layout_cursor = (self._layout_cursor + 1) % len(self._layouts)
+            return index
+        return int(self.np_random.integers(len(self._layouts)))
+
+    def _set_up(self, layout_index: int | None = None):
         """
         Setup the environment
+        :param layout_index: The layout of the bank to start from, None to draw one (or sample one without bank)
         :return:
         """
-        self._setup_targets()
-
-        # Randomly sample the agent's location until it does not match any of the target's locations.
-        self._agent_location = self._targets[0].position
-        positions = [target.position for target in self._targets]
-        while np.any(np.all(self._agent_location == positions, axis=1)):
-            self._agent_location = self.np_random.integers(
-                0, self.size, size=2, dtype=int
-            )
+        if len(self._maps) > 1:
+            self._map = self._maps[self.np_random.integers(len(self._maps))]
+            self._walls = self._map.walls
+        if self._layouts is not None:
+            if layout_index is None:
+                layout_index = self._next_layout_index()
+            positions = self._layouts[layout_index]
+        else:
+            # Sample distinct free cells for the targets and the agent
+            free_cells = self._map.free_cells if self._has_walls else self.size**2
+            cells = self.np_random.choice(free_cells, size=self.num_targets + 1, replace=False)
+            positions = np.stack(np.divmod(cells, self.size), axis=1)
+            layout_index = None
+        self._layout_index = layout_index
+        self._setup_targets(positions[:-1])
+        self._agent_location = positions[-1].copy()
+        if layout_index is None:
+            self._update_target_index()
+        else:
+            self._restore_target_index(layout_index)
 
-        self.distance = self.previous_distance = self._get_distance()
+        self.distance[0] = self.previous_distance[0] = self._get_distance()
+        self._elapsed_steps = 0
+        self._memory.fill(0)
+        self._encoder.reset()
 
         # rendering
-        self._counted_positions = {}
         self._new_episode = True
 
 
-    def _setup_targets(self):
+    def _setup_targets(self, positions: np.ndarray):
         """
         Setup the targets in the environment
+        :param positions: The (num_targets, 2) start positions of the targets
         :return:
         """
-        position = self.np_random.integers(0, self.size, size=2, dtype=int)
-        target = tg.Target(
-            color= (255,0,0),
-            reward = 10,
-            position= position,
-            velocity=0.0,
-            movement=tg.Direction(tg.DirectionType.NONE)
-        )
-        self._targets = [target]
+        if self.target_direction is not None:
+            directions = self.target_direction.value
+        elif self.target_velocity > 0:
+            # any direction except NONE and APPEAR
+            directions = self.np_random.integers(
+                tg.DirectionType.UP.value, tg.DirectionType.APPEAR.value, size=self.num_targets
+            )
+        else:
+            directions = tg.DirectionType.NONE.value
+        if self._targets is None:
+            self._targets = tg.TargetStore(
+                positions=positions,
+                rewards=self.target_rewards,
+                velocities=self.target_velocity,
+                directions=directions,
+                colors=(255, 0, 0),
+            )
+        else:
+            self._targets.reset(positions, directions)
+        self._targets_left = self.num_targets
+        self._moving_targets = bool((self._targets.steps_per_timestep > 0).any())
+        # moving targets keep their grids up to date incrementally and have no distance field
+        self._distance_from_positions = self._moving_targets and self.map_kind == "empty"
+
+    def _update_target_index(self):
+        """
+        Rebuilds the occupancy and reward grids of the targets on the grid
+        and the distance from every cell to the nearest target
+        (L1 on empty maps, the cached shortest path length around the walls otherwise).
+        Moving targets have no distance field, see _get_distance
+        """
+        cells = self._target_cells(self._targets.positions)
+        on_grid = cells >= 0
+        cells = cells[on_grid]
+        self._target_counts = np.bincount(cells, minlength=self.size**2).reshape(self.size, self.size)
+        self._target_reward_grid = np.bincount(
+            cells, weights=self._targets.rewards[on_grid], minlength=self.size**2
+        ).reshape(self.size, self.size)
+        if self._distance_from_positions:
+            # read by the numba step, which is followed by _get_distance
+            self._distance_field = np.zeros((self.size, self.size), dtype=int)
+        elif on_grid.any():
+            if self.map_kind != "empty":
+                self._distance_field = self._distance_fields.get(self._map, cells)
+            else:
+                self._distance_field = _l1_distance_field(self._target_counts > 0)
+
+    def _target_cells(self, positions: np.ndarray) -> np.ndarray:
+        """
+        :return: The flat cell x * size + y of every target, -1 for targets off the grid (collected or not appeared)
+        """
+        on_grid = ((positions >= 0) & (positions < self.size)).all(axis=1)
+        return np.where(on_grid, positions[:, 0] * self.size + positions[:, 1], -1)
+
+    def _add_to_target_index(self, cells: np.ndarray, rewards: np.ndarray, sign: int):
+        """
+        Adds (sign 1) or removes (sign -1) targets from the occupancy and reward grids, O(number of targets)
+        :param cells: Flat cells of the targets, see _target_cells
+        :param rewards: Rewards of the targets
+        """
+        on_grid = cells >= 0
+        np.add.at(self._target_counts.reshape(-1), cells[on_grid], sign)
+        np.add.at(self._target_reward_grid.reshape(-1), cells[on_grid], sign * rewards[on_grid])
+
+    def _restore_target_index(self, layout_index: int):
+        """
+        Sets the target grids of a start layout of the bank, they are computed once per layout
+        (as long as the cache stays below LAYOUT_CACHE_BYTES)
+        """
+        cached = self._layout_cache.get(layout_index)
+        if cached is not None:
+            self._target_counts, self._target_reward_grid, self._distance_field = cached
+        else:
+            self._update_target_index()
+            cached = (self._target_counts, self._target_reward_grid, self._distance_field)
+            nbytes = sum(array.nbytes for array in cached)
+            if self._layout_cache_bytes + nbytes <= LAYOUT_CACHE_BYTES:
+                self._layout_cache[layout_index] = cached
+                self._layout_cache_bytes += nbytes
+        if self._distance_from_positions:
+            # the grids of moving targets are updated in place, the cached grids stay unchanged
+            self._target_counts = self._target_counts.copy()
+            self._target_reward_grid = self._target_reward_grid.copy()
+
+    def _step_targets(self):
+        """
+        Moves the targets one timestep, targets that would leave the grid bounce off the border.
+        Only the grid cells of the targets that moved are updated
+        """
+        positions = self._targets.positions
+        size = self.active_size
+        old_cells = self._target_cells(positions)
+        was_on_grid = ((positions >= 0) & (positions < size)).all(axis=1)
+        self._targets.step(rng=self.np_random, size=size)
+        left_grid = was_on_grid & ((positions < 0) | (positions >= size)).any(axis=1)
+        left_grid &= self._targets.directions != tg.DirectionType.APPEAR.value
+        if left_grid.any():
+            np.clip(positions, 0, size - 1, out=positions, where=left_grid[:, np.newaxis])
+            self._targets.reverse_directions(left_grid)
+        new_cells = self._target_cells(positions)
+        moved = old_cells != new_cells
+        if moved.any():
+            rewards = self._targets.rewards[moved]
+            self._add_to_target_index(old_cells[moved], rewards, -1)
+            self._add_to_target_index(new_cells[moved], rewards, 1)
+
+    def _collect_targets(self) -> int:
+        """
+        Collects all targets on the agent's cell, they are removed from the grid
+        :return: The summed reward of the collected targets
+        """
+        x, y = self._agent_location
+        reward = int(self._target_reward_grid[x, y])
+        hit = (self._targets.positions == self._agent_location).all(axis=1)
+        if self._distance_from_positions:
+            self._add_to_target_index(self._target_cells(self._targets.positions[hit]), self._targets.rewards[hit], -1)
+        self._targets.positions[hit] = -1
+        self._targets.steps_per_timestep[hit] = 0
+        self._targets_left -= int(hit.sum())
+        if not self._distance_from_positions:
+            # the distance field of static targets is rebuilt once per collection
+            self._update_target_index()
+        return reward
 
     def _get_obs(self):
         """
@@ -87,8 +454,9 @@ class FindTargetEnv(gym.Env):
         Must match the observation space defined in init
         :return: The agent's observation'
         """
-
-        return np.concatenate((self._agent_location, self.get_memory().flatten(), self.distance, self.previous_distance))
+        self._obs[0:2] = self._agent_location
+        obs = self._encoder.encode(self._obs, self._memory) if self._encode_obs else self._obs
+        return obs.copy() if self.copy_obs else obs
     
     def _get_info(self):
         """
@@ -97,17 +465,42 @@ class FindTargetEnv(gym.Env):
         :return: Info dictionary
         """
         return {
-            "distance": int(np.linalg.norm(self._agent_location - self._targets[0].position, ord=1))
+            "distance": int(self.distance[0])
         }
     
+    def _get_step_info(self, terminated: bool, truncated: bool | None = None) -> dict[str, Any]:
+        """
+        :param truncated: Whether the TimeLimit wrapper truncates the episode, None to decide it from time_limit
+        :return: The info dict of a step according to info_mode
+        """
+        if self.info_mode == "step":
+            return self._get_info()
+        if self.info_mode == "episode_end":
+            if truncated is None:
+                truncated = self.time_limit is not None and self._elapsed_steps >= self.time_limit
+            if terminated or truncated:
+                return self._get_info()
+        return {}
+
     def reset(
         self,
         *,
         seed: int | None = None,
         options: dict[str, Any] | None = None,
     ) -> tuple[ObsType, dict[str, Any]]:
-        # your code here
-        self._set_up()
+        """
+        :param seed: Seeds the random number generator of the env (and the layout bank, if it has no layout_seed)
+        :param options: {"layout_index": i} starts from layout i of the layout bank
+        """
+        super().reset(seed=seed)
+        if self._pending_curriculum is not None:
+            self._apply_curriculum()
+        if seed is not None and self._layouts is not None:
+            if self._layout_bank_size is not None and self.layout_seed is None:
+                self._sample_layout_bank(self.np_random)
+            self._layout_cursor = 0
+        layout_index = None if options is None else options.get("layout_index")
+        self._set_up(layout_index)
         obs = self._get_obs()
         info = self._get_info()
         self._render_frame_for_humans_if_needed()
@@ -119,67 +512,176 @@ class FindTargetEnv(gym.Env):
         # Check if the new position is on the grid, if not return the old one
         if np.any(new_pos < np.zeros((2,), dtype=int)) or np.any(new_pos > np.full((2,), fill_value=self.size-1)):
             return self._agent_location
+        # walls block the agent like the border
+        if self._has_walls and self._walls[new_pos[0], new_pos[1]]:
+            return self._agent_location
         return new_pos
     
     def step(
         self, action: ActType
     ) -> tuple[ObsType, SupportsFloat, bool, bool, dict[str, Any]]:
-        # rendering
-        self._new_episode = False
-        self._count_position(position=(self._agent_location[0], self._agent_location[1]))
-
-        reward = -1
-        terminated = False
-        # your code here
-        self._previous_distance = self.distance
-        self._agent_location = self._get_new_agent_position_from_action(action)
-        if np.array_equal(self._agent_location, self._targets[0].position):
-            reward = 10
-            terminated = True
-        self.distance = self._get_distance()
-
+        reward, terminated = self._transition(action)
         obs = self._get_obs()
-        info = self._get_info()
+        info = self._get_step_info(terminated)
 
         self._render_frame_for_humans_if_needed()
         
         return obs, reward, terminated, False, info
+
+    def _transition(self, action: ActType) -> tuple[SupportsFloat, bool]:
+        """
+        Advances the state by one step without building the observation, the info dict or a frame
+        (step adds them, ActionRepeatWrapper only after the last repeated step)
+        :return: The reward and whether the episode terminated
+        """
+        # rendering
+        self._new_episode = False
+        self._elapsed_steps += 1
+
+        reward = -1
+        terminated = False
+        if self._moving_targets:
+            self._step_targets()
+        if self._encoder.uses_recent_positions:
+            self._encoder.push(self._agent_location)
+        if self._use_numba:
+            dx, dy = self._action_directions[action]
+            hit = stepKernels.step_single(
+                self._agent_location,
+                self._obs,
+                self._target_counts,
+                self._distance_field,
+                self._walls,
+                dx,
+                dy,
+                self.size,
+            )
+            if self._distance_from_positions:
+                self.distance[0] = self._get_distance()
+        else:
+            self._count_position(position=(self._agent_location[0], self._agent_location[1]))
+            self.previous_distance[0] = self.distance[0]
+            self._agent_location = self._get_new_agent_position_from_action(action)
+            hit = self._target_counts[self._agent_location[0], self._agent_location[1]] > 0
+            self.distance[0] = self._get_distance()
+        if hit:
+            reward = self._collect_targets()
+            terminated = self._targets_left == 0
+            self.distance[0] = 0 if terminated else self._get_distance()
+        if self.distance_shaping:
+            reward += self.distance_shaping * float(self.previous_distance[0] - self.distance[0])
+        return reward, terminated
         
     def get_memory(self) -> np.ndarray:
-        memory = np.zeros((self.size, self.size))
-        for pos, count in self._counted_positions.items():
-            memory[pos[0], pos[1]] = count
-        return memory
+        """
+        :return: The (size, size) visit count grid. This is a view into the observation buffer, copy it before modifying it
+        """
+        return self._memory
 
     # rendering
 
+    def _get_renderer(self):
+        if self.renderer is None:
+            if self.render_backend == "numpy":
+                from rasterizer import NumpyRenderer as Renderer
+            else:
+                from rendering import Renderer
+
+            self.renderer = Renderer(
+                meta_data=self.metadata,
+                grid_size=self.size,
+                window_size=self.window_size,
+                render_mode=self.render_mode,
+            )
+        return self.renderer
+
     def render(self) -> RenderFrame | list[RenderFrame] | None:
-        self.renderer.render(agent_location=self._agent_location, new_episode=self._new_episode, targets=self._targets,
-                             visited_cells_count=self._counted_positions)
+        if self.render_mode is None:
+            return None
+        return self._get_renderer().render(agent_location=self._agent_location, new_episode=self._new_episode, targets=self._targets,
+                             visited_cells_count=self._memory, walls=self._rendered_walls())
 
     def _render_frame(self):
-        return self.renderer.render_frame(
+        return self._get_renderer().render_frame(
             agent_location=self._agent_location,
             new_episode=self._new_episode,
             targets=self._targets,
-            visited_cells_count=self._counted_positions,
+            visited_cells_count=self._memory,
+            walls=self._rendered_walls(),
         )
 
     def _render_frame_for_humans_if_needed(self):
-        return self.renderer.render_frame_for_humans_if_needed(
+        if self.render_mode != "human":
+            return None
+        return self._get_renderer().render_frame_for_humans_if_needed(
             agent_location=self._agent_location,
             new_episode=self._new_episode,
             targets=self._targets,
-            visited_cells_count=self._counted_positions,
+            visited_cells_count=self._memory,
+            walls=self._rendered_walls(),
         )
 
+    def _rendered_walls(self) -> np.ndarray | None:
+        return self._walls if self._has_walls else None
+
     def _count_position(self, position: tuple[int, int]):
-        try:
-            self._counted_positions[position] += 1
-        except:
-            self._counted_positions[position] = 1
+        self._memory[position] += 1
 
     def close(self):
-        if self.renderer.window is not None:
-            pygame.display.quit()
-            pygame.quit()
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()
+
+
+def _l1_distance_field(occupied: np.ndarray) -> np.ndarray:
+    """
+    Exact L1 distance from every cell to the nearest occupied cell.
+    The L1 distance transform is separable, along each axis it is
+    min_j(f[j] + |i - j|) = min(min_{j<=i}(f[j] - j) + i, min_{j>=i}(f[j] + j) - i),
+    which are two running minima (O(size^2), no Python loops over cells)
+    :param occupied: Boolean (size, size) grid
+    :return: Integer (size, size) distance grid
+    """
+    field = np.where(occupied, 0, sum(occupied.shape))
+    for axis in (0, 1):
+        index = np.arange(occupied.shape[axis]).reshape((-1, 1) if axis == 0 else (1, -1))
+        forward = np.minimum.accumulate(field - index, axis=axis) + index
+        backward = np.flip(
+            np.minimum.accumulate(np.flip(field + index, axis=axis), axis=axis), axis=axis
+        ) - index
+        field = np.minimum(forward, backward)
+    return field
+
+
+def sample_layouts(
+    size: int,
+    num_targets: int,
+    num_layouts: int,
+    rng: np.random.Generator,
+    free_cells: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Samples start layouts with distinct cells for the targets and the agent
+    :param size: The grid size
+    :param num_targets: Number of targets per layout
+    :param num_layouts: Number of layouts
+    :param rng: The random number generator
+    :param free_cells: Flat indices of the cells to sample from (e.g. GridMap.free_cells), defaults to all cells
+    :return: (num_layouts, num_targets + 1, 2) positions, the agent position is the last entry
+    """
+    cells = num_targets + 1
+    num_cells = size**2 if free_cells is None else len(free_cells)
+    if 4 * cells > num_cells:
+        # dense layouts: the first cells of a random permutation of all cells
+        chosen = rng.random((num_layouts, num_cells)).argsort(axis=1)[:, :cells]
+    else:
+        # sparse layouts: sample with replacement and resample the few layouts with duplicate cells
+        chosen = rng.integers(0, num_cells, size=(num_layouts, cells))
+        while True:
+            sorted_cells = np.sort(chosen, axis=1)
+            duplicates = (sorted_cells[:, 1:] == sorted_cells[:, :-1]).any(axis=1)
+            if not duplicates.any():
+                break
+            chosen[duplicates] = rng.integers(0, num_cells, size=(int(duplicates.sum()), cells))
+    if free_cells is not None:
+        chosen = free_cells[chosen]
+    return np.stack(np.divmod(chosen, size), axis=-1)
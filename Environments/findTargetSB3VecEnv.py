@@ -0,0 +1,116 @@
+import types
+from typing import Any, Sequence
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+from Environments.findTargetVecEnv import FindTargetVecEnv
+
+# info of the envs whose episode goes on, shared by all of them and read-only so nobody modifies it by accident
+_EMPTY_INFO = types.MappingProxyType({})
+
+
+class FindTargetSB3VecEnv(VecEnv):
+    """
+    Stable-Baselines3 VecEnv around FindTargetVecEnv.
+    Can be passed directly to PPO / DQN instead of a DummyVecEnv of FindTargetEnv instances.
+    Wrap it with VecMonitor to get the episode statistics in the training logs.
+
+    Only the envs whose episode ended get an own info dict (with "terminal_observation"),
+    the infos of all envs as arrays are available as vector_info (the gymnasium vector env format).
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        size: int = 5,
+        max_episode_steps: int = 50,
+        render_mode=None,
+        window_size: int = 512,
+        info_mode: str = "step",
+    ):
+        """
+
+        :param num_envs: Number of grid worlds that are stepped in parallel
+        :param size: The size of each grid in cells (e.g. 5)
+        :param max_episode_steps: Episodes are truncated after this many steps
+        :param render_mode: "rgb_array" or None
+        :param window_size: The size of the rendered frames in pixels
+        :param info_mode: "step", "episode_end" or "none", see FindTargetVecEnv
+        """
+        self.venv = FindTargetVecEnv(
+            num_envs=num_envs,
+            size=size,
+            max_episode_steps=max_episode_steps,
+            render_mode=render_mode,
+            window_size=window_size,
+            info_mode=info_mode,
+        )
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=self.venv.single_observation_space,
+            action_space=self.venv.single_action_space,
+        )
+        self._actions = None
+        # the info of the last step as arrays, e.g. vector_info["distance"]
+        self.vector_info = {}
+
+    def reset(self) -> VecEnvObs:
+        obs, _ = self.venv.reset(seed=self._seeds[0])
+        self._reset_seeds()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return obs
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = actions
+
+    def step_wait(self) -> VecEnvStepReturn:
+        obs, rewards, terminated, truncated, info = self.venv.step(self._actions)
+        dones = terminated | truncated
+        self.vector_info = info
+
+        infos = [_EMPTY_INFO] * self.num_envs
+        for i in np.flatnonzero(dones):
+            infos[i] = {
+                "terminal_observation": info["final_obs"][i],
+                "TimeLimit.truncated": bool(truncated[i] and not terminated[i]),
+            }
+
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def close(self) -> None:
+        self.venv.close()
+
+    def get_images(self) -> Sequence[np.ndarray | None]:
+        frames = self.venv.render()
+        if frames is None:
+            return [None] * self.num_envs
+        return frames
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> list[Any]:
+        return [getattr(self.venv, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(
+        self, attr_name: str, value: Any, indices: VecEnvIndices = None
+    ) -> None:
+        setattr(self.venv, attr_name, value)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs,
+    ) -> list[Any]:
+        result = getattr(self.venv, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(
+        self, wrapper_class: type, indices: VecEnvIndices = None
+    ) -> list[bool]:
+        return [False] * len(self._get_indices(indices))
@@ -0,0 +1,250 @@
+from typing import Any
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.core import ActType, ObsType
+from gymnasium.utils import seeding
+from gymnasium.vector import AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from Environments import stepKernels
+from Environments.observationEncoding import MAX_VISITS, ObservationEncoder
+
+
+class FindTargetVecEnv(gym.vector.VectorEnv):
+    """
+    Batched version of the FindTargetEnv grid world.
+    All N grid worlds are stored as (N, ...) arrays and advanced together with a single array operation per step.
+
+    The observation of every env has the same layout as FindTargetEnv:
+    [agent x, agent y, visit counts of all size*size cells, distance, previous distance]
+
+    Envs that terminate or truncate are reset in the same step (autoreset_mode SAME_STEP),
+    their last observation is returned in info["final_obs"] (masked by info["_final_obs"]).
+    """
+
+    metadata = {
+        "render_modes": ["rgb_array"],
+        "render_fps": 4,
+        "autoreset_mode": AutoresetMode.SAME_STEP,
+    }
+
+    # The actions are mapped to left, right, up, down (same order as FindTargetEnv.action_to_direction)
+    action_to_direction = np.array([[0, 1], [0, -1], [1, 0], [-1, 0]], dtype=int)
+
+    target_reward = 10
+    step_reward = -1
+
+    def __init__(
+        self,
+        num_envs: int,
+        size: int = 5,
+        max_episode_steps: int = 50,
+        render_mode=None,
+        copy: bool = True,
+        window_size: int = 512,
+        step_backend: str = "numpy",
+        info_mode: str = "step",
+    ):
+        """
+
+        :param num_envs: Number of grid worlds that are stepped in parallel
+        :param size: The size of each grid in cells (e.g. 5)
+        :param max_episode_steps: Episodes are truncated after this many steps (like the TimeLimit of FindTargetEnv-v0)
+        :param render_mode: "rgb_array" or None
+        :param copy: If True, step and reset return a copy of the internal observation buffer
+        :param window_size: The size of the rendered frames in pixels
+        :param step_backend: "numpy" or "numba" (JIT compiled step, falls back to numpy if Numba is not installed)
+        :param info_mode: "step" (the distances of all envs on every step), "episode_end" (only the envs whose
+            episode ended, masked by info["_distance"]) or "none". info["final_obs"] is always set
+        """
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        assert info_mode in ("step", "episode_end", "none")
+        self.info_mode = info_mode
+        self.num_envs = num_envs
+        self.size = size
+        self.max_episode_steps = max_episode_steps
+        self.render_mode = render_mode
+        self.copy = copy
+        self.window_size = window_size
+        self.renderer = None
+        self._use_numba = stepKernels.use_numba(step_backend)
+
+        self.single_action_space = spaces.Discrete(4)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        observation_shape = (2 + self.size**2 + 2,)
+        # the same space as FindTargetEnv, so models can be moved between the backends.
+        # A cell is counted at most once per step, so the visit counts stay within the bound of the space
+        if max_episode_steps > MAX_VISITS:
+            raise ValueError(f"max_episode_steps must not be larger than {MAX_VISITS}")
+        self.single_observation_space = ObservationEncoder(self.size).observation_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        # The state of all envs lives in the observation buffer, the attributes below are views into it
+        self._obs = np.zeros((num_envs,) + observation_shape, dtype=int)
+        self._agent_locations = self._obs[:, 0:2]
+        self._visits = self._obs[:, 2 : 2 + self.size**2].reshape(
+            num_envs, self.size, self.size
+        )
+        self._distances = self._obs[:, -2]
+        self._previous_distances = self._obs[:, -1]
+
+        self._target_locations = np.zeros((num_envs, 2), dtype=int)
+        self._elapsed_steps = np.zeros((num_envs,), dtype=int)
+        # rendering, envs whose episode just started are rendered as a black screen
+        self._new_episodes = np.zeros((num_envs,), dtype=bool)
+        self._env_indices = np.arange(num_envs)
+        self._rewards = np.zeros((num_envs,), dtype=int)
+        self._terminated = np.zeros((num_envs,), dtype=bool)
+        self._truncated = np.zeros((num_envs,), dtype=bool)
+
+        self._np_random, self._np_random_seed = seeding.np_random()
+
+    def _reset_envs(self, mask: np.ndarray):
+        """
+        Samples new target and agent positions for all envs selected by mask
+        :param mask: Boolean array of shape (num_envs,)
+        """
+        n = int(np.count_nonzero(mask))
+        if n == 0:
+            return
+        cells = self.size**2
+        target_cells = self._np_random.integers(0, cells, size=n)
+        # Sample the agent uniformly from all cells except the target cell (no rejection loop needed)
+        agent_cells = self._np_random.integers(0, cells - 1, size=n)
+        agent_cells += agent_cells >= target_cells
+
+        self._target_locations[mask] = np.stack(np.divmod(target_cells, self.size), axis=1)
+        self._agent_locations[mask] = np.stack(np.divmod(agent_cells, self.size), axis=1)
+        self._visits[mask] = 0
+        distances = np.abs(
+            self._agent_locations[mask] - self._target_locations[mask]
+        ).sum(axis=1)
+        self._distances[mask] = distances
+        self._previous_distances[mask] = distances
+        self._elapsed_steps[mask] = 0
+        self._new_episodes[mask] = True
+
+    def _get_obs(self) -> np.ndarray:
+        return self._obs.copy() if self.copy else self._obs
+
+    def _get_info(self) -> dict[str, Any]:
+        """
+        Info dictionary in the vector env format (one array per key plus a "_key" mask).
+        :return: Info dictionary
+        """
+        return {
+            "distance": self._distances.copy(),
+            "_distance": np.ones((self.num_envs,), dtype=bool),
+        }
+
+    def reset(
+        self,
+        *,
+        seed: int | list[int] | None = None,
+        options: dict[str, Any] | None = None,
+    ) -> tuple[ObsType, dict[str, Any]]:
+        """
+        Resets all envs.
+        :param seed: Seed for the random number generator shared by all envs
+        :param options: If options["reset_mask"] is given only the selected envs are reset
+        """
+        if isinstance(seed, list):
+            seed = seed[0]
+        if seed is not None:
+            self._np_random, self._np_random_seed = seeding.np_random(seed)
+
+        mask = np.ones((self.num_envs,), dtype=bool)
+        if options is not None and "reset_mask" in options:
+            mask = np.asarray(options["reset_mask"], dtype=bool)
+        self._reset_envs(mask)
+
+        return self._get_obs(), self._get_info()
+
+    def step(
+        self, actions: ActType
+    ) -> tuple[ObsType, np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        self._new_episodes[:] = False
+        if self._use_numba:
+            stepKernels.step_batch(
+                self._obs,
+                self._target_locations,
+                stepKernels.as_actions(actions),
+                self.action_to_direction,
+                self.size,
+                self._elapsed_steps,
+                self.max_episode_steps,
+                self.target_reward,
+                self.step_reward,
+                self._rewards,
+                self._terminated,
+                self._truncated,
+            )
+            return self._finish_step(
+                self._rewards.copy(), self._terminated.copy(), self._truncated.copy()
+            )
+
+        actions = np.asarray(actions)
+        # count the cell the agent leaves, like FindTargetEnv._count_position
+        self._visits[
+            self._env_indices, self._agent_locations[:, 0], self._agent_locations[:, 1]
+        ] += 1
+
+        # all actions move along one axis only, so clipping equals staying in place at the border
+        new_locations = self._agent_locations + self.action_to_direction[actions]
+        np.clip(new_locations, 0, self.size - 1, out=self._agent_locations)
+
+        self._previous_distances[:] = self._distances
+        np.abs(self._agent_locations - self._target_locations).sum(
+            axis=1, out=self._distances
+        )
+        terminated = self._distances == 0
+        rewards = np.where(terminated, self.target_reward, self.step_reward)
+
+        self._elapsed_steps += 1
+        truncated = self._elapsed_steps >= self.max_episode_steps
+        return self._finish_step(rewards, terminated, truncated)
+
+    def _finish_step(
+        self, rewards: np.ndarray, terminated: np.ndarray, truncated: np.ndarray
+    ) -> tuple[ObsType, np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        """
+        Builds the infos and resets the envs that terminated or truncated
+        """
+        done = terminated | truncated
+        if self.info_mode == "step":
+            infos = self._get_info()
+        elif self.info_mode == "episode_end" and done.any():
+            infos = {"distance": self._distances.copy(), "_distance": done.copy()}
+        else:
+            infos = {}
+        if done.any():
+            infos["final_obs"] = self._obs.copy()
+            infos["_final_obs"] = done
+            self._reset_envs(done)
+
+        return self._get_obs(), rewards, terminated, truncated, infos
+
+    def render(self) -> np.ndarray | None:
+        """
+        Renders all envs in one batch
+        :return: The frames as (num_envs, window_size, window_size, 3) uint8 array
+        """
+        if self.render_mode is None:
+            return None
+        if self.renderer is None:
+            from rasterizer import NumpyRenderer
+
+            self.renderer = NumpyRenderer(
+                grid_size=self.size, meta_data=self.metadata, window_size=self.window_size
+            )
+        return self.renderer.render_batch(
+            agent_locations=self._agent_locations,
+            target_positions=self._target_locations[:, np.newaxis],
+            visited_cells_counts=self._visits,
+            new_episodes=self._new_episodes,
+        )
+
+    def close_extras(self, **kwargs):
+        pass
@@ -0,0 +1,240 @@
+"""
+Maps with walls for FindTargetEnv and shortest-path distance fields on them.
+
+A map is a boolean (size, size) wall grid whose free cells are all connected. Maps are generated from a seed and
+cached (generate_map), the BFS distance fields from the targets to every cell are cached per (map, target cells)
+in a DistanceFieldCache, so after the first episode on a map the distance observation and a distance based reward
+are lookups into cached arrays.
+
+    grid_map = generate_map(size=64, kind="maze", seed=3)
+    distances = bfs_distance_field(grid_map.walls, targets)   # targets: boolean (size, size) grid
+"""
+
+import collections
+import functools
+from typing import NamedTuple
+
+import numpy as np
+
+from Environments.stepKernels import njit
+
+MAP_KINDS = ("empty", "obstacles", "maze")
+
+# distance of walls (and of free cells that cannot reach a target) in a distance field
+UNREACHABLE = -1
+
+
+class GridMap(NamedTuple):
+    kind: str
+    seed: int
+    wall_density: float
+    # size of the generated map, the walls may be padded to a larger grid
+    size: int
+    # (size, size) True for walls, read-only
+    walls: np.ndarray
+    # flat indices x * size + y of the free cells, read-only
+    free_cells: np.ndarray
+
+    @property
+    def key(self) -> tuple:
+        return self.kind, self.seed, self.wall_density, self.size, self.walls.shape[0]
+
+
+@functools.lru_cache(maxsize=256)
+def generate_map(
+    size: int,
+    kind: str = "obstacles",
+    seed: int = 0,
+    wall_density: float = 0.2,
+    grid_size: int | None = None,
+) -> GridMap:
+    """
+    Generates a map, maps are cached per arguments and their arrays are read-only
+    :param size: The map size
+    :param kind: "empty", "obstacles" (randomly placed walls) or "maze" (a perfect maze with one-cell corridors)
+    :param seed: The seed of the map
+    :param wall_density: Fraction of wall cells of "obstacles" maps (before unreachable cells are walled up)
+    :param grid_size: Pads the map with walls to a (grid_size, grid_size) grid, the map is its top left corner
+    """
+    assert kind in MAP_KINDS
+    rng = np.random.default_rng(seed)
+    if kind == "empty":
+        walls = np.zeros((size, size), dtype=bool)
+    elif kind == "obstacles":
+        walls = rng.random((size, size)) < wall_density
+        # keep the largest connected area of free cells, so every free cell can reach every other one
+        labels = connected_components(walls)
+        if labels.max() < 0:
+            raise ValueError(f"wall_density {wall_density} leaves no free cell")
+        largest = np.argmax(np.bincount(labels[labels >= 0]))
+        walls = labels != largest
+    else:
+        walls = _maze_walls(size, rng)
+    if grid_size is not None and grid_size > size:
+        padded = np.ones((grid_size, grid_size), dtype=bool)
+        padded[:size, :size] = walls
+        walls = padded
+    free_cells = np.flatnonzero(~walls)
+    walls.flags.writeable = False
+    free_cells.flags.writeable = False
+    return GridMap(kind, seed, wall_density, size, walls, free_cells)
+
+
+def _maze_walls(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Randomized depth-first search on the cells with even coordinates, the cells between two connected
+    rooms are carved free. For even sizes the last row and column stay walls.
+    """
+    rooms = (size + 1) // 2
+    walls = np.ones((size, size), dtype=bool)
+    visited = np.zeros((rooms, rooms), dtype=bool)
+    # one random number per visited room, drawn up front
+    choices = rng.random(2 * rooms * rooms)
+    _carve_maze(walls, visited, choices)
+    return walls
+
+
+@njit(cache=True)
+def _carve_maze(walls, visited, choices):
+    rooms = visited.shape[0]
+    stack = np.empty((rooms * rooms, 2), dtype=np.int64)
+    neighbours = np.empty((4, 2), dtype=np.int64)
+    stack[0, 0] = 0
+    stack[0, 1] = 0
+    depth = 1
+    visited[0, 0] = True
+    walls[0, 0] = False
+    choice = 0
+    while depth > 0:
+        x = stack[depth - 1, 0]
+        y = stack[depth - 1, 1]
+        count = 0
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < rooms and 0 <= ny < rooms and not visited[nx, ny]:
+                neighbours[count, 0] = nx
+                neighbours[count, 1] = ny
+                count += 1
+        if count == 0:
+            depth -= 1
+            continue
+        k = int(choices[choice % choices.shape[0]] * count)
+        choice += 1
+        nx = neighbours[k, 0]
+        ny = neighbours[k, 1]
+        visited[nx, ny] = True
+        walls[x + nx, y + ny] = False
+        walls[2 * nx, 2 * ny] = False
+        stack[depth, 0] = nx
+        stack[depth, 1] = ny
+        depth += 1
+
+
+def connected_components(walls: np.ndarray) -> np.ndarray:
+    """
+    :param walls: Boolean (size, size) wall grid
+    :return: (size, size) label of the connected area of every free cell (4-neighbourhood), UNREACHABLE for walls
+    """
+    labels = np.full(walls.shape, UNREACHABLE, dtype=np.int64)
+    _label_components(np.ascontiguousarray(walls), labels)
+    return labels
+
+
+@njit(cache=True)
+def _label_components(walls, labels):
+    size_x, size_y = walls.shape
+    queue = np.empty(size_x * size_y, dtype=np.int64)
+    label = 0
+    for start in range(size_x * size_y):
+        sx, sy = start // size_y, start % size_y
+        if walls[sx, sy] or labels[sx, sy] >= 0:
+            continue
+        labels[sx, sy] = label
+        queue[0] = start
+        head, tail = 0, 1
+        while head < tail:
+            x, y = queue[head] // size_y, queue[head] % size_y
+            head += 1
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < size_x and 0 <= ny < size_y and not walls[nx, ny] and labels[nx, ny] < 0:
+                    labels[nx, ny] = label
+                    queue[tail] = nx * size_y + ny
+                    tail += 1
+        label += 1
+
+
+def bfs_distance_field(walls: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    """
+    Shortest path lengths (4-neighbourhood, around the walls) from every cell to the nearest source cell
+    :param walls: Boolean (size, size) wall grid
+    :param sources: Boolean (size, size) grid of the source cells (the targets)
+    :return: Integer (size, size) distances, UNREACHABLE for walls and cells without a path to a source
+    """
+    distances = np.full(walls.shape, UNREACHABLE, dtype=np.int64)
+    _bfs(np.ascontiguousarray(walls), np.ascontiguousarray(sources), distances)
+    return distances
+
+
+@njit(cache=True)
+def _bfs(walls, sources, distances):
+    size_x, size_y = walls.shape
+    queue = np.empty(size_x * size_y, dtype=np.int64)
+    tail = 0
+    for x in range(size_x):
+        for y in range(size_y):
+            if sources[x, y] and not walls[x, y]:
+                distances[x, y] = 0
+                queue[tail] = x * size_y + y
+                tail += 1
+    head = 0
+    while head < tail:
+        x, y = queue[head] // size_y, queue[head] % size_y
+        head += 1
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < size_x and 0 <= ny < size_y and not walls[nx, ny] and distances[nx, ny] < 0:
+                distances[nx, ny] = distances[x, y] + 1
+                queue[tail] = nx * size_y + ny
+                tail += 1
+
+
+class DistanceFieldCache:
+    """
+    Least recently used cache of the BFS distance fields of (map, target cells) pairs, bounded in bytes.
+    The cached fields are read-only and shared by all users of the cache.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._fields = collections.OrderedDict()
+
+    def get(self, grid_map: GridMap, target_cells: np.ndarray) -> np.ndarray:
+        """
+        :param grid_map: The map
+        :param target_cells: Flat indices x * size + y of the cells with targets
+        :return: The distance field, computed on the first request for the pair
+        """
+        key = (grid_map.key, np.unique(target_cells).tobytes())
+        field = self._fields.get(key)
+        if field is not None:
+            self._fields.move_to_end(key)
+            self.hits += 1
+            return field
+        self.misses += 1
+        sources = np.zeros(grid_map.walls.size, dtype=bool)
+        sources[target_cells] = True
+        field = bfs_distance_field(grid_map.walls, sources.reshape(grid_map.walls.shape))
+        field.flags.writeable = False
+        self._fields[key] = field
+        self.nbytes += field.nbytes
+        while self.nbytes > self.max_bytes and len(self._fields) > 1:
+            _, evicted = self._fields.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return field
@@ -0,0 +1,128 @@
+import numpy as np
+from gymnasium import spaces
+
+OBS_ENCODINGS = ("full", "window", "recent")
+OBS_DTYPES = ("int64", "int16", "uint8")
+
+# Upper bound of the visit counts in the observation space (real counts are bounded by the episode length).
+# Compact dtypes saturate below it, the full int64 observation is not clipped
+MAX_VISITS = 2**15 - 1
+
+
+class ObservationEncoder:
+    """
+    Encodes the state of a FindTargetEnv into its observation.
+    All encodings start with the agent location and end with the distance and the previous distance to the nearest target:
+
+    - "full": [agent x, agent y, visit counts of all size*size cells, distance, previous distance]
+    - "window": the visit counts of the (2 * view_radius + 1)^2 cells around the agent instead of the full grid,
+      cells outside the grid are encoded as maximally visited
+    - "recent": the last recent_positions cells the agent left (x, y pairs, most recent first) instead of the
+      visit counts, unused entries are (size, size)
+
+    The visit counts saturate at MAX_VISITS, compact dtypes at the largest value of the dtype.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        encoding: str = "full",
+        dtype: str = "int64",
+        view_radius: int = 2,
+        recent_positions: int = 8,
+        max_distance: int | None = None,
+    ):
+        """
+
+        :param size: The grid size
+        :param encoding: "full", "window" or "recent"
+        :param dtype: "int64", "int16" or "uint8"
+        :param view_radius: Radius of the "window" encoding
+        :param recent_positions: Length of the "recent" ring buffer
+        :param max_distance: Largest possible distance to a target, defaults to the L1 diameter 2 * (size - 1)
+        """
+        assert encoding in OBS_ENCODINGS
+        assert dtype in OBS_DTYPES
+        self.size = size
+        self.encoding = encoding
+        self.dtype = np.dtype(dtype)
+        self.view_radius = view_radius
+        self.recent_positions = recent_positions
+        max_distance = 2 * (size - 1) if max_distance is None else max_distance
+        self.max_count = min(MAX_VISITS, int(np.iinfo(self.dtype).max))
+        if max(size, max_distance) > np.iinfo(self.dtype).max:
+            raise ValueError(f"{dtype} cannot represent the positions and distances of a grid of size {size}")
+
+        if encoding == "full":
+            cells_shape, cells_high = (size**2,), self.max_count
+        elif encoding == "window":
+            cells_shape, cells_high = ((2 * view_radius + 1) ** 2,), self.max_count
+            self._window = np.zeros((2 * view_radius + 1, 2 * view_radius + 1), dtype=self.dtype)
+        else:
+            cells_shape, cells_high = (2 * recent_positions,), size
+            self._recent = np.full((recent_positions, 2), size, dtype=self.dtype)
+            self._recent_index = 0
+            # ring buffer positions from the most recent to the oldest entry, per value of _recent_index
+            self._recent_order = (np.arange(recent_positions)[:, np.newaxis] - 1 - np.arange(recent_positions)) % (
+                recent_positions
+            )
+
+        high = np.concatenate(
+            [
+                np.full(2, size - 1),
+                np.full(cells_shape, cells_high),
+                np.full(2, max_distance),
+            ]
+        )
+        self.observation_space = spaces.Box(low=0, high=high, dtype=self.dtype)
+        self._buffer = np.zeros(high.shape, dtype=self.dtype)
+        self._cells = self._buffer[2:-2]
+
+    @property
+    def uses_recent_positions(self) -> bool:
+        return self.encoding == "recent"
+
+    def reset(self):
+        """
+        Clears the recent positions at the start of an episode
+        """
+        if self.encoding == "recent":
+            self._recent.fill(self.size)
+            self._recent_index = 0
+
+    def push(self, position):
+        """
+        Adds the cell the agent leaves to the recent positions
+        """
+        self._recent[self._recent_index] = position
+        self._recent_index = (self._recent_index + 1) % self.recent_positions
+
+    def encode(self, obs: np.ndarray, memory: np.ndarray) -> np.ndarray:
+        """
+        :param obs: The full int observation of the env [agent x, agent y, visit counts, distance, previous distance]
+        :param memory: The (size, size) visit counts (a view into obs)
+        :return: The encoded observation, an internal buffer that is overwritten by the next call
+        """
+        if self.encoding == "full":
+            np.minimum(obs, self.max_count, out=self._buffer, casting="unsafe")
+            return self._buffer
+
+        self._buffer[0:2] = obs[0:2]
+        self._buffer[-2:] = obs[-2:]
+        if self.encoding == "window":
+            x, y = int(obs[0]), int(obs[1])
+            r = self.view_radius
+            x0, x1 = max(x - r, 0), min(x + r + 1, self.size)
+            y0, y1 = max(y - r, 0), min(y + r + 1, self.size)
+            window = self._window
+            window.fill(self.max_count)
+            np.minimum(
+                memory[x0:x1, y0:y1],
+                self.max_count,
+                out=window[x0 - x + r : x1 - x + r, y0 - y + r : y1 - y + r],
+                casting="unsafe",
+            )
+            self._cells[:] = window.ravel()
+        else:
+            self._cells[:] = self._recent[self._recent_order[self._recent_index]].ravel()
+        return self._buffer
@@ -0,0 +1,296 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from typing import Any, Callable, Sequence
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    CloudpickleWrapper,
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+
+def _attach_buffers(buffer_specs: dict[str, tuple]) -> tuple[list, dict[str, np.ndarray]]:
+    """
+    Attaches to the shared memory blocks created by SharedMemoryVecEnv
+    :param buffer_specs: name -> (shared memory name, shape, dtype)
+    :return: The shared memory handles (they must stay alive as long as the arrays are used) and the arrays
+    """
+    handles, arrays = [], {}
+    for name, (shm_name, shape, dtype) in buffer_specs.items():
+        handle = shared_memory.SharedMemory(name=shm_name)
+        handles.append(handle)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+    return handles, arrays
+
+
+def _worker(
+    remote: mp.connection.Connection,
+    parent_remote: mp.connection.Connection,
+    env_fn_wrappers: list[CloudpickleWrapper],
+    start: int,
+) -> None:
+    """
+    Runs the envs start ... start + len(env_fn_wrappers) - 1 of a SharedMemoryVecEnv.
+    Observations, actions, rewards and dones are exchanged through shared memory,
+    the pipe only carries the commands and the info dicts that are not empty.
+    """
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    envs = [env_fn_wrapper.var() for env_fn_wrapper in env_fn_wrappers]
+    handles, buffers = [], {}
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                infos, reset_infos = {}, {}
+                for i, env in enumerate(envs):
+                    j = start + i
+                    observation, reward, terminated, truncated, info = env.step(buffers["actions"][j])
+                    done = terminated or truncated
+                    if done:
+                        info["TimeLimit.truncated"] = truncated and not terminated
+                        # the parent adds info["terminal_observation"] from the final_obs buffer
+                        buffers["final_obs"][j] = observation
+                        observation, reset_infos[i] = env.reset()
+                    buffers["obs"][j] = observation
+                    buffers["rewards"][j] = reward
+                    buffers["dones"][j] = done
+                    if info:
+                        infos[i] = info
+                remote.send((infos, reset_infos))
+            elif cmd == "reset":
+                seeds, options = data
+                reset_infos = []
+                for i, env in enumerate(envs):
+                    maybe_options = {"options": options[i]} if options[i] else {}
+                    buffers["obs"][start + i], reset_info = env.reset(seed=seeds[i], **maybe_options)
+                    reset_infos.append(reset_info)
+                remote.send(reset_infos)
+            elif cmd == "attach":
+                handles, buffers = _attach_buffers(data)
+                remote.send(None)
+            elif cmd == "get_spaces":
+                remote.send((envs[0].observation_space, envs[0].action_space))
+            elif cmd == "render":
+                remote.send([envs[i].render() for i in data[0]])
+            elif cmd == "env_method":
+                indices, method_name, method_args, method_kwargs = data
+                remote.send(
+                    [envs[i].get_wrapper_attr(method_name)(*method_args, **method_kwargs) for i in indices]
+                )
+            elif cmd == "get_attr":
+                indices, attr_name = data
+                remote.send([envs[i].get_wrapper_attr(attr_name) for i in indices])
+            elif cmd == "has_attr":
+                indices, attr_name = data
+                remote.send([envs[i].has_wrapper_attr(attr_name) for i in indices])
+            elif cmd == "set_attr":
+                indices, attr_name, value = data
+                for i in indices:
+                    setattr(envs[i], attr_name, value)
+                remote.send([None for _ in indices])
+            elif cmd == "is_wrapped":
+                indices, wrapper_class = data
+                remote.send([is_wrapped(envs[i], wrapper_class) for i in indices])
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                buffers.clear()
+                for handle in handles:
+                    handle.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Multiprocess VecEnv like SubprocVecEnv, but observations, actions, rewards and dones are written
+    into shared memory buffers instead of being pickled through the pipes.
+    Each worker process runs a contiguous slice of the envs, so num_envs can be larger than the number of cores.
+
+    Only Box / Discrete / MultiDiscrete / MultiBinary observation spaces are supported (no Dict or Tuple spaces).
+
+    As for SubprocVecEnv, code using it with the default start method has to be wrapped
+    in a ``if __name__ == "__main__":`` block.
+    """
+
+    def __init__(
+        self,
+        env_fns: list[Callable[[], gym.Env]],
+        start_method: str | None = None,
+        num_workers: int | None = None,
+    ):
+        """
+
+        :param env_fns: Environments to run in the worker processes
+        :param start_method: Method used to start the workers (see multiprocessing.get_all_start_methods()),
+            defaults to 'forkserver' if available and 'spawn' otherwise
+        :param num_workers: Number of worker processes, defaults to min(number of envs, number of cores)
+        """
+        self.waiting = False
+        self.closed = False
+        num_envs = len(env_fns)
+        if num_workers is None:
+            num_workers = min(num_envs, os.cpu_count() or 1)
+        num_workers = max(1, min(num_workers, num_envs))
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # contiguous slices of envs per worker, the first len(env_fns) % num_workers workers get one env more
+        worker_envs = np.array_split(np.arange(num_envs), num_workers)
+        self._worker_starts = np.array([envs[0] for envs in worker_envs])
+        self._env_workers = np.concatenate([np.full(len(envs), w) for w, envs in enumerate(worker_envs)])
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for work_remote, remote, envs in zip(self.work_remotes, self.remotes, worker_envs):
+            args = (work_remote, remote, [CloudpickleWrapper(env_fns[i]) for i in envs], int(envs[0]))
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        if not isinstance(observation_space, (spaces.Box, spaces.Discrete, spaces.MultiDiscrete, spaces.MultiBinary)):
+            self.close()
+            raise ValueError(
+                f"SharedMemoryVecEnv does not support {type(observation_space).__name__} observation spaces, "
+                f"use SubprocVecEnv instead"
+            )
+
+        self._shared_memories = []
+        buffer_specs = {
+            "obs": ((num_envs,) + observation_space.shape, observation_space.dtype),
+            "final_obs": ((num_envs,) + observation_space.shape, observation_space.dtype),
+            "actions": ((num_envs,) + action_space.shape, action_space.dtype),
+            "rewards": ((num_envs,), np.float32),
+            "dones": ((num_envs,), bool),
+        }
+        self._buffers = {}
+        for name, (shape, dtype) in buffer_specs.items():
+            nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            handle = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._shared_memories.append(handle)
+            self._buffers[name] = np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+            buffer_specs[name] = (handle.name, shape, dtype)
+        for remote in self.remotes:
+            remote.send(("attach", buffer_specs))
+        for remote in self.remotes:
+            remote.recv()
+
+        super().__init__(num_envs, observation_space, action_space)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._buffers["actions"][:] = np.reshape(actions, self._buffers["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self) -> VecEnvStepReturn:
+        infos = [{} for _ in range(self.num_envs)]
+        for worker, remote in enumerate(self.remotes):
+            worker_infos, reset_infos = remote.recv()
+            start = self._worker_starts[worker]
+            for i, reset_info in reset_infos.items():
+                self.reset_infos[start + i] = reset_info
+            for i, info in worker_infos.items():
+                infos[start + i] = info
+        self.waiting = False
+
+        dones = self._buffers["dones"].copy()
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = self._buffers["final_obs"][i].copy()
+        return self._buffers["obs"].copy(), self._buffers["rewards"].copy(), dones, infos
+
+    def reset(self) -> VecEnvObs:
+        for worker, remote in enumerate(self.remotes):
+            envs = self._worker_envs(worker)
+            remote.send(("reset", ([self._seeds[i] for i in envs], [self._options[i] for i in envs])))
+        self.reset_infos = []
+        for remote in self.remotes:
+            self.reset_infos.extend(remote.recv())
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._buffers["obs"].copy()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._buffers = {}
+        for handle in getattr(self, "_shared_memories", []):
+            handle.close()
+            handle.unlink()
+        self.closed = True
+
+    def get_images(self) -> Sequence[np.ndarray | None]:
+        if self.render_mode != "rgb_array":
+            return [None for _ in range(self.num_envs)]
+        return self._call_workers("render", range(self.num_envs))
+
+    def _worker_envs(self, worker: int) -> range:
+        """
+        :return: The (global) indices of the envs run by the worker
+        """
+        start = self._worker_starts[worker]
+        return range(start, start + np.count_nonzero(self._env_workers == worker))
+
+    def _call_workers(self, cmd: str, indices: Sequence[int], *args) -> list[Any]:
+        """
+        Sends a command to every worker that runs one of the envs in indices
+        :return: The results in the order of indices
+        """
+        indices = list(indices)
+        local_indices = {}
+        for i in indices:
+            local_indices.setdefault(int(self._env_workers[i]), []).append(i)
+        for worker, worker_indices in local_indices.items():
+            start = self._worker_starts[worker]
+            self.remotes[worker].send((cmd, ([i - start for i in worker_indices],) + args))
+        results = {}
+        for worker, worker_indices in local_indices.items():
+            results.update(zip(worker_indices, self.remotes[worker].recv()))
+        return [results[i] for i in indices]
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> list[Any]:
+        return self._call_workers("get_attr", self._get_indices(indices), attr_name)
+
+    def has_attr(self, attr_name: str) -> bool:
+        return all(self._call_workers("has_attr", self._get_indices(None), attr_name))
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        self._call_workers("set_attr", self._get_indices(indices), attr_name, value)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs,
+    ) -> list[Any]:
+        return self._call_workers("env_method", self._get_indices(indices), method_name, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class: type[gym.Wrapper], indices: VecEnvIndices = None) -> list[bool]:
+        return self._call_workers("is_wrapped", self._get_indices(indices), wrapper_class)
@@ -0,0 +1,131 @@
+"""
+Step kernels of the FindTargetEnv grid world, compiled with Numba.
+Numba is optional: the envs only use these kernels with step_backend="numba" and
+fall back to their NumPy implementation when Numba is not installed (see NUMBA_AVAILABLE).
+"""
+
+import warnings
+
+import numpy as np
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # without Numba the kernels stay plain Python functions
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+STEP_BACKENDS = ("numpy", "numba")
+
+
+def use_numba(step_backend: str) -> bool:
+    """
+    :param step_backend: "numpy" or "numba"
+    :return: True if the Numba kernels should be used, warns if Numba was requested but is not installed
+    """
+    assert step_backend in STEP_BACKENDS
+    if step_backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn("Numba is not installed, falling back to the NumPy step (pip install numba)")
+        return False
+    return step_backend == "numba"
+
+
+@njit(cache=True)
+def step_single(agent_location, obs, target_counts, distance_field, walls, dx, dy, size):
+    """
+    One step of a single FindTargetEnv: counts the cell the agent leaves, moves the agent (staying in place
+    at the border and in front of walls) and writes agent location and distances into the observation buffer
+    :param agent_location: The agent location, updated in place
+    :param obs: The observation buffer [agent x, agent y, visit counts, distance, previous distance]
+    :param target_counts: Number of targets on each cell
+    :param distance_field: Distance from each cell to the nearest target
+    :param walls: True for the wall cells
+    :param dx: Movement of the action along x
+    :param dy: Movement of the action along y
+    :param size: The grid size
+    :return: True if the agent reached a cell with a target
+    """
+    x = agent_location[0]
+    y = agent_location[1]
+    obs[2 + x * size + y] += 1
+
+    new_x = x + dx
+    new_y = y + dy
+    if 0 <= new_x < size and 0 <= new_y < size and not walls[new_x, new_y]:
+        x = new_x
+        y = new_y
+    agent_location[0] = x
+    agent_location[1] = y
+    obs[0] = x
+    obs[1] = y
+
+    obs[-1] = obs[-2]
+    obs[-2] = distance_field[x, y]
+    return target_counts[x, y] > 0
+
+
+@njit(cache=True)
+def step_batch(
+    obs,
+    target_locations,
+    actions,
+    action_to_direction,
+    size,
+    elapsed_steps,
+    max_episode_steps,
+    target_reward,
+    step_reward,
+    rewards,
+    terminated,
+    truncated,
+):
+    """
+    One step of all envs of a FindTargetVecEnv, the results are written into the given arrays
+    :param obs: The (N, obs size) observation buffer [agent x, agent y, visit counts, distance, previous distance]
+    :param target_locations: The (N, 2) target locations
+    :param actions: The (N,) actions
+    :param action_to_direction: The (4, 2) movement of each action
+    :param size: The grid size
+    :param elapsed_steps: The (N,) steps of the current episodes, updated in place
+    :param max_episode_steps: Episodes are truncated after this many steps
+    :param target_reward: Reward for reaching the target
+    :param step_reward: Reward for every other step
+    :param rewards: (N,) output array
+    :param terminated: (N,) output array
+    :param truncated: (N,) output array
+    """
+    for i in range(obs.shape[0]):
+        x = obs[i, 0]
+        y = obs[i, 1]
+        obs[i, 2 + x * size + y] += 1
+
+        new_x = x + action_to_direction[actions[i], 0]
+        new_y = y + action_to_direction[actions[i], 1]
+        if 0 <= new_x < size and 0 <= new_y < size:
+            x = new_x
+            y = new_y
+        obs[i, 0] = x
+        obs[i, 1] = y
+
+        distance = abs(x - target_locations[i, 0]) + abs(y - target_locations[i, 1])
+        obs[i, -1] = obs[i, -2]
+        obs[i, -2] = distance
+        terminated[i] = distance == 0
+        rewards[i] = target_reward if distance == 0 else step_reward
+
+        elapsed_steps[i] += 1
+        truncated[i] = elapsed_steps[i] >= max_episode_steps
+
+
+def as_actions(actions) -> np.ndarray:
+    """
+    :return: The actions as int64 array, so the kernels are compiled for a single signature
+    """
+    return np.asarray(actions, dtype=np.int64)
@@ -0,0 +1,109 @@
+"""
+Measures the startup cost of a FindTargetEnv worker: import time, env construction time and peak memory.
+Every measurement runs in a fresh interpreter, like a SubprocVecEnv worker.
+
+Usage (from the repository root):
+    python -m benchmarks.startup --workers 8 --render-modes none rgb_array
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _measure_worker(render_mode: str | None, size: int) -> dict:
+    """
+    Runs inside the child process.
+    :return: Import and construction times in ms and the peak RSS in MB
+    """
+    rss_interpreter = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    import numpy  # noqa: F401
+    import gymnasium  # noqa: F401
+
+    rss_dependencies = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    from Environments.findTargetEnv_final25 import FindTargetEnv
+
+    imported = time.perf_counter()
+    env = FindTargetEnv(size=size, render_mode=render_mode)
+    env.reset()
+    constructed = time.perf_counter()
+
+    rss_env = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    env.close()
+    return {
+        "import_ms": (imported - start) * 1e3,
+        "construct_ms": (constructed - imported) * 1e3,
+        "peak_rss_mb": rss_env / 1024,
+        "env_rss_mb": (rss_env - rss_dependencies) / 1024,
+        "interpreter_rss_mb": rss_interpreter / 1024,
+        "pygame_loaded": "pygame" in sys.modules,
+    }
+
+
+def measure(render_mode: str | None, size: int, workers: int) -> list[dict]:
+    """
+    Starts one fresh interpreter per worker and collects its startup measurements
+    :param render_mode: The render mode of the env, None for headless workers
+    :param size: The grid size of the env
+    :param workers: Number of workers to start
+    """
+    mode_arg = "none" if render_mode is None else render_mode
+    results = []
+    for _ in range(workers):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child", mode_arg, "--size", str(size)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def summarize(render_mode: str | None, results: list[dict]) -> dict:
+    summary = {"render_mode": render_mode, "workers": len(results)}
+    for key in ("import_ms", "construct_ms", "peak_rss_mb", "env_rss_mb"):
+        summary[key] = statistics.median(result[key] for result in results)
+    summary["pygame_loaded"] = any(result["pygame_loaded"] for result in results)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--size", type=int, default=5)
+    parser.add_argument("--render-modes", nargs="+", default=["none", "rgb_array"])
+    parser.add_argument("--json", action="store_true", help="Print the summaries as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        render_mode = None if args.child == "none" else args.child
+        print(json.dumps(_measure_worker(render_mode, args.size)))
+        return
+
+    summaries = []
+    for mode in args.render_modes:
+        render_mode = None if mode == "none" else mode
+        summaries.append(summarize(render_mode, measure(render_mode, args.size, args.workers)))
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+
+    print(f"{'render_mode':>12} {'import ms':>10} {'construct ms':>13} {'peak RSS MB':>12} {'env RSS MB':>11} {'pygame':>7}")
+    for summary in summaries:
+        print(
+            f"{str(summary['render_mode']):>12} {summary['import_ms']:>10.1f} {summary['construct_ms']:>13.2f}"
+            f" {summary['peak_rss_mb']:>12.1f} {summary['env_rss_mb']:>11.1f} {str(summary['pygame_loaded']):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
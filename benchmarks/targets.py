@@ -0,0 +1,77 @@
+"""
+Measures FindTargetEnv step and reset time for a growing number of (static and moving) targets.
+
+Usage (from the repository root):
+    python -m benchmarks.targets --size 64 --targets 1 10 100 1000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from Environments.findTargetEnv_final25 import FindTargetEnv
+
+
+def measure(size: int, num_targets: int, target_velocity: float, steps: int, seed: int = 0) -> dict:
+    """
+    Steps a single env with random actions, episodes are reset when they terminate or after 50 steps
+    :return: Mean step and reset time in microseconds
+    """
+    env = FindTargetEnv(size=size, num_targets=num_targets, target_velocity=target_velocity)
+    env.reset(seed=seed)
+    actions = np.random.default_rng(seed).integers(0, 4, size=steps)
+
+    step_time = reset_time = 0.0
+    resets = 0
+    episode_steps = 0
+    for action in actions:
+        start = time.perf_counter()
+        _, _, terminated, _, _ = env.step(int(action))
+        step_time += time.perf_counter() - start
+        episode_steps += 1
+        if terminated or episode_steps == 50:
+            start = time.perf_counter()
+            env.reset()
+            reset_time += time.perf_counter() - start
+            resets += 1
+            episode_steps = 0
+    env.close()
+    return {
+        "size": size,
+        "num_targets": num_targets,
+        "target_velocity": target_velocity,
+        "step_us": step_time / steps * 1e6,
+        "reset_us": reset_time / max(resets, 1) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--targets", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--velocities", type=float, nargs="+", default=[0.0, 1.0])
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        measure(args.size, num_targets, velocity, args.steps)
+        for velocity in args.velocities
+        for num_targets in args.targets
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>5} {'targets':>8} {'velocity':>9} {'step us':>9} {'reset us':>9}")
+    for result in results:
+        print(
+            f"{result['size']:>5} {result['num_targets']:>8} {result['target_velocity']:>9.1f}"
+            f" {result['step_us']:>9.1f} {result['reset_us']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
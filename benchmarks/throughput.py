@@ -0,0 +1,377 @@
+"""
+Environment throughput benchmark suite.
+
+Every case (env, vectorization, number of envs, grid size, target count, render mode) runs in a fresh
+interpreter and reports steps/sec, reset cost, p50/p99 step latency, allocations per step and peak RSS.
+Every runner resets finished episodes inside its step, like the vectorized envs do, so the step latencies of
+all vectorizations include the episode resets and are comparable.
+Results are written as JSON lines together with the git commit, so runs of different commits can be compared.
+
+Vectorizations:
+    scalar   a single env (FindTargetEnv in a TimeLimit like FindTargetEnv-v0, or gym.make for other ids)
+    dummy    stable_baselines3 DummyVecEnv
+    subproc  stable_baselines3 SubprocVecEnv
+    shm      SharedMemoryVecEnv (worker processes, observations in shared memory)
+    batched  FindTargetVecEnv (native batched, FindTargetEnv only)
+
+Usage (from the repository root):
+    python -m benchmarks.throughput --vectorizations scalar dummy batched --num-envs 64 --output results.jsonl
+    python -m benchmarks.throughput --envs LunarLander-v3 --vectorizations scalar dummy
+    python -m benchmarks.throughput --compare old.jsonl new.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+FIND_TARGET = "findtarget"
+VECTORIZATIONS = ("scalar", "dummy", "subproc", "shm", "batched")
+MAX_EPISODE_STEPS = 50
+
+
+def _make_env_fn(case: dict):
+    """
+    :return: A function creating one scalar env of the case
+    """
+
+    def make_env():
+        import gymnasium as gym
+
+        if case["env"] != FIND_TARGET:
+            return gym.make(case["env"], render_mode=case["render_mode"])
+
+        from Environments.findTargetEnv_final25 import FindTargetEnv
+
+        env = FindTargetEnv(
+            size=case["size"],
+            num_targets=case["num_targets"],
+            render_mode=case["render_mode"],
+            render_backend=case["render_backend"],
+            window_size=case["window_size"],
+            step_backend=case["step_backend"],
+        )
+        return gym.wrappers.TimeLimit(env, max_episode_steps=MAX_EPISODE_STEPS)
+
+    return make_env
+
+
+class _ScalarRunner:
+    """
+    Steps a single gymnasium env, finished episodes are reset inside step
+    """
+
+    def __init__(self, case: dict):
+        self.env = _make_env_fn(case)()
+        self.render = case["render_mode"] is not None
+        self.num_envs = 1
+
+    def reset(self, seed: int | None = None):
+        self.env.reset(seed=seed)
+
+    def sample_actions(self, rng: np.random.Generator, steps: int):
+        self.env.action_space.seed(int(rng.integers(2**31)))
+        return [self.env.action_space.sample() for _ in range(steps)]
+
+    def step(self, action):
+        _, _, terminated, truncated, _ = self.env.step(action)
+        if terminated or truncated:
+            self.env.reset()
+        if self.render:
+            self.env.render()
+
+    def close(self):
+        self.env.close()
+
+
+class _SB3VecRunner(_ScalarRunner):
+    """
+    Steps a DummyVecEnv / SubprocVecEnv / SharedMemoryVecEnv, finished envs are reset inside step
+    """
+
+    def __init__(self, case: dict):
+        from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+        from Environments.sharedMemoryVecEnv import SharedMemoryVecEnv
+
+        vec_env_class = {"dummy": DummyVecEnv, "subproc": SubprocVecEnv, "shm": SharedMemoryVecEnv}[
+            case["vectorization"]
+        ]
+        self.env = vec_env_class([_make_env_fn(case)] * case["num_envs"])
+        self.render = case["render_mode"] is not None
+        self.num_envs = case["num_envs"]
+
+    def reset(self, seed: int | None = None):
+        self.env.seed(seed)
+        self.env.reset()
+
+    def sample_actions(self, rng: np.random.Generator, steps: int):
+        return list(rng.integers(0, self.env.action_space.n, size=(steps, self.num_envs)))
+
+    def step(self, action):
+        self.env.step(action)
+        if self.render:
+            self.env.get_images()
+
+
+class _BatchedRunner(_ScalarRunner):
+    """
+    Steps a FindTargetVecEnv, finished envs are reset inside step
+    """
+
+    def __init__(self, case: dict):
+        from Environments.findTargetVecEnv import FindTargetVecEnv
+
+        assert case["env"] == FIND_TARGET, "batched is only available for FindTargetEnv"
+        assert case["num_targets"] == 1, "FindTargetVecEnv has one target per env"
+        self.env = FindTargetVecEnv(
+            num_envs=case["num_envs"],
+            size=case["size"],
+            max_episode_steps=MAX_EPISODE_STEPS,
+            render_mode=None if case["render_mode"] is None else "rgb_array",
+            window_size=case["window_size"],
+            step_backend=case["step_backend"],
+        )
+        self.render = case["render_mode"] is not None
+        self.num_envs = case["num_envs"]
+
+    def reset(self, seed: int | None = None):
+        self.env.reset(seed=seed)
+
+    def sample_actions(self, rng: np.random.Generator, steps: int):
+        return list(rng.integers(0, self.env.single_action_space.n, size=(steps, self.num_envs)))
+
+    def step(self, action):
+        self.env.step(action)
+        if self.render:
+            self.env.render()
+
+
+RUNNERS = {
+    "scalar": _ScalarRunner,
+    "dummy": _SB3VecRunner,
+    "subproc": _SB3VecRunner,
+    "shm": _SB3VecRunner,
+    "batched": _BatchedRunner,
+}
+
+
+def run_case(case: dict) -> dict:
+    """
+    Runs one benchmark case in the current process
+    :return: The measurements of the case
+    """
+    rng = np.random.default_rng(case["seed"])
+    runner = RUNNERS[case["vectorization"]](case)
+    runner.reset(seed=case["seed"])
+    actions = runner.sample_actions(rng, case["warmup_steps"] + case["steps"])
+
+    for action in actions[: case["warmup_steps"]]:
+        runner.step(action)
+
+    # step latency, including the resets of finished episodes
+    latencies = np.empty((case["steps"],))
+    for i, action in enumerate(actions[case["warmup_steps"] :]):
+        start = time.perf_counter()
+        runner.step(action)
+        latencies[i] = time.perf_counter() - start
+
+    reset_latencies = np.empty((case["resets"],))
+    for i in range(case["resets"]):
+        start = time.perf_counter()
+        runner.reset()
+        reset_latencies[i] = time.perf_counter() - start
+
+    # allocations, measured in a separate pass because tracing slows everything down
+    allocation_steps = min(case["steps"], case["allocation_steps"])
+    tracemalloc.start()
+    snapshot_start = tracemalloc.take_snapshot()
+    peaks = np.empty((allocation_steps,))
+    for i, action in enumerate(actions[:allocation_steps]):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        runner.step(action)
+        peaks[i] = tracemalloc.get_traced_memory()[1] - current
+    allocated_blocks = sum(
+        stat.count_diff
+        for stat in tracemalloc.take_snapshot().compare_to(snapshot_start, "filename")
+        if stat.count_diff > 0
+    )
+    tracemalloc.stop()
+    runner.close()
+
+    batch_step = float(latencies.sum() / case["steps"])
+    return {
+        "env_steps_per_sec": runner.num_envs / batch_step,
+        "batch_steps_per_sec": 1 / batch_step,
+        "step_p50_us": float(np.percentile(latencies, 50) * 1e6),
+        "step_p99_us": float(np.percentile(latencies, 99) * 1e6),
+        "reset_mean_us": float(reset_latencies.mean() * 1e6),
+        "alloc_peak_bytes_per_step": float(np.median(peaks)),
+        "retained_blocks_per_step": allocated_blocks / allocation_steps,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def _environment_info() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def build_cases(args) -> list[dict]:
+    cases = []
+    for env, vectorization, num_envs, size, num_targets, render_mode in itertools.product(
+        args.envs, args.vectorizations, args.num_envs, args.sizes, args.targets, args.render_modes
+    ):
+        if vectorization == "scalar" and num_envs != args.num_envs[0]:
+            continue
+        if vectorization == "batched" and (env != FIND_TARGET or num_targets != 1):
+            continue
+        if env != FIND_TARGET and (size != args.sizes[0] or num_targets != args.targets[0]):
+            continue
+        render_backend = "numpy" if render_mode == "rgb_array_numpy" else "pygame"
+        cases.append(
+            {
+                "env": env,
+                "vectorization": vectorization,
+                "num_envs": 1 if vectorization == "scalar" else num_envs,
+                "size": size,
+                "num_targets": num_targets,
+                "render_mode": None if render_mode == "none" else "rgb_array",
+                "render_backend": render_backend,
+                "window_size": args.window_size,
+                "step_backend": args.step_backend,
+                "steps": args.steps,
+                "warmup_steps": args.warmup_steps,
+                "resets": args.resets,
+                "allocation_steps": args.allocation_steps,
+                "seed": args.seed,
+            }
+        )
+    return cases
+
+
+def run_in_subprocess(case: dict) -> dict:
+    """
+    Runs a case in a fresh interpreter, so peak RSS and imports of one case do not leak into the next
+    """
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.throughput", "--child", json.dumps(case)],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+CASE_KEYS = ("env", "vectorization", "num_envs", "size", "num_targets", "render_mode", "render_backend")
+
+
+def _case_label(result: dict) -> str:
+    render = "none" if result["render_mode"] is None else f"{result['render_mode']}/{result['render_backend']}"
+    return (
+        f"{result['env']:>12} {result['vectorization']:>8} {result['num_envs']:>5} {result['size']:>5}"
+        f" {result['num_targets']:>7} {render:>18}"
+    )
+
+
+def print_results(results: list[dict]):
+    print(
+        f"{'env':>12} {'vec':>8} {'envs':>5} {'size':>5} {'targets':>7} {'render':>18}"
+        f" {'steps/s':>11} {'p50 us':>9} {'p99 us':>9} {'reset us':>9} {'alloc B':>9} {'RSS MB':>7}"
+    )
+    for result in results:
+        if "error" in result:
+            print(f"{_case_label(result)}  error: {result['error']}")
+            continue
+        print(
+            f"{_case_label(result)} {result['env_steps_per_sec']:>11.0f} {result['step_p50_us']:>9.1f}"
+            f" {result['step_p99_us']:>9.1f} {result['reset_mean_us']:>9.1f}"
+            f" {result['alloc_peak_bytes_per_step']:>9.0f} {result['peak_rss_mb']:>7.1f}"
+        )
+
+
+def load_results(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(old_path: str, new_path: str):
+    """
+    Prints the throughput and latency ratios (new / old) of the cases contained in both files
+    """
+    old = {tuple(r[k] for k in CASE_KEYS): r for r in load_results(old_path) if "error" not in r}
+    print(f"{'env':>12} {'vec':>8} {'envs':>5} {'size':>5} {'targets':>7} {'render':>18} {'steps/s x':>10} {'p99 x':>7}")
+    for new in load_results(new_path):
+        key = tuple(new[k] for k in CASE_KEYS)
+        if "error" in new or key not in old:
+            continue
+        speedup = new["env_steps_per_sec"] / old[key]["env_steps_per_sec"]
+        p99 = new["step_p99_us"] / old[key]["step_p99_us"]
+        print(f"{_case_label(new)} {speedup:>10.2f} {p99:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envs", nargs="+", default=[FIND_TARGET], help=f"'{FIND_TARGET}' or gymnasium ids")
+    parser.add_argument("--vectorizations", nargs="+", choices=VECTORIZATIONS, default=["scalar", "dummy", "batched"])
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[64])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5])
+    parser.add_argument("--targets", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "--render-modes", nargs="+", choices=["none", "rgb_array", "rgb_array_numpy"], default=["none"]
+    )
+    parser.add_argument("--window-size", type=int, default=84)
+    parser.add_argument("--step-backend", choices=["numpy", "numba"], default="numpy")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--warmup-steps", type=int, default=100)
+    parser.add_argument("--resets", type=int, default=200)
+    parser.add_argument("--allocation-steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Append the results as JSON lines to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_case(json.loads(args.child))))
+        return
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+
+    info = _environment_info()
+    results = []
+    for case in build_cases(args):
+        result = {**info, **case, **run_in_subprocess(case)}
+        results.append(result)
+        if args.output is not None:
+            with open(args.output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Asynchronous checkpoints of SB3 models and memory-mapped loading.
+
+A checkpoint is a directory with two files:
+    tensors.bin  all tensors of the policy and optimizer state dicts, 64 byte aligned, in their native dtype
+    index.json   the structure of the state dicts (tensor entries point into tensors.bin), num_timesteps and algo
+
+AsyncCheckpointCallback copies the state dicts on the training thread (a memcpy of the weights) and writes
+them in a background thread. load_checkpoint memory-maps tensors.bin, so resuming and starting many
+evaluation workers from one checkpoint read the weights from the shared page cache instead of unpickling a zip.
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+from typing import Callable
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+
+ALIGNMENT = 64
+
+
+def _flatten(value, tensors: list[torch.Tensor]):
+    """
+    Converts a (nested) state dict to JSON, the tensors are replaced by their index in tensors
+    """
+    if isinstance(value, torch.Tensor):
+        tensors.append(value)
+        return {"__tensor__": len(tensors) - 1}
+    if isinstance(value, dict):
+        # optimizer states use int keys, so the keys are stored with their type
+        return {"__dict__": [[key, _flatten(item, tensors)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_flatten(item, tensors) for item in value]
+    return value
+
+
+def _unflatten(value, tensors: list[torch.Tensor]):
+    if isinstance(value, dict):
+        if "__tensor__" in value:
+            return tensors[value["__tensor__"]]
+        return {key: _unflatten(item, tensors) for key, item in value["__dict__"]}
+    if isinstance(value, list):
+        return [_unflatten(item, tensors) for item in value]
+    return value
+
+
+def snapshot_parameters(model) -> dict:
+    """
+    :return: A CPU copy of the policy and optimizer state dicts of the model (model.get_parameters())
+    """
+    return {
+        name: _map_tensors(state_dict, lambda tensor: tensor.detach().to("cpu", copy=True))
+        for name, state_dict in model.get_parameters().items()
+    }
+
+
+def _map_tensors(value, function):
+    if isinstance(value, torch.Tensor):
+        return function(value)
+    if isinstance(value, dict):
+        return {key: _map_tensors(item, function) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_map_tensors(item, function) for item in value)
+    return value
+
+
+def save_checkpoint(path: str, parameters: dict, meta: dict | None = None):
+    """
+    Writes a checkpoint directory, the directory is written under a temporary name and renamed when complete
+    :param path: The checkpoint directory
+    :param parameters: The state dicts, e.g. from snapshot_parameters
+    :param meta: Additional JSON data, e.g. num_timesteps
+    """
+    tensors = []
+    structure = _flatten(parameters, tensors)
+    entries = []
+    offset = 0
+    for tensor in tensors:
+        array = tensor.numpy()
+        entries.append({"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    with open(os.path.join(tmp_path, "tensors.bin"), "wb") as f:
+        for tensor, entry in zip(tensors, entries):
+            f.seek(entry["offset"])
+            f.write(np.ascontiguousarray(tensor.numpy()).tobytes())
+        f.truncate(max(offset, 1))
+    with open(os.path.join(tmp_path, "index.json"), "w") as f:
+        json.dump({"meta": meta or {}, "tensors": entries, "structure": structure}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, mmap: bool = True) -> tuple[dict, dict]:
+    """
+    Loads a checkpoint directory
+    :param path: The checkpoint directory
+    :param mmap: If True, the tensors are copy-on-write views of the memory-mapped tensors.bin
+        (nothing is read until it is used, writes stay private to the process), otherwise they are read into memory
+    :return: The state dicts and the meta data
+    """
+    with open(os.path.join(path, "index.json")) as f:
+        index = json.load(f)
+    bin_path = os.path.join(path, "tensors.bin")
+    if mmap:
+        data = np.memmap(bin_path, dtype=np.uint8, mode="c")
+    else:
+        data = np.fromfile(bin_path, dtype=np.uint8)
+    tensors = []
+    for entry in index["tensors"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"]))
+        array = data[entry["offset"] : entry["offset"] + count * dtype.itemsize].view(dtype).reshape(entry["shape"])
+        tensors.append(torch.from_numpy(array))
+    return _unflatten(index["structure"], tensors), index["meta"]
+
+
+def restore_checkpoint(model, path: str) -> dict:
+    """
+    Resumes training of a model from a checkpoint: sets the policy and optimizer state and num_timesteps.
+    The model has to be created with the same algorithm and hyperparameters, continue with
+    model.learn(..., reset_num_timesteps=False).
+    :return: The meta data of the checkpoint
+    """
+    parameters, meta = load_checkpoint(path)
+    model.set_parameters(parameters, exact_match=True, device=model.device)
+    model.num_timesteps = meta.get("num_timesteps", 0)
+    return meta
+
+
+def attach_policy(policy: torch.nn.Module, path: str):
+    """
+    Uses the memory-mapped weights of a checkpoint as the parameters of policy without copying them,
+    so all processes that attach the same checkpoint share one copy of the weights in the page cache.
+    Meant for inference (evaluation workers), the policy has to be on the CPU.
+    """
+    parameters, _ = load_checkpoint(path)
+    policy.load_state_dict(parameters["policy"], assign=True)
+
+
+def latest_checkpoint(directory: str) -> str | None:
+    """
+    :return: The complete checkpoint with the most timesteps in directory, or None
+    """
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def list_checkpoints(directory: str) -> list[str]:
+    """
+    :return: The complete checkpoint directories written by AsyncCheckpointCallback, oldest first
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = [
+        name
+        for name in os.listdir(directory)
+        if name.startswith("checkpoint_") and not name.endswith(".tmp")
+        and os.path.exists(os.path.join(directory, name, "index.json"))
+    ]
+    names.sort(key=lambda name: int(name.split("_")[1]))
+    return [os.path.join(directory, name) for name in names]
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Checkpoints the policy and optimizer state every save_freq env steps.
+    The state is copied on the training thread and written by a background thread,
+    only the last keep_last checkpoints are kept.
+    """
+
+    def __init__(
+        self,
+        save_freq: int,
+        directory: str,
+        keep_last: int = 3,
+        extra_meta: Callable[[], dict] | None = None,
+        verbose: int = 0,
+    ):
+        """
+
+        :param save_freq: Env steps between two checkpoints
+        :param directory: The checkpoints are written to directory/checkpoint_<num_timesteps>
+        :param keep_last: Number of checkpoints that are kept, at least 1 (the latest checkpoint is never deleted)
+        :param extra_meta: Called on every checkpoint, its JSON data is added to the meta data
+            (e.g. the curriculum stage), restore_checkpoint returns it
+        """
+        super().__init__(verbose)
+        assert keep_last >= 1, "keep_last has to be at least 1"
+        self.save_freq = save_freq
+        self.directory = directory
+        self.keep_last = keep_last
+        self.extra_meta = extra_meta
+        self.checkpoints_written = 0
+        # at most one snapshot waits for the writer, so a slow disk does not pile up copies of the weights
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        self._next_save = save_freq
+        self._error = None
+
+    def _on_training_start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name="AsyncCheckpointCallback", daemon=True)
+        self._thread.start()
+        self._next_save = self.num_timesteps + self.save_freq
+
+    def _on_step(self) -> bool:
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
+        if self.num_timesteps >= self._next_save:
+            self.save()
+            self._next_save += self.save_freq
+        return True
+
+    def save(self):
+        """
+        Snapshots the model now and queues the snapshot for writing
+        """
+        meta = {"num_timesteps": self.num_timesteps, "algo": type(self.model).__name__}
+        if self.extra_meta is not None:
+            meta.update(self.extra_meta())
+        path = os.path.join(self.directory, f"checkpoint_{self.num_timesteps}")
+        self._queue.put((path, snapshot_parameters(self.model), meta))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, parameters, meta = item
+            try:
+                save_checkpoint(path, parameters, meta)
+                self.checkpoints_written += 1
+                for old_path in list_checkpoints(self.directory)[: -self.keep_last]:
+                    shutil.rmtree(old_path, ignore_errors=True)
+                if self.verbose >= 1:
+                    print(f"Saved checkpoint {path}")
+            except Exception as e:
+                self._error = e
+
+    def _on_training_end(self) -> None:
+        self.save()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
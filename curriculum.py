@@ -0,0 +1,106 @@
+"""
+Curriculum learning on FindTargetEnv without restarting the envs.
+
+The envs are created with max_size, the largest grid of the curriculum, so the observations keep their shape and
+the policy network and the rollout buffers stay the same in all stages. CurriculumCallback tracks the success rate
+of the last episodes and moves all envs to the next stage with env_method("set_curriculum", ...), which reaches
+envs in the main process as well as in worker processes (dummy, subproc and shm backends).
+Episodes that are running when the stage changes finish in the old stage, the next reset starts the new one.
+
+    stages = [CurriculumStage(5), CurriculumStage(10, num_targets=2), CurriculumStage(20, target_velocity=0.5)]
+    env = make_training_env(num_envs=16, vec_env="shm", env_kwargs={"size": 5, "max_size": 20})
+    model.learn(..., callback=CurriculumCallback(stages))
+"""
+
+import collections
+from typing import NamedTuple
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+
+class CurriculumStage(NamedTuple):
+    size: int
+    num_targets: int = 1
+    # velocity of the targets, see target.Target
+    target_velocity: float = 0.0
+
+
+def parse_stage(text: str) -> CurriculumStage:
+    """
+    :param text: "size", "size:num_targets" or "size:num_targets:target_velocity", e.g. "10:2:0.5"
+    """
+    values = text.split(":")
+    if not 1 <= len(values) <= 3:
+        raise ValueError(f"Cannot parse the curriculum stage {text!r}")
+    types = (int, int, float)
+    return CurriculumStage(*(convert(value) for convert, value in zip(types, values)))
+
+
+class CurriculumCallback(BaseCallback):
+    """
+    Advances the envs through the stages of a curriculum when the rolling success rate
+    (the fraction of episodes that collected all targets before the time limit) reaches success_threshold.
+    Logs curriculum/stage, curriculum/size and curriculum/success_rate.
+    """
+
+    def __init__(
+        self,
+        stages: list[CurriculumStage],
+        success_threshold: float = 0.8,
+        window: int = 200,
+        stage: int = 0,
+        verbose: int = 0,
+    ):
+        """
+
+        :param stages: The stages, from the easiest to the hardest
+        :param success_threshold: Success rate over the last window episodes that completes a stage
+        :param window: Number of episodes of the rolling success rate, a stage lasts at least window episodes
+        :param stage: The stage training starts in, e.g. the stage of a resumed checkpoint
+        """
+        super().__init__(verbose)
+        assert len(stages) > 0
+        assert 0 <= stage < len(stages)
+        self.stages = [CurriculumStage(*stage) for stage in stages]
+        self.success_threshold = success_threshold
+        self.window = window
+        self.stage = stage
+        # (num_timesteps, stage) of every stage change
+        self.history = []
+        self._successes = collections.deque(maxlen=window)
+
+    @property
+    def success_rate(self) -> float:
+        return float(np.mean(self._successes)) if self._successes else 0.0
+
+    def _on_training_start(self) -> None:
+        self.set_stage(self.stage)
+
+    def set_stage(self, stage: int):
+        """
+        Sends a stage to all envs, it starts with their next episode
+        """
+        self.stage = stage
+        self.training_env.env_method("set_curriculum", **self.stages[stage]._asdict())
+        self._successes.clear()
+        self.history.append((self.num_timesteps, stage))
+        if self.verbose >= 1:
+            print(f"Curriculum stage {stage} at {self.num_timesteps} steps: {self.stages[stage]}")
+
+    def _on_step(self) -> bool:
+        infos = self.locals["infos"]
+        for i in np.flatnonzero(self.locals["dones"]):
+            self._successes.append(not infos[i].get("TimeLimit.truncated", False))
+        if (
+            self.stage < len(self.stages) - 1
+            and len(self._successes) == self.window
+            and self.success_rate >= self.success_threshold
+        ):
+            self.set_stage(self.stage + 1)
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self.logger.record("curriculum/stage", self.stage)
+        self.logger.record("curriculum/size", self.stages[self.stage].size)
+        self.logger.record("curriculum/success_rate", self.success_rate)
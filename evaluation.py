@@ -0,0 +1,369 @@
+"""
+Vectorized policy evaluation, in the training process or in a separate evaluation process.
+
+evaluate_vectorized runs M episodes across the N envs of a VecEnv with one batched model.predict per step.
+AsyncEvalCallback saves a snapshot of the model every eval_freq steps and hands it to an evaluation worker
+process, so training never waits for the evaluation. The summaries (mean / std / percentiles of the episode
+returns and lengths) are appended to a JSONL file and logged under eval/ in the training logs.
+
+Evaluate saved checkpoints (from the repository root):
+    python -m evaluation FindTarget_5e4.zip checkpoints/ --episodes 1000 --num-envs 64 --vec-env batched
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class EvaluationError(RuntimeError):
+    """
+    The evaluation process failed, the message contains its traceback
+    """
+
+
+def evaluate_vectorized(model, env: VecEnv, n_episodes: int, deterministic: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Runs n_episodes episodes across all envs of env, the actions of all envs are predicted in one batch.
+    Every env runs a fixed share of the episodes (like evaluate_policy), so short episodes are not over-represented.
+    :param model: The model (or anything with a SB3 predict method)
+    :param env: The vectorized env, it is reset first
+    :param n_episodes: Number of episodes
+    :param deterministic: Whether to use deterministic actions
+    :return: The returns and lengths of the episodes
+    """
+    num_envs = env.num_envs
+    episode_targets = np.array([(n_episodes + i) // num_envs for i in range(num_envs)], dtype=int)
+    episode_counts = np.zeros(num_envs, dtype=int)
+    current_returns = np.zeros(num_envs)
+    current_lengths = np.zeros(num_envs, dtype=int)
+    returns, lengths = [], []
+
+    obs = env.reset()
+    states = None
+    episode_starts = np.ones(num_envs, dtype=bool)
+    while (episode_counts < episode_targets).any():
+        actions, states = model.predict(obs, state=states, episode_start=episode_starts, deterministic=deterministic)
+        obs, rewards, dones, _ = env.step(actions)
+        current_returns += rewards
+        current_lengths += 1
+        for i in np.flatnonzero(dones & (episode_counts < episode_targets)):
+            returns.append(current_returns[i])
+            lengths.append(current_lengths[i])
+            episode_counts[i] += 1
+        current_returns[dones] = 0
+        current_lengths[dones] = 0
+        episode_starts = dones
+    return np.array(returns), np.array(lengths)
+
+
+def summarize(returns: np.ndarray, lengths: np.ndarray) -> dict:
+    """
+    :return: Mean, std, min, max and percentiles of the episode returns and lengths
+    """
+    summary = {"episodes": len(returns)}
+    for name, values in (("return", returns), ("length", lengths)):
+        summary[f"{name}_mean"] = float(np.mean(values))
+        summary[f"{name}_std"] = float(np.std(values))
+        summary[f"{name}_min"] = float(np.min(values))
+        summary[f"{name}_max"] = float(np.max(values))
+        for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            summary[f"{name}_p{percentile}"] = float(value)
+    return summary
+
+
+def _load_model(algo: str, path: str):
+    from stable_baselines3 import DQN, PPO
+
+    return {"PPO": PPO, "DQN": DQN}[algo].load(path, device="cpu")
+
+
+def _evaluation_worker(
+    checkpoints: mp.Queue,
+    results: mp.Queue,
+    algo: str,
+    env_config: dict,
+    n_episodes: int,
+    seed: int,
+    results_path: str | None,
+):
+    """
+    Evaluates the checkpoints put into the checkpoints queue until it receives None.
+    The env is created once, every evaluation starts from the same seed, so checkpoints are compared on the same episodes.
+    An exception stops the worker, it is reported on the results queue as {"error": traceback}.
+    """
+    try:
+        _evaluate_checkpoints(checkpoints, results, algo, env_config, n_episodes, seed, results_path)
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+        raise
+
+
+def _evaluate_checkpoints(
+    checkpoints: mp.Queue,
+    results: mp.Queue,
+    algo: str,
+    env_config: dict,
+    n_episodes: int,
+    seed: int,
+    results_path: str | None,
+):
+    import torch
+
+    from training import make_training_env
+
+    # leave the cores to the training process
+    torch.set_num_threads(1)
+    env = make_training_env(**env_config)
+    while True:
+        item = checkpoints.get()
+        if item is None:
+            break
+        path, timesteps, curriculum_stage = item
+        start_time = time.perf_counter()
+        if curriculum_stage is not None:
+            # applied by the reset at the start of the evaluation
+            env.env_method("set_curriculum", **curriculum_stage)
+        env.seed(seed)
+        returns, lengths = evaluate_vectorized(_load_model(algo, path), env, n_episodes)
+        summary = {
+            "checkpoint": path,
+            "timesteps": timesteps,
+            "curriculum_stage": curriculum_stage,
+            **summarize(returns, lengths),
+            "eval_time": time.perf_counter() - start_time,
+        }
+        if results_path is not None:
+            with open(results_path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+        results.put(summary)
+    env.close()
+
+
+class EvaluationWorker:
+    """
+    Evaluation process that evaluates checkpoint files in the background.
+    If the process fails, submit, poll and close raise an EvaluationError
+    """
+
+    def __init__(
+        self,
+        algo: str,
+        env_config: dict,
+        n_episodes: int = 1000,
+        seed: int = 0,
+        results_path: str | None = None,
+        start_method: str | None = None,
+    ):
+        """
+
+        :param algo: "PPO" or "DQN"
+        :param env_config: Keyword arguments of training.make_training_env for the evaluation env,
+            e.g. {"env_id": "FindTargetEnv-v0", "num_envs": 64, "vec_env": "batched", "env_kwargs": {"size": 5}}
+        :param n_episodes: Episodes per checkpoint
+        :param seed: Seed of the evaluation env
+        :param results_path: JSONL file the summaries are appended to
+        :param start_method: Start method of the process, defaults to 'forkserver' if available and 'spawn' otherwise
+        """
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        self.checkpoints = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = ctx.Process(
+            target=_evaluation_worker,
+            args=(self.checkpoints, self.results, algo, env_config, n_episodes, seed, results_path),
+            daemon=True,
+        )
+        self.process.start()
+
+    def submit(self, path: str, timesteps: int | None = None, curriculum_stage: dict | None = None):
+        """
+        Queues a checkpoint for evaluation, returns immediately
+        :param curriculum_stage: Keyword arguments of set_curriculum of the evaluation envs, see curriculum.py
+        """
+        if not self.process.is_alive():
+            self._raise_if_failed(self.poll())
+        self.checkpoints.put((path, timesteps, curriculum_stage))
+
+    def poll(self) -> list[dict]:
+        """
+        :return: The summaries of the evaluations finished since the last call, does not block
+        """
+        # the exit code is read first, so everything the process put on the queue before it died is drained
+        exitcode = self.process.exitcode
+        summaries = []
+        while True:
+            try:
+                summaries.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self._raise_if_failed(summaries, exitcode)
+        return summaries
+
+    def _raise_if_failed(self, summaries: list[dict], exitcode: int | None = None):
+        for summary in summaries:
+            if "error" in summary:
+                raise EvaluationError(f"The evaluation process failed:\n{summary['error']}")
+        if exitcode is not None and exitcode != 0:
+            raise EvaluationError(f"The evaluation process exited with code {exitcode}")
+
+    def close(self, wait: bool = True) -> list[dict]:
+        """
+        Stops the worker
+        :param wait: If True, the queued checkpoints are evaluated first
+        :return: The summaries that were not polled yet
+        """
+        if not wait:
+            summaries = self.poll()
+            self.process.terminate()
+            self.process.join()
+            return summaries
+        self.checkpoints.put(None)
+        summaries = []
+        while self.process.is_alive() or not self.results.empty():
+            try:
+                summaries.append(self.results.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        self.process.join()
+        self._raise_if_failed(summaries, self.process.exitcode)
+        return summaries
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Saves a snapshot of the model every eval_freq env steps and evaluates it in an EvaluationWorker.
+    Training only pays for saving the snapshot, the results are logged (eval/mean_reward, eval/std_reward, ...)
+    as soon as the evaluation finished.
+    """
+
+    def __init__(
+        self,
+        env_config: dict,
+        eval_freq: int,
+        checkpoint_dir: str,
+        n_episodes: int = 1000,
+        seed: int = 0,
+        results_path: str | None = None,
+        wait_at_end: bool = True,
+        curriculum=None,
+        verbose: int = 0,
+    ):
+        """
+
+        :param env_config: Keyword arguments of training.make_training_env for the evaluation env
+        :param eval_freq: Env steps between two evaluations
+        :param checkpoint_dir: Directory of the snapshots
+        :param n_episodes: Episodes per evaluation
+        :param seed: Seed of the evaluation env
+        :param results_path: JSONL file of the summaries, defaults to checkpoint_dir/evaluations.jsonl
+        :param wait_at_end: Wait for the evaluations of the last snapshots at the end of training
+        :param curriculum: The curriculum.CurriculumCallback of the training, snapshots are evaluated in the stage
+            that was active when they were taken (the env_config needs the max_size of the curriculum)
+        """
+        super().__init__(verbose)
+        self.env_config = env_config
+        self.eval_freq = eval_freq
+        self.checkpoint_dir = checkpoint_dir
+        self.n_episodes = n_episodes
+        self.seed = seed
+        self.results_path = results_path or os.path.join(checkpoint_dir, "evaluations.jsonl")
+        self.wait_at_end = wait_at_end
+        self.curriculum = curriculum
+        self.worker = None
+        self.summaries = []
+        self._next_eval = eval_freq
+
+    def _on_training_start(self) -> None:
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.worker = EvaluationWorker(
+            type(self.model).__name__,
+            self.env_config,
+            n_episodes=self.n_episodes,
+            seed=self.seed,
+            results_path=self.results_path,
+        )
+        self._next_eval = self.num_timesteps + self.eval_freq
+
+    def _on_step(self) -> bool:
+        if self.num_timesteps >= self._next_eval:
+            path = os.path.join(self.checkpoint_dir, f"snapshot_{self.num_timesteps}_steps.zip")
+            self.model.save(path)
+            stage = None
+            if self.curriculum is not None:
+                stage = self.curriculum.stages[self.curriculum.stage]._asdict()
+            self.worker.submit(path, self.num_timesteps, stage)
+            self._next_eval += self.eval_freq
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self._record(self.worker.poll())
+
+    def _record(self, summaries: list[dict]):
+        for summary in summaries:
+            self.summaries.append(summary)
+            self.logger.record("eval/mean_reward", summary["return_mean"])
+            self.logger.record("eval/std_reward", summary["return_std"])
+            self.logger.record("eval/p5_reward", summary["return_p5"])
+            self.logger.record("eval/mean_ep_length", summary["length_mean"])
+            self.logger.record("eval/checkpoint_timesteps", summary["timesteps"])
+            if self.verbose >= 1:
+                print(
+                    f"Eval of {summary['timesteps']} steps: reward {summary['return_mean']:.2f} "
+                    f"+/- {summary['return_std']:.2f} over {summary['episodes']} episodes"
+                )
+
+    def _on_training_end(self) -> None:
+        self._record(self.worker.close(wait=self.wait_at_end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("checkpoints", nargs="+", help="Model files or directories of model files")
+    parser.add_argument("--algo", choices=["PPO", "DQN"], default="PPO")
+    parser.add_argument("--env-id", default="FindTargetEnv-v0")
+    parser.add_argument("--size", type=int, default=None, help="Grid size of FindTargetEnv")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--num-envs", type=int, default=64)
+    parser.add_argument("--vec-env", default="dummy", help="Backend of training.make_training_env")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSONL file the summaries are appended to")
+    args = parser.parse_args()
+
+    from training import make_training_env, register_find_target_env
+
+    paths = []
+    for path in args.checkpoints:
+        paths.extend(sorted(glob.glob(os.path.join(path, "*.zip"))) if os.path.isdir(path) else [path])
+    register_find_target_env()
+    env_kwargs = {} if args.size is None else {"size": args.size}
+    env = make_training_env(args.env_id, num_envs=args.num_envs, vec_env=args.vec_env, env_kwargs=env_kwargs)
+    for path in paths:
+        start_time = time.perf_counter()
+        env.seed(args.seed)
+        returns, lengths = evaluate_vectorized(_load_model(args.algo, path), env, args.episodes)
+        summary = {"checkpoint": path, **summarize(returns, lengths), "eval_time": time.perf_counter() - start_time}
+        print(
+            f"{path}: reward {summary['return_mean']:.2f} +/- {summary['return_std']:.2f} "
+            f"(p5 {summary['return_p5']:.2f}, p50 {summary['return_p50']:.2f}), "
+            f"length {summary['length_mean']:.1f}, {summary['episodes']} episodes in {summary['eval_time']:.2f}s"
+        )
+        if args.output is not None:
+            with open(args.output, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+    env.close()
+
+
+if __name__ == "__main__":
+    main()
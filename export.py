@@ -0,0 +1,218 @@
+"""
+Exports the MLP policy of a saved PPO / A2C / DQN model to a NumPy .npz file for numpy_policy.NumpyPolicy
+(and optionally to ONNX) and checks that the exported policy predicts the same actions as model.predict.
+
+Usage (from the repository root):
+    python -m export LunarLanderModel_1e6.zip --output LunarLanderModel_1e6.npz
+    python -m export FindTarget_5e4.zip --observations recorded_obs.npy --onnx FindTarget_5e4.onnx
+"""
+
+import argparse
+import json
+
+import numpy as np
+import torch
+from gymnasium import spaces
+
+from inference import load_model, sample_observations
+from numpy_policy import NumpyPolicy
+
+ACTIVATION_NAMES = {
+    torch.nn.Tanh: "tanh",
+    torch.nn.ReLU: "relu",
+    torch.nn.ELU: "elu",
+    torch.nn.LeakyReLU: "leaky_relu",
+    torch.nn.Sigmoid: "sigmoid",
+    torch.nn.Identity: "identity",
+}
+
+
+def _sequential_layers(modules) -> list[tuple]:
+    """
+    :return: ("linear", weight, bias) / ("activation", name) for every module
+    """
+    layers = []
+    for module in modules:
+        if isinstance(module, torch.nn.Linear):
+            layers.append(("linear", module.weight.detach().cpu().numpy(), module.bias.detach().cpu().numpy()))
+        elif type(module) in ACTIVATION_NAMES:
+            layers.append(("activation", ACTIVATION_NAMES[type(module)]))
+        elif isinstance(module, torch.nn.Flatten):
+            continue
+        else:
+            raise ValueError(f"Cannot export {type(module).__name__} layers")
+    return layers
+
+
+def _space_meta(space: spaces.Space) -> dict:
+    if isinstance(space, spaces.Discrete):
+        return {"type": "discrete", "n": int(space.n), "shape": []}
+    if isinstance(space, spaces.Box):
+        return {"type": "box", "shape": list(space.shape), "low": space.low.tolist(), "high": space.high.tolist()}
+    raise ValueError(f"Cannot export policies with {type(space).__name__} spaces")
+
+
+def extract_policy(model) -> tuple[list[tuple], dict]:
+    """
+    Extracts the actor of a model: the layers that map an observation to the logits / action mean / Q-values
+    :param model: A PPO, A2C or DQN model with an MlpPolicy
+    :return: The layers and the meta data of NumpyPolicy
+    """
+    from stable_baselines3.common.torch_layers import FlattenExtractor
+
+    policy = model.policy
+    algo = type(model).__name__
+    if algo == "DQN":
+        if not isinstance(policy.q_net.features_extractor, FlattenExtractor):
+            raise ValueError("Only MlpPolicy (FlattenExtractor) can be exported")
+        layers = _sequential_layers(policy.q_net.q_net)
+    else:
+        if not isinstance(policy.pi_features_extractor, FlattenExtractor):
+            raise ValueError("Only MlpPolicy (FlattenExtractor) can be exported")
+        layers = _sequential_layers(policy.mlp_extractor.policy_net) + _sequential_layers([policy.action_net])
+
+    meta = {
+        "algo": algo,
+        "layers": [
+            {"type": "linear"} if layer[0] == "linear" else {"type": "activation", "name": layer[1]}
+            for layer in layers
+        ],
+        "observation_space": _space_meta(model.observation_space),
+        "action_space": _space_meta(model.action_space),
+    }
+    if isinstance(model.action_space, spaces.Box):
+        meta["action_space"]["squash"] = bool(policy.squash_output)
+        meta["log_std"] = policy.log_std.detach().cpu().numpy().tolist()
+    return layers, meta
+
+
+def export_policy(model, path: str) -> NumpyPolicy:
+    """
+    Writes the actor weights and meta data of the model to an .npz file
+    :return: The exported policy
+    """
+    layers, meta = extract_policy(model)
+    arrays = {"meta": np.array(json.dumps(meta))}
+    for i, layer in enumerate(layers):
+        if layer[0] == "linear":
+            arrays[f"layer_{i}_weight"] = layer[1]
+            arrays[f"layer_{i}_bias"] = layer[2]
+    np.savez(path, **arrays)
+    return NumpyPolicy.load(path)
+
+
+def export_onnx(model, path: str):
+    """
+    Exports the deterministic actor (logits / action mean / Q-values for a batch of observations) to ONNX.
+    Needs the optional onnx package.
+    """
+    try:
+        import onnx  # noqa: F401
+    except ImportError as e:
+        raise ImportError("The ONNX export needs onnx, install it with `pip install onnx`") from e
+
+    policy = model.policy
+
+    class Actor(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.policy = policy
+
+        def forward(self, observations):
+            if type(model).__name__ == "DQN":
+                return self.policy.q_net(observations)
+            features = self.policy.extract_features(observations, self.policy.pi_features_extractor)
+            return self.policy.action_net(self.policy.mlp_extractor.forward_actor(features))
+
+    observation = torch.as_tensor(model.observation_space.sample()[np.newaxis], dtype=torch.float32)
+    torch.onnx.export(
+        Actor().eval(),
+        (observation,),
+        path,
+        input_names=["observations"],
+        output_names=["outputs"],
+        dynamic_axes={"observations": {0: "batch"}, "outputs": {0: "batch"}},
+        dynamo=False,
+    )
+
+
+def check_equivalence(model, policy: NumpyPolicy, observations: np.ndarray, atol: float = 1e-5) -> dict:
+    """
+    Compares the deterministic actions of the exported policy with model.predict
+    :param observations: A batch of (recorded) observations
+    :return: Number of observations, number of different actions and the max. difference of the actor outputs
+    """
+    expected, _ = model.predict(observations, deterministic=True)
+    actions, _ = policy.predict(observations, deterministic=True)
+    with torch.no_grad():
+        obs_tensor, _ = model.policy.obs_to_tensor(observations)
+        if type(model).__name__ == "DQN":
+            outputs = model.policy.q_net(obs_tensor)
+        else:
+            features = model.policy.extract_features(obs_tensor, model.policy.pi_features_extractor)
+            outputs = model.policy.action_net(model.policy.mlp_extractor.forward_actor(features))
+    difference = np.abs(outputs.cpu().numpy() - policy.forward(observations)).max()
+    mismatches = int(np.count_nonzero(np.any((actions != expected).reshape(len(observations), -1), axis=1)))
+    return {
+        "observations": len(observations),
+        "action_mismatches": mismatches,
+        "max_output_difference": float(difference),
+        "equivalent": bool(mismatches == 0 and difference <= atol),
+    }
+
+
+def record_observations(model, env_id: str | None, num_steps: int, seed: int = 0) -> np.ndarray:
+    """
+    Records the observations of the model acting in its env, or samples them from the observation space
+    if the env cannot be created (e.g. Box2D is not installed for LunarLander)
+    """
+    if env_id is not None:
+        try:
+            from training import make_training_env
+
+            env = make_training_env(env_id, num_envs=1, seed=seed)
+        except Exception as e:
+            print(f"Cannot create {env_id} ({e!r}), sampling observations from the observation space")
+        else:
+            observations = []
+            obs = env.reset()
+            for _ in range(num_steps):
+                observations.append(obs[0])
+                action, _ = model.predict(obs, deterministic=False)
+                obs, _, _, _ = env.step(action)
+            env.close()
+            return np.stack(observations)
+    return sample_observations(model.observation_space, num_steps, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help="The saved model (.zip)")
+    parser.add_argument("--algo", choices=["PPO", "DQN"], default="PPO")
+    parser.add_argument("--output", default=None, help="The .npz file, defaults to the model path with .npz")
+    parser.add_argument("--onnx", default=None, help="Also export to this ONNX file")
+    parser.add_argument("--observations", default=None, help=".npy file of recorded observations for the check")
+    parser.add_argument("--env-id", default=None, help="Record the observations for the check in this env")
+    parser.add_argument("--num-observations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    model = load_model(args.model, args.algo)
+    output = args.output or args.model.removesuffix(".zip") + ".npz"
+    policy = export_policy(model, output)
+    print(f"exported {args.model} to {output}")
+    if args.onnx is not None:
+        export_onnx(model, args.onnx)
+        print(f"exported {args.model} to {args.onnx}")
+
+    if args.observations is not None:
+        observations = np.load(args.observations)
+    else:
+        observations = record_observations(model, args.env_id, args.num_observations)
+    result = check_equivalence(model, policy, observations)
+    print(json.dumps(result, indent=2))
+    if not result["equivalent"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
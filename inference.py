@@ -0,0 +1,349 @@
+"""
+Batched inference for saved SB3 models.
+
+The InferenceServer loads a model once and answers action queries from many threads (or, with serve_unix,
+from other processes through a Unix socket). Concurrent queries are collected into micro-batches of up to
+max_batch_size observations, or whatever arrived within max_delay seconds, and answered with a single
+forward pass under torch.inference_mode.
+
+Serve a model (from the repository root):
+    python -m inference LunarLanderModel_1e6.zip --socket /tmp/lunar_lander.sock
+Measure throughput and tail latency with 64 concurrent clients:
+    python -m inference LunarLanderModel_1e6.zip --benchmark --clients 64 --requests 20000
+"""
+
+import argparse
+import collections
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+from gymnasium import spaces
+
+# training hyperparameters that are not needed for inference, loading them only produces warnings
+INFERENCE_CUSTOM_OBJECTS = {
+    "learning_rate": 0.0,
+    "lr_schedule": lambda _: 0.0,
+    "clip_range": lambda _: 0.0,
+    "exploration_schedule": lambda _: 0.0,
+}
+
+
+# bound of the entries of sampled observations, for Boxes with huge or infinite bounds
+SAMPLE_BOUND = 1000
+
+
+def sample_observations(observation_space: spaces.Space, num_observations: int, seed: int = 0) -> np.ndarray:
+    """
+    Random observations for benchmarks and checks. Unlike observation_space.sample, this works for every Box:
+    the entries are drawn uniformly between their bounds, clipped to [-SAMPLE_BOUND, SAMPLE_BOUND]
+    """
+    if not isinstance(observation_space, spaces.Box):
+        observation_space.seed(seed)
+        return np.stack([observation_space.sample() for _ in range(num_observations)])
+    rng = np.random.default_rng(seed)
+    low = np.clip(observation_space.low, -SAMPLE_BOUND, SAMPLE_BOUND).astype(np.float64)
+    high = np.clip(observation_space.high, -SAMPLE_BOUND, SAMPLE_BOUND).astype(np.float64)
+    shape = (num_observations, *observation_space.shape)
+    if np.issubdtype(observation_space.dtype, np.integer):
+        observations = rng.integers(low.astype(np.int64), high.astype(np.int64), size=shape, endpoint=True)
+    else:
+        observations = rng.uniform(low, high, size=shape)
+    return observations.astype(observation_space.dtype)
+
+
+def load_model(path: str, algo: str = "PPO", device: str = "cpu"):
+    """
+    Loads a saved model for inference (without env and without the training schedules)
+    :param path: The .zip file
+    :param algo: "PPO" or "DQN"
+    """
+    from stable_baselines3 import DQN, PPO
+
+    return {"PPO": PPO, "DQN": DQN}[algo].load(path, device=device, custom_objects=INFERENCE_CUSTOM_OBJECTS)
+
+
+class InferenceServer:
+    """
+    Answers action queries with micro-batched forward passes of a policy in a background thread
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        algo: str = "PPO",
+        max_batch_size: int = 256,
+        max_delay: float = 0.001,
+        deterministic: bool = True,
+        device: str = "cpu",
+        latency_window: int = 100_000,
+    ):
+        """
+
+        :param model_path: The saved model (.zip)
+        :param algo: "PPO" or "DQN"
+        :param max_batch_size: Maximum number of observations per forward pass
+        :param max_delay: Seconds the first query of a batch waits for more queries
+        :param deterministic: Whether to use deterministic actions
+        :param device: The torch device of the policy
+        :param latency_window: Number of recent queries the latency statistics are computed from
+        """
+        self.model = load_model(model_path, algo, device)
+        self.policy = self.model.policy
+        self.policy.set_training_mode(False)
+        self.observation_shape = self.policy.observation_space.shape
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.deterministic = deterministic
+
+        self.requests = 0
+        self.batches = 0
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._start_time = time.perf_counter()
+
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve_loop, name="InferenceServer", daemon=True)
+        self._thread.start()
+
+    def submit(self, observation: np.ndarray) -> Future:
+        """
+        Queues an action query without blocking.
+        Observations of the wrong shape are rejected here, so they never fail the batch of other queries
+        :param observation: A single observation
+        :return: A future of the action
+        """
+        if self._closed:
+            raise RuntimeError("submit on a closed InferenceServer")
+        observation = np.asarray(observation)
+        if self.observation_shape is not None and observation.shape != self.observation_shape:
+            raise ValueError(
+                f"Expected an observation of shape {self.observation_shape}, got shape {observation.shape}"
+            )
+        future = Future()
+        self._queue.put((observation, future, time.perf_counter()))
+        return future
+
+    def predict(self, observation: np.ndarray, timeout: float | None = None) -> np.ndarray:
+        """
+        :param observation: A single observation
+        :return: The action, blocks until the batch of the query was computed
+        """
+        return self.submit(observation).result(timeout)
+
+    def _next_batch(self) -> list | None:
+        """
+        Waits for the first query, then collects queries until the batch is full or max_delay passed
+        :return: The queries or None if the server was closed
+        """
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # answer the collected queries first, stop afterwards
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _serve_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            observations, futures, start_times = zip(*batch)
+            try:
+                actions = self.forward(np.stack(observations))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            end_time = time.perf_counter()
+            for future, action, start_time in zip(futures, actions, start_times):
+                future.set_result(action)
+                self._latencies.append(end_time - start_time)
+            self.requests += len(batch)
+            self.batches += 1
+
+    def forward(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Computes the actions of a batch of observations, like policy.predict without the per-call checks
+        :param observations: (batch size, *observation shape)
+        :return: (batch size, *action shape)
+        """
+        with torch.inference_mode():
+            obs_tensor, _ = self.policy.obs_to_tensor(observations)
+            actions = self.policy._predict(obs_tensor, deterministic=self.deterministic)
+        actions = actions.cpu().numpy().reshape((-1, *self.policy.action_space.shape))
+        if isinstance(self.policy.action_space, spaces.Box):
+            if self.policy.squash_output:
+                actions = self.policy.unscale_action(actions)
+            else:
+                actions = np.clip(actions, self.policy.action_space.low, self.policy.action_space.high)
+        return actions
+
+    def stats(self) -> dict:
+        """
+        :return: Queries, queries per second and mean batch size since the start,
+            mean / p50 / p99 / p99.9 latency of the recent queries in milliseconds
+        """
+        latencies = np.array(self._latencies) * 1e3
+        stats = {
+            "requests": self.requests,
+            "requests_per_sec": self.requests / (time.perf_counter() - self._start_time),
+            "mean_batch_size": self.requests / max(self.batches, 1),
+        }
+        if len(latencies) > 0:
+            stats["latency_mean_ms"] = float(latencies.mean())
+            for name, percentile in (("p50", 50), ("p99", 99), ("p999", 99.9)):
+                stats[f"latency_{name}_ms"] = float(np.percentile(latencies, percentile))
+        return stats
+
+    def reset_stats(self):
+        self.requests = 0
+        self.batches = 0
+        self._latencies.clear()
+        self._start_time = time.perf_counter()
+
+    def close(self):
+        """
+        Answers the queued queries and stops the server thread
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def serve_unix(self, path: str) -> socketserver.BaseServer:
+        """
+        Creates a server for the queries of other processes on a Unix socket, call serve_forever on it to serve them
+        (until its shutdown is called). Every connection runs in its own thread, so the queries of concurrent clients end up in the same batches.
+        The protocol is one JSON object per line: {"obs": [...]} is answered with {"action": ...}.
+        """
+        inference_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        observation = np.asarray(json.loads(line)["obs"], dtype=np.float32)
+                        reply = {"action": inference_server.predict(observation).tolist()}
+                    except Exception as e:
+                        reply = {"error": repr(e)}
+                    self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+        if os.path.exists(path):
+            os.remove(path)
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        return server
+
+
+class InferenceClient:
+    """
+    Client of InferenceServer.serve_unix
+    """
+
+    def __init__(self, path: str):
+        import socket
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._file = self._socket.makefile("rwb")
+
+    def predict(self, observation: np.ndarray) -> np.ndarray:
+        self._file.write(json.dumps({"obs": np.asarray(observation).tolist()}).encode() + b"\n")
+        self._file.flush()
+        reply = json.loads(self._file.readline())
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return np.asarray(reply["action"])
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def benchmark(server: InferenceServer, num_clients: int, num_requests: int, seed: int = 0) -> dict:
+    """
+    Sends num_requests queries from num_clients threads, every client waits for its answer before the next query
+    :return: The server stats of the run and the time of the same queries with one model.predict per query
+    """
+    observations = sample_observations(server.model.observation_space, min(num_requests, 10_000), seed)
+
+    def client(index):
+        for i in range(index, num_requests, num_clients):
+            server.predict(observations[i % len(observations)])
+
+    server.reset_stats()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = server.stats()
+
+    # reference: the same number of queries through model.predict, one observation at a time
+    num_reference = min(num_requests, 2000)
+    start_time = time.perf_counter()
+    for i in range(num_reference):
+        server.model.predict(observations[i % len(observations)], deterministic=server.deterministic)
+    stats["predict_requests_per_sec"] = num_reference / (time.perf_counter() - start_time)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help="The saved model (.zip)")
+    parser.add_argument("--algo", choices=["PPO", "DQN"], default="PPO")
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-delay", type=float, default=0.001, help="seconds a batch waits for more queries")
+    parser.add_argument("--socket", default=None, help="Unix socket to serve the queries on")
+    parser.add_argument("--benchmark", action="store_true", help="measure throughput and latency and exit")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with InferenceServer(
+        args.model, algo=args.algo, max_batch_size=args.max_batch_size, max_delay=args.max_delay
+    ) as server:
+        if args.benchmark:
+            stats = benchmark(server, args.clients, args.requests)
+            print(json.dumps(stats, indent=2))
+            return
+        if args.socket is None:
+            parser.error("either --socket or --benchmark is needed")
+        unix_server = server.serve_unix(args.socket)
+        print(f"serving {args.model} on {args.socket}")
+        try:
+            unix_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            unix_server.server_close()
+            print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
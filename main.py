@@ -1,11 +1,22 @@
+import argparse
+import os
+
 import gymnasium as gym
 import Environments.findTargetEnv
 from stable_baselines3 import PPO, DQN
-from stable_baselines3.common.evaluation import evaluate_policy
+
+from Environments.actionRepeat import ActionRepeatWrapper
+from Environments.findTargetEnv_final25 import INFO_MODES
+from checkpoints import AsyncCheckpointCallback, latest_checkpoint, restore_checkpoint
+from curriculum import CurriculumCallback, CurriculumStage, parse_stage
+from evaluation import AsyncEvalCallback
+from profiling import ProfilingCallback
+from recording import FrameRecorder, RecordFramesWrapper
+from training import VEC_ENV_BACKENDS, ThroughputCallback, make_training_env, register_find_target_env
 
 # Press the green button in the gutter to run the script.
 def demo_Lunar_Lander_random_action():
-    env = gym.make("LunarLander-v2", render_mode = "human")
+    env = gym.make("LunarLander-v3", render_mode = "human")
     observation, info = env.reset()
 
     for _ in range(1000):
@@ -19,15 +30,21 @@ def demo_Lunar_Lander_random_action():
 
 
 def learn_lunar_lander_PPO():
-    env = gym.make("LunarLander-v2", render_mode = "rgb_array")
+    env = gym.make("LunarLander-v3", render_mode = "rgb_array")
     model = PPO("MlpPolicy", env, verbose=1)
-    model.learn(total_timesteps=1e6, progress_bar=True)
+    # evaluate snapshots on 1000 episodes in a separate process while training goes on
+    evaluation = AsyncEvalCallback(
+        env_config={"env_id": "LunarLander-v3", "num_envs": 16},
+        eval_freq=100_000,
+        checkpoint_dir="LunarLanderModel_1e6_snapshots",
+        n_episodes=1000,
+        verbose=1,
+    )
+    model.learn(total_timesteps=1e6, progress_bar=True, callback=evaluation)
     model.save("LunarLanderModel_1e6")
-    #evaluate
-    mean_reward, std_reward = evaluate_policy(model, model.get_env(), n_eval_episodes=10)
 
 def demo_trainaed_model(model_path:str):
-    env = gym.make("LunarLander-v2", render_mode="rgb_array")
+    env = gym.make("LunarLander-v3", render_mode="rgb_array")
     model = PPO.load(model_path, env)
     vec_env = model.get_env()
     obs = vec_env.reset()
@@ -38,20 +55,154 @@ def demo_trainaed_model(model_path:str):
         vec_env.render("human")
 
 
-if __name__ == '__main__':
-    # create env
-    env = gym.make("FindTargetEnv-v0", render_mode="rgb_array", size=5)
-    # create model
-    ALGO = PPO
-    model = ALGO("MlpPolicy", env=env, verbose=1)
-    # train model
-    model.learn(total_timesteps=5e5, progress_bar=True)
-    # save model
-    model_path = "FindTarget_5e4"
+def train_find_target(
+    total_timesteps: float = 5e5,
+    num_envs: int = 1,
+    vec_env: str = "dummy",
+    seed: int | None = 0,
+    size: int = 5,
+    algo: str = "PPO",
+    model_path: str = "FindTarget_5e4",
+    num_workers: int | None = None,
+    eval_freq: int | None = None,
+    eval_episodes: int = 1000,
+    checkpoint_freq: int | None = None,
+    keep_checkpoints: int = 3,
+    resume: bool = False,
+    profile_path: str | None = None,
+    tensorboard_log: str | None = None,
+    curriculum: list[CurriculumStage] | None = None,
+    success_threshold: float = 0.8,
+    max_episode_steps: int | None = None,
+    action_repeat: int = 1,
+    info_mode: str = "step",
+    record_dir: str | None = None,
+    record_every: int = 10,
+    record_encoder: str = "npz",
+):
+    """
+    Trains a model on FindTargetEnv with num_envs envs in parallel and reports the throughput
+    :param vec_env: "dummy", "subproc", "shm" (shared memory workers) or "batched", see training.make_training_env
+    :param eval_freq: If given, snapshots are evaluated on eval_episodes episodes in a separate process
+        every eval_freq steps, the results are written to <model_path>_snapshots/evaluations.jsonl
+    :param checkpoint_freq: If given, the last keep_checkpoints checkpoints are written to <model_path>_checkpoints
+        in the background every checkpoint_freq steps
+    :param resume: Continue from the latest checkpoint in <model_path>_checkpoints
+    :param profile_path: If given, the env and training phases are profiled, logged to tensorboard
+        and written to this JSON file
+    :param tensorboard_log: The tensorboard log directory
+    :param curriculum: Stages that the envs go through during training (size is ignored then), the observations
+        have the shape of the largest stage. A stage is completed at a success rate of success_threshold
+    :param max_episode_steps: Overrides the time limit of the episodes (50 steps)
+    :param action_repeat: Every action of the model is repeated for this many env steps
+    :param info_mode: "step", "episode_end" or "none", see FindTargetEnv
+    :param record_dir: If given, every record_every-th frame of the first env is written to this directory
+        ("npz", "gif" or "mp4" chunks, see recording.FrameRecorder)
+    """
+    register_find_target_env()
+    env_kwargs = {"render_mode": "rgb_array", "size": size, "info_mode": info_mode}
+    if curriculum:
+        assert vec_env != "batched", "the batched backend does not support curricula"
+        env_kwargs.update(size=curriculum[0].size, max_size=max(stage.size for stage in curriculum))
+    if max_episode_steps is not None:
+        env_kwargs["max_episode_steps"] = max_episode_steps
+    record = None
+    if record_dir is not None:
+        record = {"directory": record_dir, "encoder": record_encoder, "record_every": record_every}
+    env = make_training_env(
+        "FindTargetEnv-v0",
+        num_envs=num_envs,
+        vec_env=vec_env,
+        seed=seed,
+        env_kwargs=env_kwargs,
+        num_workers=num_workers,
+        profile=profile_path is not None,
+        action_repeat=action_repeat,
+        record=record,
+    )
+    ALGO = {"PPO": PPO, "DQN": DQN}[algo]
+    model = ALGO("MlpPolicy", env=env, verbose=1, seed=seed, tensorboard_log=tensorboard_log)
+    checkpoint_dir = f"{model_path}_checkpoints"
+    checkpoint = latest_checkpoint(checkpoint_dir) if resume else None
+    checkpoint_meta = {}
+    if checkpoint is not None:
+        checkpoint_meta = restore_checkpoint(model, checkpoint)
+        print(f"Resuming from {checkpoint} at {model.num_timesteps} steps")
+    callbacks = [ThroughputCallback(verbose=1)]
+    curriculum_callback = None
+    if curriculum:
+        # a resumed run continues in the stage of its checkpoint
+        curriculum_callback = CurriculumCallback(
+            curriculum,
+            success_threshold=success_threshold,
+            stage=min(checkpoint_meta.get("curriculum_stage", 0), len(curriculum) - 1),
+            verbose=1,
+        )
+        callbacks.append(curriculum_callback)
+    if profile_path is not None:
+        callbacks.append(ProfilingCallback(dump_path=profile_path, verbose=1))
+    if checkpoint_freq is not None:
+        extra_meta = None
+        if curriculum_callback is not None:
+            extra_meta = lambda: {"curriculum_stage": curriculum_callback.stage}
+        callbacks.append(
+            AsyncCheckpointCallback(
+                checkpoint_freq, checkpoint_dir, keep_last=keep_checkpoints, extra_meta=extra_meta
+            )
+        )
+    if eval_freq is not None:
+        # the evaluation envs are configured like the training envs, the batched backend is the fastest
+        # but does not support curricula and action repeat
+        eval_env_config = {
+            "num_envs": 64,
+            "vec_env": "dummy" if curriculum or action_repeat > 1 else "batched",
+            "env_kwargs": dict(env_kwargs),
+            "action_repeat": action_repeat,
+        }
+        callbacks.append(
+            AsyncEvalCallback(
+                eval_env_config,
+                eval_freq=eval_freq,
+                checkpoint_dir=f"{model_path}_snapshots",
+                n_episodes=eval_episodes,
+                seed=seed or 0,
+                curriculum=curriculum_callback,
+                verbose=1,
+            )
+        )
+    model.learn(
+        total_timesteps=max(int(total_timesteps) - model.num_timesteps, 0),
+        progress_bar=True,
+        callback=callbacks,
+        reset_num_timesteps=checkpoint is None,
+    )
     model.save(model_path)
-    # demo model
+    env.close()
+    return model
+
 
-    env = gym.make("FindTargetEnv-v0", render_mode="human", size=5)
+def demo_find_target(
+    model_path: str,
+    algo: str = "PPO",
+    size: int = 5,
+    max_size: int | None = None,
+    action_repeat: int = 1,
+    record_dir: str | None = None,
+    record_encoder: str = "npz",
+):
+    """
+    Shows a trained model on FindTargetEnv
+    :param record_dir: If given, the frames are written to this directory instead of being shown in a window
+    """
+    register_find_target_env()
+    render_mode = "human" if record_dir is None else "rgb_array"
+    env = gym.make("FindTargetEnv-v0", render_mode=render_mode, size=size, max_size=max_size)
+    if action_repeat > 1:
+        # only the decision steps are rendered
+        env = ActionRepeatWrapper(env, repeat=action_repeat)
+    if record_dir is not None:
+        env = RecordFramesWrapper(env, FrameRecorder(record_dir, encoder=record_encoder))
+    ALGO = {"PPO": PPO, "DQN": DQN}[algo]
     model = ALGO.load(model_path, env)
     vec_env = model.get_env()
     obs = vec_env.reset()
@@ -60,11 +211,97 @@ if __name__ == '__main__':
         action, _states = model.predict(obs, deterministic=True)
         obs, rewards, done, info = vec_env.step(action)
 
-        vec_env.render("human")
+        if record_dir is None:
+            vec_env.render("human")
 
         if done:
             obs = vec_env.reset()
 
     vec_env.close()
-    #pass
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train a model on FindTargetEnv")
+    parser.add_argument("--algo", choices=["PPO", "DQN"], default="PPO")
+    parser.add_argument("--timesteps", type=float, default=5e5)
+    parser.add_argument("--num-envs", type=int, default=1)
+    parser.add_argument("--vec-env", choices=VEC_ENV_BACKENDS, default="dummy")
+    parser.add_argument("--num-workers", type=int, default=None, help="worker processes of --vec-env shm")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=5)
+    parser.add_argument("--model-path", default="FindTarget_5e4")
+    parser.add_argument("--eval-freq", type=int, default=None, help="evaluate snapshots every EVAL_FREQ steps")
+    parser.add_argument("--eval-episodes", type=int, default=1000)
+    parser.add_argument("--checkpoint-freq", type=int, default=None, help="checkpoint every CHECKPOINT_FREQ steps")
+    parser.add_argument("--keep-checkpoints", type=int, default=3)
+    parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint")
+    parser.add_argument("--profile", default=None, metavar="PATH", help="profile the training, write to PATH (JSON)")
+    parser.add_argument("--tensorboard-log", default=None, help="tensorboard log directory")
+    parser.add_argument(
+        "--curriculum",
+        nargs="+",
+        type=parse_stage,
+        default=None,
+        metavar="STAGE",
+        help="curriculum stages size[:num_targets[:target_velocity]], e.g. 5 10:2 20:2:0.5",
+    )
+    parser.add_argument("--success-threshold", type=float, default=0.8, help="success rate that completes a stage")
+    parser.add_argument("--max-episode-steps", type=int, default=None)
+    parser.add_argument("--action-repeat", type=int, default=1, help="env steps per action of the model")
+    parser.add_argument(
+        "--info-mode", choices=INFO_MODES, default="step", help="steps on which the envs build their info dicts"
+    )
+    parser.add_argument(
+        "--record-dir",
+        default=None,
+        help="write frames of the first training env to RECORD_DIR/train and of the demo to RECORD_DIR/demo",
+    )
+    parser.add_argument("--record-every", type=int, default=10, help="record every RECORD_EVERY-th training step")
+    parser.add_argument("--record-encoder", choices=FrameRecorder.encoders, default="npz")
+    parser.add_argument("--demo", action="store_true", help="show the trained model afterwards")
+    args = parser.parse_args()
+
+    train_find_target(
+        total_timesteps=args.timesteps,
+        num_envs=args.num_envs,
+        vec_env=args.vec_env,
+        seed=args.seed,
+        size=args.size,
+        algo=args.algo,
+        model_path=args.model_path,
+        num_workers=args.num_workers,
+        eval_freq=args.eval_freq,
+        eval_episodes=args.eval_episodes,
+        checkpoint_freq=args.checkpoint_freq,
+        keep_checkpoints=args.keep_checkpoints,
+        resume=args.resume,
+        profile_path=args.profile,
+        tensorboard_log=args.tensorboard_log,
+        curriculum=args.curriculum,
+        success_threshold=args.success_threshold,
+        max_episode_steps=args.max_episode_steps,
+        action_repeat=args.action_repeat,
+        info_mode=args.info_mode,
+        record_dir=args.record_dir and os.path.join(args.record_dir, "train"),
+        record_every=args.record_every,
+        record_encoder=args.record_encoder,
+    )
+    if args.demo:
+        demo_record = {
+            "record_dir": args.record_dir and os.path.join(args.record_dir, "demo"),
+            "record_encoder": args.record_encoder,
+        }
+        if args.curriculum:
+            # the last stage, with the observations of the largest grid the model was trained on
+            demo_find_target(
+                args.model_path,
+                algo=args.algo,
+                size=args.curriculum[-1].size,
+                max_size=max(stage.size for stage in args.curriculum),
+                action_repeat=args.action_repeat,
+                **demo_record,
+            )
+        else:
+            demo_find_target(
+                args.model_path, algo=args.algo, size=args.size, action_repeat=args.action_repeat, **demo_record
+            )
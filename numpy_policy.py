@@ -0,0 +1,114 @@
+"""
+Standalone NumPy runtime for MLP policies exported with export.py.
+Only needs NumPy: no torch, stable_baselines3 or gymnasium import, so it starts in milliseconds.
+
+    policy = NumpyPolicy.load("LunarLanderModel_1e6.npz")
+    action, _ = policy.predict(observation, deterministic=True)
+"""
+
+import json
+
+import numpy as np
+
+ACTIVATIONS = {
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0),
+    "elu": lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    "leaky_relu": lambda x: np.where(x > 0, x, 0.01 * x),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "identity": lambda x: x,
+}
+
+
+class NumpyPolicy:
+    """
+    An MLP policy: a stack of linear layers and activations followed by the action distribution.
+    Discrete actions are the argmax of the logits (or sampled from their softmax),
+    Box actions are the Gaussian mean (or sampled with the exported log std), clipped or unscaled to the action space.
+    """
+
+    def __init__(self, layers: list[tuple], meta: dict):
+        """
+
+        :param layers: ("linear", weight, bias) and ("activation", name) in the order they are applied
+        :param meta: Observation space, action space and (for Box actions) log_std, see export.py
+        """
+        self.layers = []
+        for layer in layers:
+            if layer[0] == "linear":
+                # stored as (out, in) like torch, x @ weight.T is computed on contiguous (in, out) weights
+                self.layers.append(("linear", np.ascontiguousarray(layer[1].T), layer[2]))
+            else:
+                self.layers.append(("activation", ACTIVATIONS[layer[1]]))
+        self.meta = meta
+        self.observation_space = meta["observation_space"]
+        self.action_space = meta["action_space"]
+        self.log_std = None if meta.get("log_std") is None else np.asarray(meta["log_std"], dtype=np.float32)
+        self.rng = np.random.default_rng()
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyPolicy":
+        """
+        :param path: The .npz file written by export.export_policy
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            layers = [
+                ("linear", data[f"layer_{i}_weight"], data[f"layer_{i}_bias"])
+                if layer["type"] == "linear"
+                else ("activation", layer["name"])
+                for i, layer in enumerate(meta["layers"])
+            ]
+        return cls(layers, meta)
+
+    def _preprocess(self, observations: np.ndarray) -> np.ndarray:
+        if self.observation_space["type"] == "discrete":
+            return np.eye(self.observation_space["n"], dtype=np.float32)[observations.astype(int)]
+        return observations.reshape(len(observations), -1).astype(np.float32)
+
+    def forward(self, observations: np.ndarray) -> np.ndarray:
+        """
+        :param observations: A batch of observations
+        :return: The logits / action means / Q-values of the batch
+        """
+        x = self._preprocess(observations)
+        for kind, *params in self.layers:
+            if kind == "linear":
+                x = x @ params[0] + params[1]
+            else:
+                x = params[0](x)
+        return x
+
+    def predict(self, observation: np.ndarray, state=None, episode_start=None, deterministic: bool = True):
+        """
+        Same interface as model.predict of stable_baselines3
+        :param observation: A single observation or a batch of observations
+        :return: The action(s) and None (no recurrent state)
+        """
+        observation = np.asarray(observation)
+        shape = tuple(self.observation_space["shape"])
+        single = observation.shape == shape
+        observations = observation[np.newaxis] if single else observation
+        outputs = self.forward(observations)
+
+        if self.action_space["type"] == "discrete":
+            if deterministic or self.meta["algo"] == "DQN":
+                actions = outputs.argmax(axis=1)
+            else:
+                probabilities = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+                probabilities /= probabilities.sum(axis=1, keepdims=True)
+                cumulative = probabilities.cumsum(axis=1)
+                actions = (self.rng.random((len(outputs), 1)) > cumulative).sum(axis=1)
+                actions = np.minimum(actions, self.action_space["n"] - 1)
+        else:
+            actions = outputs
+            if not deterministic:
+                actions = actions + np.exp(self.log_std) * self.rng.standard_normal(actions.shape, dtype=np.float32)
+            low = np.asarray(self.action_space["low"], dtype=np.float32)
+            high = np.asarray(self.action_space["high"], dtype=np.float32)
+            if self.action_space["squash"]:
+                actions = low + 0.5 * (np.tanh(actions) + 1.0) * (high - low)
+            else:
+                actions = np.clip(actions, low, high)
+            actions = actions.reshape((-1,) + tuple(self.action_space["shape"]))
+        return (actions[0] if single else actions), None
@@ -0,0 +1,350 @@
+"""
+Opt-in profiling of the env hot path and of the training loop.
+
+Nothing is timed unless it is instrumented: instrument_env replaces the methods of one env instance
+(reset, step, observation building, render, the renderer's render_frame) with timed versions, so envs that are
+not instrumented, and the env classes themselves, run exactly the same code as without profiling.
+Every phase keeps a call count, the total time, a log2 histogram of the durations and the most recent durations.
+
+    profiler = Profiler()
+    instrument_env(env, profiler)
+    model.learn(..., callback=ProfilingCallback(profiler, dump_path="profile.json"))
+
+ProfilingCallback also times the rollout and train phases of model.learn and the vectorized env step,
+logs the phases to tensorboard (profile/<phase>/...) and writes them to a JSON file.
+Envs in worker processes record into the PROFILER of their process (make_training_env(..., profile=True)),
+the callback collects them with env_method.
+"""
+
+import functools
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+
+# durations kept per phase for the tensorboard histograms
+RECENT_DURATIONS = 4096
+# log2 buckets of the durations in ns, bucket b holds durations in [2^(b-1), 2^b)
+NUM_BUCKETS = 64
+
+ENV_PHASES = {
+    "reset": "env/reset",
+    "step": "env/step",
+    "_get_obs": "env/obs",
+    "get_memory": "env/get_memory",
+    "_get_info": "env/info",
+    "_update_target_index": "env/target_index",
+    "_reset_envs": "env/auto_reset",
+    "render": "env/render",
+}
+RENDERER_PHASES = {
+    "render_frame": "render/frame",
+    "render_batch": "render/batch",
+    "draw_environment": "render/draw",
+}
+VEC_ENV_PHASES = {
+    "step_wait": "vec_env/step",
+    "reset": "vec_env/reset",
+}
+
+
+class PhaseStats:
+    """
+    Timing statistics of one phase
+    """
+
+    __slots__ = ("count", "total_ns", "min_ns", "max_ns", "buckets", "recent", "_next")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = [0] * NUM_BUCKETS
+        self.recent = []
+        self._next = 0
+
+    def add(self, duration_ns: int):
+        self.count += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.buckets[min(duration_ns.bit_length(), NUM_BUCKETS - 1)] += 1
+        if len(self.recent) < RECENT_DURATIONS:
+            self.recent.append(duration_ns)
+        else:
+            self.recent[self._next] = duration_ns
+            self._next = (self._next + 1) % RECENT_DURATIONS
+
+    def state(self) -> dict:
+        """
+        :return: The raw statistics (picklable and JSON serializable), see merge_states
+        """
+        return {
+            "count": self.count,
+            "total_ns": self.total_ns,
+            "min_ns": self.min_ns or 0,
+            "max_ns": self.max_ns,
+            "buckets": list(self.buckets),
+            "recent": list(self.recent),
+        }
+
+
+def merge_states(states: list[dict]) -> dict:
+    """
+    Merges the raw statistics of one phase from several processes
+    """
+    states = [state for state in states if state["count"] > 0]
+    if not states:
+        return PhaseStats().state()
+    return {
+        "count": sum(state["count"] for state in states),
+        "total_ns": sum(state["total_ns"] for state in states),
+        "min_ns": min(state["min_ns"] for state in states),
+        "max_ns": max(state["max_ns"] for state in states),
+        "buckets": np.sum([state["buckets"] for state in states], axis=0).tolist(),
+        "recent": [duration for state in states for duration in state["recent"]][-RECENT_DURATIONS:],
+    }
+
+
+def summarize_state(state: dict) -> dict:
+    """
+    :return: Call count, total seconds and mean / min / max / percentiles in µs of a phase.
+        The percentiles are the upper edges of the log2 histogram buckets, so they are exact within a factor of 2
+    """
+    count = state["count"]
+    summary = {
+        "calls": count,
+        "total_s": state["total_ns"] / 1e9,
+        "mean_us": state["total_ns"] / max(count, 1) / 1e3,
+        "min_us": state["min_ns"] / 1e3,
+        "max_us": state["max_ns"] / 1e3,
+    }
+    cumulative = np.cumsum(state["buckets"])
+    for q in (50, 90, 99):
+        bucket = int(np.searchsorted(cumulative, q / 100 * count)) if count else 0
+        summary[f"p{q}_us"] = min(2**bucket, state["max_ns"]) / 1e3
+    return summary
+
+
+class Profiler:
+    """
+    Collects the timing statistics of named phases
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+
+        :param enabled: Instrumented methods only record while enabled (they still pay for one attribute lookup)
+        """
+        self.enabled = enabled
+        self.phases = {}
+
+    def record(self, phase: str, duration_ns: int):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.add(duration_ns)
+
+    def timed(self, phase: str, function):
+        """
+        :return: function, recording its duration under phase
+        """
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(phase, time.perf_counter_ns() - start)
+
+        timed_function.__profiled__ = True
+        return timed_function
+
+    def state(self) -> dict:
+        """
+        :return: The raw statistics of all phases, tagged with the process id
+        """
+        return {"pid": os.getpid(), "phases": {phase: stats.state() for phase, stats in self.phases.items()}}
+
+    def summary(self) -> dict:
+        return {phase: summarize_state(stats.state()) for phase, stats in sorted(self.phases.items())}
+
+    def clear(self):
+        self.phases = {}
+
+
+# the profiler of this process, used by envs that are instrumented in worker processes
+PROFILER = Profiler()
+
+
+def instrument(obj, phases: dict[str, str], profiler: Profiler):
+    """
+    Replaces the methods of one object (not its class) with timed versions
+    :param obj: The object
+    :param phases: Method name -> phase, missing methods are skipped
+    :param profiler: The profiler that records the durations
+    """
+    for method_name, phase in phases.items():
+        method = getattr(obj, method_name, None)
+        if method is None or not callable(method) or getattr(method, "__profiled__", False):
+            continue
+        setattr(obj, method_name, profiler.timed(phase, method))
+
+
+def instrument_env(env, profiler: Profiler | None = None):
+    """
+    Times the hot path of an env: reset, step, observations, infos and rendering.
+    Works for FindTargetEnv, FindTargetVecEnv and FindTargetSB3VecEnv (and their wrappers),
+    the renderer is instrumented when the env creates it.
+    :param env: The env
+    :param profiler: Defaults to the PROFILER of this process
+    :return: env
+    """
+    profiler = profiler or PROFILER
+    unwrapped = getattr(env, "unwrapped", env)
+    while hasattr(unwrapped, "venv"):
+        # FindTargetSB3VecEnv: the grid worlds are stepped by its FindTargetVecEnv
+        unwrapped = unwrapped.venv
+    instrument(unwrapped, ENV_PHASES, profiler)
+    # lets ProfilingCallback collect the statistics of worker processes with env_method("profiler_state")
+    unwrapped.profiler_state = profiler.state
+    if getattr(unwrapped, "renderer", None) is not None:
+        instrument(unwrapped.renderer, RENDERER_PHASES, profiler)
+    else:
+        _instrument_renderer_on_creation(unwrapped, profiler)
+    return env
+
+
+def _instrument_renderer_on_creation(env, profiler: Profiler):
+    # the renderer (and pygame) is created lazily, so the method that creates it instruments it and is restored
+    method_name = "_get_renderer" if hasattr(env, "_get_renderer") else "render"
+    method = getattr(env, method_name)
+
+    def create_and_instrument(*args, **kwargs):
+        result = method(*args, **kwargs)
+        if env.renderer is not None:
+            instrument(env.renderer, RENDERER_PHASES, profiler)
+            setattr(env, method_name, method)
+        return result
+
+    setattr(env, method_name, create_and_instrument)
+
+
+def collect_states(profiler: Profiler, vec_env=None) -> dict:
+    """
+    Merges the statistics of profiler with the statistics of the worker processes of vec_env
+    :param vec_env: A vectorized env created with make_training_env(..., profile=True), or None
+    :return: Phase -> raw statistics
+    """
+    states = {os.getpid(): profiler.state()}
+    if vec_env is not None and vec_env.has_attr("profiler_state"):
+        for state in vec_env.env_method("profiler_state"):
+            # envs in the same process share one profiler
+            states.setdefault(state["pid"], state)
+    phases = {}
+    for state in states.values():
+        for phase, phase_state in state["phases"].items():
+            phases.setdefault(phase, []).append(phase_state)
+    return {phase: merge_states(phase_states) for phase, phase_states in sorted(phases.items())}
+
+
+class ProfilingCallback(BaseCallback):
+    """
+    Profiles model.learn: times the rollout and train phases and the step of the vectorized env,
+    merges them with the env phases (of all worker processes), logs them to tensorboard on every rollout end
+    and writes them to a JSON file every dump_freq env steps and at the end of training.
+    """
+
+    def __init__(
+        self,
+        profiler: Profiler | None = None,
+        dump_path: str | None = None,
+        dump_freq: int = 10_000,
+        histograms: bool = True,
+        verbose: int = 0,
+    ):
+        """
+
+        :param profiler: Defaults to the PROFILER of this process
+        :param dump_path: The JSON file, rewritten on every dump. None disables the dumps
+        :param dump_freq: Env steps between two dumps
+        :param histograms: Also log the recent durations of every phase as tensorboard histograms
+        """
+        super().__init__(verbose)
+        self.profiler = profiler or PROFILER
+        self.dump_path = dump_path
+        self.dump_freq = dump_freq
+        self.histograms = histograms
+        self._phase_start = None
+        self._next_dump = dump_freq
+
+    def _on_training_start(self) -> None:
+        instrument(self.training_env, VEC_ENV_PHASES, self.profiler)
+        self._next_dump = self.num_timesteps + self.dump_freq
+        self._phase_start = time.perf_counter_ns()
+
+    def _on_rollout_start(self) -> None:
+        now = time.perf_counter_ns()
+        # everything between two rollouts: the gradient updates and the logging
+        if self.num_timesteps > 0 and self._phase_start is not None:
+            self.profiler.record("learn/train", now - self._phase_start)
+        self._phase_start = now
+
+    def _on_step(self) -> bool:
+        if self.dump_path is not None and self.num_timesteps >= self._next_dump:
+            self.dump()
+            self._next_dump += self.dump_freq
+        return True
+
+    def _on_rollout_end(self) -> None:
+        now = time.perf_counter_ns()
+        self.profiler.record("learn/rollout", now - self._phase_start)
+        self._phase_start = now
+        self._log(collect_states(self.profiler, self.training_env))
+
+    def _log(self, states: dict):
+        for phase, state in states.items():
+            summary = summarize_state(state)
+            for key in ("calls", "mean_us", "p99_us", "total_s"):
+                self.logger.record(f"profile/{phase}/{key}", summary[key])
+            if self.histograms and state["recent"]:
+                self.logger.record(
+                    f"profile/{phase}/duration_us",
+                    torch.as_tensor(state["recent"], dtype=torch.float64) / 1e3,
+                    exclude=("stdout", "log", "json", "csv"),
+                )
+
+    def dump(self):
+        """
+        Writes the summary of all phases to dump_path (via a temporary file, readers never see a partial file)
+        """
+        states = collect_states(self.profiler, self.training_env)
+        report = {
+            "num_timesteps": self.num_timesteps,
+            "phases": {
+                phase: {**summarize_state(state), "log2_ns_buckets": state["buckets"]}
+                for phase, state in states.items()
+            },
+        }
+        tmp_path = self.dump_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, self.dump_path)
+
+    def _on_training_end(self) -> None:
+        self.profiler.record("learn/train", time.perf_counter_ns() - self._phase_start)
+        if self.dump_path is not None:
+            self.dump()
+        if self.verbose >= 1:
+            for phase, state in collect_states(self.profiler, self.training_env).items():
+                summary = summarize_state(state)
+                print(f"{phase:24s} {summary['calls']:>9d} calls {summary['mean_us']:>10.1f} µs/call")
@@ -0,0 +1,387 @@
+import numpy as np
+
+
+class NumpyRenderer:
+    """
+    Renders the grid world env into rgb arrays using NumPy only (pygame is not needed).
+    The static grid lines are cached once per (grid_size, window_size),
+    every frame is painted into a reused buffer and matches the frames of Renderer in "rgb_array" mode.
+    """
+
+    metadata = {"render_modes": ["rgb_array"], "render_fps": 4}
+
+    # palette entries after the grid cells
+    _EMPTY = 0
+    _LINE = 1
+
+    # cached (pixel -> palette index, line mask, row runs) per (grid_size, window_size)
+    _layouts = {}
+    # cached pixel offsets of the agent disc per radius
+    _discs = {}
+
+    # colors of visited cells by visit count (white if not visited), constant from 16 visits on
+    # yellow for the first visit, then darken it linearly, darkest color is (255, 25, 0)
+    _wall_color = (64, 64, 64)
+    _max_visit_count = 16
+    _visit_colors = np.array(
+        [(255, 255, 255)]
+        + [
+            (max(255 - 2 * (times_visited - 1), 225), max(255 - 45 * (times_visited - 1), 25), 0)
+            for times_visited in range(1, _max_visit_count + 1)
+        ],
+        dtype=np.uint8,
+    )
+
+    def __init__(
+        self,
+        grid_size: int,
+        meta_data,
+        window_size: int = 512,
+        render_mode="rgb_array",
+        copy: bool = True,
+    ):
+        """
+
+        :param grid_size: The size of the gird in cells (e.g. 5)
+        :param meta_data: Meta data such as rendering modes and fps
+        :param window_size: The size of the rendered frames in pixels (e.g. 84 for pixel based policies)
+        :param render_mode: Only "rgb_array" is supported
+        :param copy: If False, the returned frame is the internal buffer that is overwritten by the next frame
+        """
+        assert render_mode in self.metadata["render_modes"]
+        self.render_mode = render_mode
+        self.grid_size = grid_size
+        self.window_size = window_size
+        self.metadata = meta_data
+        self.copy = copy
+        # NumpyRenderer never opens a window, the attribute exists for compatibility with Renderer
+        self.window = None
+
+        self._pix_square_size = self.window_size / self.grid_size
+        self._pixel_palette_index, self._line_mask, self._row_runs = self._get_layout(
+            grid_size, window_size
+        )
+        cells = grid_size * grid_size
+        self._palette = np.empty((cells + 2, 3), dtype=np.uint8)
+        self._palette[cells + self._EMPTY] = (255, 255, 255)
+        self._palette[cells + self._LINE] = (0, 0, 0)
+        self._frame = np.empty((window_size, window_size, 3), dtype=np.uint8)
+        self._run_pixels = np.empty((len(self._row_runs), window_size, 3), dtype=np.uint8)
+        self._run_palette_index = self._pixel_palette_index[
+            [start for start, _ in self._row_runs]
+        ]
+        self._disc_offsets = self._get_disc(int(self._pix_square_size / 3))
+        # pixels of the agent disc per agent cell, filled on first use
+        self._agent_pixels = {}
+        # buffers of render_batch, allocated on first use
+        self._batch_palettes = self._batch_run_pixels = self._batch_frames = None
+
+    @classmethod
+    def _get_layout(cls, grid_size: int, window_size: int):
+        """
+        Maps every pixel to the palette entry it is drawn with:
+        the index of its grid cell (x * grid_size + y), or one of the empty / line entries after the cells.
+        Positions are truncated to full pixels like pygame does.
+        :return: The (window_size, window_size) palette index and line mask (both read only)
+            and the (start, end) rows of all runs of identical pixel rows
+        """
+        key = (grid_size, window_size)
+        if key not in cls._layouts:
+            pix_square_size = window_size / grid_size
+            cells = grid_size * grid_size
+            starts = (pix_square_size * np.arange(grid_size)).astype(int)
+            width = int(pix_square_size)
+
+            # the cell covering each pixel column / row, -1 if the pixel is not covered by a cell
+            cell_of_pixel = np.full((window_size,), -1)
+            for cell, start in enumerate(starts):
+                cell_of_pixel[start : start + width] = cell
+
+            # grid lines are 3 pixels wide and centered on the cell borders
+            line_of_pixel = np.zeros((window_size,), dtype=bool)
+            for center in (pix_square_size * np.arange(grid_size + 1)).astype(int):
+                line_of_pixel[max(center - 1, 0) : center + 2] = True
+
+            # image rows are y, image columns are x
+            x_cell = cell_of_pixel[np.newaxis, :]
+            y_cell = cell_of_pixel[:, np.newaxis]
+            index = np.where(
+                (x_cell >= 0) & (y_cell >= 0),
+                x_cell * grid_size + y_cell,
+                cells + cls._EMPTY,
+            )
+            line_mask = line_of_pixel[np.newaxis, :] | line_of_pixel[:, np.newaxis]
+            index[line_mask] = cells + cls._LINE
+            index.setflags(write=False)
+            line_mask.setflags(write=False)
+
+            # consecutive pixel rows with the same palette indices are painted with one slice
+            run_starts = np.flatnonzero(
+                np.concatenate(([True], (index[1:] != index[:-1]).any(axis=1)))
+            )
+            run_ends = np.append(run_starts[1:], window_size)
+            row_runs = list(zip(run_starts.tolist(), run_ends.tolist()))
+            cls._layouts[key] = (index, line_mask, row_runs)
+        return cls._layouts[key]
+
+    @classmethod
+    def _get_disc(cls, radius: int):
+        """
+        Pixel offsets of a filled circle, rasterized like pygame.draw.circle
+        :param radius: The radius in full pixels
+        :return: Row and column offsets relative to the center pixel
+        """
+        if radius not in cls._discs:
+            rows, columns = [], []
+
+            def horizontal_line(x_start: int, y: int, x_end: int):
+                xs = range(x_start, x_end + 1)
+                rows.extend([y] * len(xs))
+                columns.extend(xs)
+
+            f = 1 - radius
+            ddf_x = 0
+            ddf_y = -2 * radius
+            x = 0
+            y = radius
+            while x < y:
+                if f >= 0:
+                    y -= 1
+                    ddf_y += 2
+                    f += ddf_y
+                x += 1
+                ddf_x += 2
+                f += ddf_x + 1
+                if f >= 0:
+                    horizontal_line(-x, y - 1, x - 1)
+                    horizontal_line(-x, -y, x - 1)
+                horizontal_line(-y, x - 1, y - 1)
+                horizontal_line(-y, -x, y - 1)
+
+            offsets = np.unique(np.array([rows, columns], dtype=int).reshape(2, -1), axis=1)
+            offsets.setflags(write=False)
+            cls._discs[radius] = offsets
+        return cls._discs[radius]
+
+    def render(
+        self,
+        agent_location,
+        new_episode=False,
+        targets=None,
+        visited_cells_count=None,
+        walls=None,
+    ):
+        """
+        Renders in rgb_mode
+        :param agent_location: The location of the agent in the grid world
+        :param new_episode: Flag if a new episode has started. Renders a black screen between episodes
+        :param targets: The targets of the grid world
+        :param visited_cells_count: Array / Matrix that counts how often a cell (position in grid) was visited by the agent (Optional parameter.)
+        :param walls: Boolean (grid_size, grid_size) wall grid, walls are drawn dark gray (Optional parameter.)
+        """
+        return self.render_frame(
+            agent_location=agent_location,
+            new_episode=new_episode,
+            targets=targets,
+            visited_cells_count=visited_cells_count,
+            walls=walls,
+        )
+
+    def render_frame_for_humans_if_needed(
+        self,
+        agent_location,
+        new_episode=False,
+        targets=None,
+        visited_cells_count=None,
+        walls=None,
+    ):
+        """
+        NumpyRenderer has no human mode, nothing is rendered
+        """
+        return None
+
+    def render_frame(
+        self,
+        agent_location,
+        new_episode=False,
+        targets=None,
+        visited_cells_count=None,
+        walls=None,
+    ):
+        """
+        The actual rendering function
+        :param agent_location: The location of the agent in the grid world
+        :param new_episode: Flag if a new episode has started. Renders a black screen between episodes
+        :param targets: The targets that should be rendered
+        :param visited_cells_count: Array / Matrix or dict that counts how often a cell (position in grid) was visited by the agent (Optional parameter.)
+        :param walls: Boolean (grid_size, grid_size) wall grid, walls are drawn dark gray (Optional parameter.)
+        :return: The frame as (window_size, window_size, 3) uint8 array
+        """
+        if new_episode:
+            # render a black screen when a new episode begins
+            self._frame.fill(0)
+        else:
+            self._paint_cells(
+                agent_location=agent_location,
+                targets=targets,
+                visited_cells_count=visited_cells_count,
+                walls=walls,
+            )
+            np.take(self._palette, self._run_palette_index, axis=0, out=self._run_pixels)
+            for run_pixels, (start, end) in zip(self._run_pixels, self._row_runs):
+                self._frame[start:end] = run_pixels
+            self._paint_agent(agent_location)
+        return self._frame.copy() if self.copy else self._frame
+
+    def _paint_cells(self, agent_location, targets=None, visited_cells_count=None, walls=None):
+        """
+        Writes the colors of all grid cells into the palette
+        """
+        cells = self.grid_size * self.grid_size
+        cell_colors = self._palette[:cells]
+        counts = self._count_matrix(visited_cells_count).reshape(cells)
+        np.take(
+            self._visit_colors,
+            np.minimum(counts, self._max_visit_count),
+            axis=0,
+            out=cell_colors,
+        )
+        if walls is not None:
+            cell_colors[np.asarray(walls).reshape(cells)] = self._wall_color
+
+        if hasattr(targets, "positions"):
+            # structure-of-arrays target.TargetStore, painted like a batch of one env
+            self._paint_batch_targets(
+                self._palette[np.newaxis],
+                np.asarray(agent_location)[np.newaxis],
+                targets.positions[np.newaxis],
+                targets.colors,
+            )
+            return
+
+        for target in [] if targets is None else targets:
+            x, y = target.position
+            if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+                continue
+            on_agent = x == agent_location[0] and y == agent_location[1]
+            cell_colors[x * self.grid_size + y] = (0, 255, 0) if on_agent else target.color
+
+    def _count_matrix(self, visited_cells_count) -> np.ndarray:
+        if isinstance(visited_cells_count, np.ndarray):
+            return visited_cells_count
+        counts = np.zeros((self.grid_size, self.grid_size), dtype=int)
+        for position, times_visited in ({} if visited_cells_count is None else visited_cells_count).items():
+            counts[position] = times_visited
+        return counts
+
+    def _paint_agent(self, agent_location):
+        """
+        Draws the agent as a blue disc, the grid lines stay on top
+        """
+        self._frame[self._get_agent_pixels(agent_location[0], agent_location[1])] = (0, 0, 255)
+
+    def _get_agent_pixels(self, x: int, y: int):
+        """
+        :return: Rows and columns of the agent disc pixels in cell (x, y) that are not covered by grid lines
+        """
+        key = (int(x), int(y))
+        if key not in self._agent_pixels:
+            center_x, center_y = ((np.array(key) + 0.5) * self._pix_square_size).astype(int)
+            ys = center_y + self._disc_offsets[0]
+            xs = center_x + self._disc_offsets[1]
+            inside = (ys >= 0) & (ys < self.window_size) & (xs >= 0) & (xs < self.window_size)
+            ys, xs = ys[inside], xs[inside]
+            not_line = ~self._line_mask[ys, xs]
+            self._agent_pixels[key] = (ys[not_line], xs[not_line])
+        return self._agent_pixels[key]
+
+    def render_batch(
+        self,
+        agent_locations: np.ndarray,
+        target_positions: np.ndarray = None,
+        visited_cells_counts: np.ndarray = None,
+        new_episodes: np.ndarray = None,
+        target_colors=None,
+    ) -> np.ndarray:
+        """
+        Renders the frames of N grid worlds of the same size in one vectorized pass
+        :param agent_locations: The agent locations as (N, 2) array
+        :param target_positions: The target positions as (N, T, 2) array, targets outside the grid are not drawn
+        :param visited_cells_counts: The visit count matrices as (N, grid_size, grid_size) array
+        :param new_episodes: Boolean (N,) array, renders a black screen for envs in which a new episode has started
+        :param target_colors: The colors of the T targets as (T, 3) array, red by default
+        :return: The frames as (N, window_size, window_size, 3) uint8 array
+        """
+        agent_locations = np.asarray(agent_locations)
+        n = len(agent_locations)
+        cells = self.grid_size * self.grid_size
+        palettes, run_pixels, frames = self._get_batch_buffers(n)
+
+        # grid cell colors
+        if visited_cells_counts is None:
+            palettes[:, :cells] = 255
+        else:
+            counts = np.asarray(visited_cells_counts).reshape(n, cells)
+            np.take(
+                self._visit_colors,
+                np.minimum(counts, self._max_visit_count),
+                axis=0,
+                out=palettes[:, :cells],
+            )
+        if target_positions is not None:
+            self._paint_batch_targets(palettes, agent_locations, np.asarray(target_positions), target_colors)
+
+        # grid lines and cells, one slice per run of identical pixel rows
+        np.take(palettes, self._run_palette_index, axis=1, out=run_pixels)
+        for run, (start, end) in enumerate(self._row_runs):
+            frames[:, start:end] = run_pixels[:, run, np.newaxis]
+
+        # agents
+        centers = ((agent_locations + 0.5) * self._pix_square_size).astype(int)
+        ys = centers[:, 1:2] + self._disc_offsets[0]
+        xs = centers[:, 0:1] + self._disc_offsets[1]
+        inside = (ys >= 0) & (ys < self.window_size) & (xs >= 0) & (xs < self.window_size)
+        ys, xs = ys * inside, xs * inside
+        draw = inside & ~self._line_mask[ys, xs]
+        envs = np.broadcast_to(np.arange(n)[:, np.newaxis], draw.shape)
+        frames[envs[draw], ys[draw], xs[draw]] = (0, 0, 255)
+
+        if new_episodes is not None:
+            # render a black screen when a new episode begins
+            frames[np.asarray(new_episodes, dtype=bool)] = 0
+        return frames.copy() if self.copy else frames
+
+    def _paint_batch_targets(self, palettes, agent_locations, target_positions, target_colors=None):
+        """
+        Writes the target colors into the palettes of all envs, targets on the agent are green
+        """
+        n, num_targets = target_positions.shape[:2]
+        colors = np.empty((n, num_targets, 3), dtype=np.uint8)
+        colors[:] = (255, 0, 0) if target_colors is None else np.asarray(target_colors, dtype=np.uint8)
+        on_agent = (target_positions == agent_locations[:, np.newaxis]).all(axis=2)
+        colors[on_agent] = (0, 255, 0)
+
+        on_grid = ((target_positions >= 0) & (target_positions < self.grid_size)).all(axis=2)
+        envs = np.broadcast_to(np.arange(n)[:, np.newaxis], on_grid.shape)
+        cells = target_positions[..., 0] * self.grid_size + target_positions[..., 1]
+        palettes[envs[on_grid], cells[on_grid]] = colors[on_grid]
+
+    def _get_batch_buffers(self, n: int):
+        """
+        :return: The palettes, row run pixels and frames buffers for n envs, reallocated when n changes
+        """
+        if self._batch_frames is None or len(self._batch_frames) != n:
+            cells = self.grid_size * self.grid_size
+            self._batch_palettes = np.empty((n, cells + 2, 3), dtype=np.uint8)
+            self._batch_palettes[:, cells + self._EMPTY] = (255, 255, 255)
+            self._batch_palettes[:, cells + self._LINE] = (0, 0, 0)
+            self._batch_run_pixels = np.empty(
+                (n, len(self._row_runs), self.window_size, 3), dtype=np.uint8
+            )
+            self._batch_frames = np.empty(
+                (n, self.window_size, self.window_size, 3), dtype=np.uint8
+            )
+        return self._batch_palettes, self._batch_run_pixels, self._batch_frames
+
+    def close(self):
+        pass
@@ -0,0 +1,184 @@
+import os
+import queue
+import threading
+
+import gymnasium as gym
+import numpy as np
+
+
+class FrameRecorder:
+    """
+    Writes rgb frames to disk in a background thread.
+    Frames are pushed into a bounded queue; if the writer falls behind, new frames are dropped
+    instead of blocking the environment (and with it the training loop).
+
+    Frames are written in chunks, either as compressed npz files (no extra dependencies)
+    or as GIF / MP4 files through the optional imageio package (MP4 needs imageio-ffmpeg).
+    If writing fails, the writer discards the remaining frames and the error is raised by the next push or close.
+    """
+
+    encoders = ("npz", "gif", "mp4")
+
+    def __init__(
+        self,
+        directory: str,
+        encoder: str = "npz",
+        chunk_size: int = 256,
+        max_queue_size: int = 512,
+        fps: int = 4,
+    ):
+        """
+
+        :param directory: The directory the chunks are written to, it is created if it does not exist
+        :param encoder: "npz", "gif" or "mp4"
+        :param chunk_size: Number of frames per written file
+        :param max_queue_size: Number of frames that can wait for the writer before frames are dropped
+        :param fps: Frame rate of GIF / MP4 files
+        """
+        assert encoder in self.encoders
+        if encoder != "npz":
+            try:
+                import imageio  # noqa: F401
+            except ImportError as e:
+                raise ImportError(
+                    f"The {encoder} encoder needs imageio, install it with `pip install imageio imageio-ffmpeg` "
+                    f"or use encoder='npz'"
+                ) from e
+
+        self.directory = directory
+        self.encoder = encoder
+        self.chunk_size = chunk_size
+        self.fps = fps
+        os.makedirs(directory, exist_ok=True)
+
+        self.frames_pushed = 0
+        self.frames_dropped = 0
+        self.frames_written = 0
+        self.chunks_written = 0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop, name="FrameRecorder", daemon=True)
+        self._thread.start()
+
+    def push(self, frame: np.ndarray) -> bool:
+        """
+        Queues a frame for writing without blocking
+        :param frame: A (H, W, 3) uint8 frame, it is copied so the caller may reuse its buffer
+        :return: False if the frame was dropped because the queue is full
+        """
+        if self._closed:
+            raise RuntimeError("push on a closed FrameRecorder")
+        self._raise_error()
+        index = self.frames_pushed
+        self.frames_pushed += 1
+        try:
+            self._queue.put_nowait((index, np.array(frame, dtype=np.uint8, copy=True)))
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+        return True
+
+    def _write_loop(self):
+        frames, indices = [], []
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # keep draining the queue, so push never finds it full and close never blocks
+                continue
+            index, frame = item
+            indices.append(index)
+            frames.append(frame)
+            if len(frames) >= self.chunk_size:
+                self._write_chunk_or_store_error(frames, indices)
+                frames, indices = [], []
+        if frames and self._error is None:
+            self._write_chunk_or_store_error(frames, indices)
+
+    def _write_chunk_or_store_error(self, frames: list[np.ndarray], indices: list[int]):
+        try:
+            self._write_chunk(frames, indices)
+        except Exception as e:
+            self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"FrameRecorder failed to write to {self.directory}") from self._error
+
+    def _write_chunk(self, frames: list[np.ndarray], indices: list[int]):
+        """
+        Writes one chunk. npz chunks also store the index of every frame, so dropped frames can be identified
+        """
+        path = os.path.join(self.directory, f"frames_{self.chunks_written:05d}.{self.encoder}")
+        if self.encoder == "npz":
+            np.savez_compressed(path, frames=np.stack(frames), indices=np.array(indices))
+        else:
+            import imageio
+
+            if self.encoder == "gif":
+                imageio.mimsave(path, frames, duration=1000 / self.fps, loop=0)
+            else:
+                imageio.mimsave(path, frames, fps=self.fps)
+        self.frames_written += len(frames)
+        self.chunks_written += 1
+
+    def close(self):
+        """
+        Writes the remaining queued frames and stops the writer thread.
+        Raises the error of the writer, if writing failed
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordFramesWrapper(gym.Wrapper):
+    """
+    Records the rgb_array frames of an env with a FrameRecorder.
+    Use it instead of render_mode="human" to monitor training: rendering happens on the env thread
+    (cheap with render_backend="numpy"), encoding and writing happen in the background and never throttle the env.
+    """
+
+    def __init__(self, env: gym.Env, recorder: FrameRecorder, record_every: int = 1):
+        """
+
+        :param env: The env to record, must use render_mode "rgb_array"
+        :param recorder: The recorder that writes the frames
+        :param record_every: Only every record_every-th step is rendered and recorded
+        """
+        assert env.render_mode == "rgb_array", "RecordFramesWrapper needs render_mode='rgb_array'"
+        super().__init__(env)
+        self.recorder = recorder
+        self.record_every = record_every
+        self._steps = 0
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._record()
+        return obs, info
+
+    def step(self, action):
+        result = self.env.step(action)
+        self._record()
+        return result
+
+    def _record(self):
+        if self._steps % self.record_every == 0:
+            self.recorder.push(self.env.render())
+        self._steps += 1
+
+    def close(self):
+        self.recorder.close()
+        super().close()
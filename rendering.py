@@ -2,6 +2,7 @@ import pygame
 import numpy as np
 import sys
 
+WALL_COLOR = (64, 64, 64)
 
 class Renderer:
     """
@@ -20,9 +21,7 @@ class Renderer:
         :param window_size: The displayed window size in pixels
         :param render_mode: "human", "rgb_array" or None
         """
-        pygame.init()
-        name = pygame.font.get_default_font()
-        self._font = pygame.font.SysFont(name=name, size=20)
+        # pygame is initialised with the window on the first rendered frame in human mode
         self.window_size = window_size  # pyGame window size
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
@@ -37,6 +36,7 @@ class Renderer:
         new_episode=False,
         targets=None,
         visited_cells_count=None,
+        walls=None,
     ):
         """
         Renders in rgb_mode
@@ -44,13 +44,15 @@ class Renderer:
         :param new_episode: Flag if a new episode has started. Renders a black screen between episodes
         :param targets: The targets of the grid world
         :param visited_cells_count: Array / Matrix that counts how often a cell (position in grid) was visited by the agent (Optional parameter.)
+        :param walls: Boolean (grid_size, grid_size) wall grid, walls are drawn dark gray (Optional parameter.)
         """
         if self.render_mode == "rgb_array":
             return self.render_frame(
                 agent_location=agent_location,
                 new_episode=new_episode,
                 targets=targets,
-                visited_cells_count=visited_cells_count
+                visited_cells_count=visited_cells_count,
+                walls=walls,
             )
 
     def render_frame_for_humans_if_needed(
@@ -58,7 +60,8 @@ class Renderer:
         agent_location,
         new_episode=False,
         targets=None,
-        visited_cells_count=None
+        visited_cells_count=None,
+        walls=None,
     ):
         """
         Renders the frame if rendering_mode == "human"
@@ -66,6 +69,7 @@ class Renderer:
         :param new_episode: Flag if a new episode has started. Renders a black screen between episodes
         :param targets: The targets that should be rendered.
         :param visited_cells_count: / Matrix that counts how often a cell (position in grid) was visited by the agent (Optional parameter.)
+        :param walls: Boolean (grid_size, grid_size) wall grid, walls are drawn dark gray (Optional parameter.)
         """
         if self.render_mode == "human":
             return self.render_frame(
@@ -73,6 +77,7 @@ class Renderer:
                 new_episode=new_episode,
                 targets=targets,
                 visited_cells_count=visited_cells_count,
+                walls=walls,
             )
 
     def render_frame(
@@ -81,6 +86,7 @@ class Renderer:
         new_episode=False,
         targets=None,
         visited_cells_count=None,
+        walls=None,
     ):
         """
         The actual rendering function
@@ -88,6 +94,7 @@ class Renderer:
         :param new_episode: Flag if a new episode has started. Renders a black screen between episodes
         :param targets: The targets that should be rendered
         :param visited_cells_count: Array / Matrix that counts how often a cell (position in grid) was visited by the agent (Optional parameter.)
+        :param walls: Boolean (grid_size, grid_size) wall grid, walls are drawn dark gray (Optional parameter.)
         """
         space_top = 0
         window_length = window_height = self.window_size
@@ -102,7 +109,7 @@ class Renderer:
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface(self.window.get_size())
+        canvas = pygame.Surface((window_length, self.window_size + space_top))
         canvas.fill((255, 255, 255))
         if new_episode:
             # render a black screen when a new episode begins
@@ -117,6 +124,7 @@ class Renderer:
                 agent_location=agent_location,
                 targets=targets,
                 visited_cells_count=visited_cells_count,
+                walls=walls,
             )
             canvas.blit(env_grid, (0, space_top))
 
@@ -148,11 +156,18 @@ class Renderer:
         agent_location,
         targets=None,
         visited_cells_count=None,
+        walls=None,
     ) -> pygame.surface:
         canvas = pygame.Surface((self.window_size, self.window_size))
         canvas.fill((255, 255, 255))
 
         visited_cells_count = {} if visited_cells_count is None else visited_cells_count
+        if isinstance(visited_cells_count, np.ndarray):
+            # count matrix, only the visited cells are drawn
+            visited_cells_count = {
+                tuple(position): visited_cells_count[tuple(position)]
+                for position in np.argwhere(visited_cells_count > 0)
+            }
         for position, times_visited in visited_cells_count.items():
             # color visited cell according to times visited
             # yellow for the first visit, then darken it linearly, darkest color is (255, 25, 0)
@@ -167,16 +182,30 @@ class Renderer:
                     (pix_square_size, pix_square_size),
                 ),
             )
-        
+
+        if walls is not None:
+            for position in np.argwhere(walls):
+                pygame.draw.rect(
+                    canvas,
+                    WALL_COLOR,
+                    pygame.Rect(pix_square_size * position, (pix_square_size, pix_square_size)),
+                )
+
         if targets is None:
             targets = []
 
+        if hasattr(targets, "positions"):
+            # structure-of-arrays target.TargetStore
+            target_positions_colors = zip(targets.positions, targets.colors.tolist())
+        else:
+            target_positions_colors = ((target.position, target.color) for target in targets)
+
         # draw the targets
-        for target in targets:
+        for target_position, target_color in target_positions_colors:
             target_color_base = (
-                target.color
+                target_color
                 if not (
-                        np.array_equal(target.position, agent_location)
+                        np.array_equal(target_position, agent_location)
                 )
                 else (0, 255, 0)
             )
@@ -184,7 +213,7 @@ class Renderer:
                 canvas,
                 target_color_base,
                 pygame.Rect(
-                    pix_square_size * target.position,
+                    pix_square_size * target_position,
                     (pix_square_size, pix_square_size),
                 ),
             )
@@ -219,3 +248,13 @@ class Renderer:
                 (pix_square_size * x, self.window_size),
                 width=3,
             )
+
+    def close(self):
+        """
+        Closes the pygame window if one was opened
+        """
+        if self.window is not None:
+            pygame.display.quit()
+            pygame.quit()
+            self.window = None
+            self.clock = None
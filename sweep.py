@@ -0,0 +1,376 @@
+"""
+Hyperparameter sweeps for PPO / DQN on FindTargetEnv (or any gymnasium env).
+
+The search space is read from a YAML file (see sweeps/ppo_find_target.yaml). Trials run concurrently in a
+process pool, each trial is limited to threads_per_trial torch / BLAS threads so the trials do not oversubscribe
+the cores. Trials are evaluated every eval_every steps and bad trials are stopped early by a median or
+successive halving pruner. All trials and intermediate evaluations are stored in a SQLite file,
+running the same sweep again resumes it: finished trials are skipped, interrupted trials are restarted.
+
+Usage (from the repository root):
+    python -m sweep sweeps/ppo_find_target.yaml --storage ppo_sweep.db --n-jobs 8 --threads-per-trial 1
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+import traceback
+
+import numpy as np
+import yaml
+
+TRIAL_STATES = ("running", "complete", "pruned", "failed")
+
+
+def sample_params(search_space: dict, rng: np.random.Generator) -> dict:
+    """
+    Samples one value for every parameter of the search space
+    :param search_space: name -> {"type": "uniform" | "loguniform" | "int" | "categorical", ...}
+        uniform / loguniform / int need "low" and "high" (int optionally "log": true), categorical needs "choices"
+    :param rng: The random number generator of the trial
+    :return: name -> value
+    """
+    params = {}
+    for name, spec in search_space.items():
+        kind = spec["type"]
+        # YAML reads numbers like 1e-5 as strings
+        low, high = float(spec.get("low", 0)), float(spec.get("high", 0))
+        if kind == "uniform":
+            params[name] = float(rng.uniform(low, high))
+        elif kind == "loguniform":
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        elif kind == "int":
+            if spec.get("log", False):
+                value = np.exp(rng.uniform(np.log(low), np.log(high + 1)))
+                params[name] = int(min(np.floor(value), high))
+            else:
+                params[name] = int(rng.integers(int(low), int(high), endpoint=True))
+        elif kind == "categorical":
+            params[name] = spec["choices"][int(rng.integers(len(spec["choices"])))]
+        else:
+            raise ValueError(f"Unknown parameter type {kind!r} of {name!r}")
+    return params
+
+
+class SweepStore:
+    """
+    SQLite store of the trials and their intermediate evaluations.
+    The store is opened by the sweep process and by every trial process (WAL mode, so readers do not block the writer).
+    """
+
+    def __init__(self, path: str):
+        """
+
+        :param path: The SQLite file, it is created if it does not exist
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS trials (trial_id INTEGER PRIMARY KEY, params TEXT, state TEXT, "
+                "value REAL, steps INTEGER, duration REAL, error TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS reports (trial_id INTEGER, step INTEGER, value REAL, "
+                "PRIMARY KEY (trial_id, step))"
+            )
+
+    def check_config(self, config: dict):
+        """
+        Stores the sweep config, or checks that the store belongs to the same sweep when it is resumed
+        """
+        config_json = json.dumps(config, sort_keys=True)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None:
+            with self.connection:
+                self.connection.execute("INSERT INTO meta VALUES ('config', ?)", (config_json,))
+        elif row[0] != config_json:
+            raise ValueError(f"{self.path} belongs to a different sweep config, use another --storage file")
+
+    def finished_trials(self) -> set[int]:
+        """
+        :return: The ids of the trials that completed or were pruned
+        """
+        rows = self.connection.execute("SELECT trial_id FROM trials WHERE state IN ('complete', 'pruned')")
+        return {trial_id for trial_id, in rows}
+
+    def start_trial(self, trial_id: int, params: dict):
+        """
+        Marks a trial as running, reports of an earlier interrupted run of the trial are deleted
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM reports WHERE trial_id = ?", (trial_id,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO trials VALUES (?, ?, 'running', NULL, 0, NULL, NULL)",
+                (trial_id, json.dumps(params)),
+            )
+
+    def finish_trial(self, trial_id: int, state: str, value: float | None, steps: int, duration: float, error=None):
+        assert state in TRIAL_STATES
+        with self.connection:
+            self.connection.execute(
+                "UPDATE trials SET state = ?, value = ?, steps = ?, duration = ?, error = ? WHERE trial_id = ?",
+                (state, value, steps, duration, error, trial_id),
+            )
+
+    def report(self, trial_id: int, step: int, value: float):
+        """
+        Stores the evaluation reward of a trial after step env steps
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?)", (trial_id, step, value))
+
+    def values_at(self, step: int, exclude: int | None = None) -> np.ndarray:
+        """
+        :return: The evaluation rewards of all (other) trials after step env steps
+        """
+        rows = self.connection.execute(
+            "SELECT value FROM reports WHERE step = ? AND trial_id IS NOT ?", (step, exclude)
+        ).fetchall()
+        return np.array([value for value, in rows], dtype=float)
+
+    def trials(self) -> list[dict]:
+        """
+        :return: All trials, best first
+        """
+        rows = self.connection.execute(
+            "SELECT trial_id, params, state, value, steps, duration, error FROM trials "
+            "ORDER BY value IS NULL, value DESC"
+        ).fetchall()
+        keys = ("trial_id", "params", "state", "value", "steps", "duration", "error")
+        return [dict(zip(keys, row), params=json.loads(row[1])) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+class MedianPruner:
+    """
+    Prunes a trial if its evaluation reward is below the median of the other trials at the same step
+    """
+
+    def __init__(self, warmup_steps: int = 0, min_trials: int = 4):
+        """
+
+        :param warmup_steps: Trials are not pruned before this many env steps
+        :param min_trials: Minimum number of other trials that reported at the same step
+        """
+        self.warmup_steps = warmup_steps
+        self.min_trials = min_trials
+
+    def should_prune(self, store: SweepStore, trial_id: int, step: int, value: float) -> bool:
+        if step < self.warmup_steps:
+            return False
+        others = store.values_at(step, exclude=trial_id)
+        return len(others) >= self.min_trials and value < np.median(others)
+
+
+class SuccessiveHalvingPruner:
+    """
+    Asynchronous successive halving: the rungs are at min_resource * reduction_factor**k env steps,
+    a trial is only continued after a rung if it is among the best 1 / reduction_factor of the trials
+    that reached that rung so far.
+    """
+
+    def __init__(self, min_resource: int, reduction_factor: int = 3):
+        """
+
+        :param min_resource: Env steps of the first rung
+        :param reduction_factor: Only the best 1 / reduction_factor trials are promoted to the next rung
+        """
+        self.min_resource = min_resource
+        self.reduction_factor = reduction_factor
+
+    def is_rung(self, step: int) -> bool:
+        rung = self.min_resource
+        while rung < step:
+            rung *= self.reduction_factor
+        return rung == step
+
+    def should_prune(self, store: SweepStore, trial_id: int, step: int, value: float) -> bool:
+        if not self.is_rung(step):
+            return False
+        values = np.append(store.values_at(step, exclude=trial_id), value)
+        if len(values) < self.reduction_factor:
+            return False
+        num_promoted = len(values) // self.reduction_factor
+        return value < np.sort(values)[-num_promoted]
+
+
+def make_pruner(config: dict | None):
+    """
+    :param config: {"type": "median", "warmup_steps": ..., "min_trials": ...},
+        {"type": "successive_halving", "min_resource": ..., "reduction_factor": ...} or None (no pruning)
+    """
+    if config is None:
+        return None
+    config = dict(config)
+    kind = config.pop("type")
+    if kind == "median":
+        return MedianPruner(**config)
+    if kind == "successive_halving":
+        return SuccessiveHalvingPruner(**config)
+    raise ValueError(f"Unknown pruner {kind!r}")
+
+
+def _limit_threads(num_threads: int):
+    """
+    Initializer of the trial processes, it runs before torch is imported so the limits apply to all thread pools
+    """
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(num_threads)
+
+
+def run_trial(config: dict, trial_id: int, params: dict, storage: str, num_threads: int) -> dict:
+    """
+    Trains one model with the sampled params, evaluating it every eval_every env steps.
+    Runs in a worker process of the sweep.
+    :return: The state, final evaluation reward, env steps and duration of the trial
+    """
+    import torch
+    from stable_baselines3 import DQN, PPO
+    from stable_baselines3.common.callbacks import BaseCallback
+    from stable_baselines3.common.evaluation import evaluate_policy
+
+    from training import make_training_env, register_find_target_env
+
+    torch.set_num_threads(num_threads)
+    start_time = time.perf_counter()
+    store = SweepStore(storage)
+    pruner = make_pruner(config.get("pruner"))
+    seed = config.get("seed", 0) + trial_id
+    env_id = config.get("env_id", "FindTargetEnv-v0")
+    env_kwargs = config.get("env_kwargs", {})
+    eval_every = config["eval_every"]
+    if env_id == "FindTargetEnv-v0":
+        register_find_target_env(env_id)
+
+    env = make_training_env(
+        env_id,
+        num_envs=config.get("num_envs", 1),
+        vec_env=config.get("vec_env", "dummy"),
+        seed=seed,
+        env_kwargs=env_kwargs,
+    )
+    eval_env = make_training_env(env_id, num_envs=1, seed=seed + 10**6, env_kwargs=env_kwargs)
+    ALGO = {"PPO": PPO, "DQN": DQN}[config.get("algo", "PPO")]
+    model = ALGO("MlpPolicy", env, seed=seed, verbose=0, **config.get("fixed_params", {}), **params)
+
+    class EvalCallback(BaseCallback):
+        def __init__(self):
+            super().__init__()
+            self.next_eval = eval_every
+            self.value = None
+            self.pruned = False
+
+        def _on_step(self) -> bool:
+            if self.num_timesteps < self.next_eval:
+                return True
+            self.value, _ = evaluate_policy(self.model, eval_env, n_eval_episodes=config.get("eval_episodes", 10))
+            # report at the nominal step, so the reports of all trials line up
+            store.report(trial_id, self.next_eval, self.value)
+            if pruner is not None:
+                self.pruned = pruner.should_prune(store, trial_id, self.next_eval, self.value)
+            self.next_eval += eval_every
+            return not self.pruned
+
+    callback = EvalCallback()
+    model.learn(total_timesteps=config["total_timesteps"], callback=callback)
+    if not callback.pruned and callback.num_timesteps < callback.next_eval:
+        callback.value, _ = evaluate_policy(model, eval_env, n_eval_episodes=config.get("eval_episodes", 10))
+    env.close()
+    eval_env.close()
+    store.close()
+    return {
+        "state": "pruned" if callback.pruned else "complete",
+        "value": callback.value,
+        "steps": model.num_timesteps,
+        "duration": time.perf_counter() - start_time,
+    }
+
+
+def _run_trial_safe(*args) -> dict:
+    try:
+        return run_trial(*args)
+    except Exception:
+        return {"state": "failed", "value": None, "steps": 0, "duration": 0.0, "error": traceback.format_exc()}
+
+
+def run_sweep(config: dict, storage: str, n_jobs: int | None = None, threads_per_trial: int = 1) -> list[dict]:
+    """
+    Runs (or resumes) a sweep
+    :param config: The sweep config (see sweeps/ppo_find_target.yaml)
+    :param storage: The SQLite file of the sweep
+    :param n_jobs: Number of concurrent trials, defaults to number of cores // threads_per_trial
+    :param threads_per_trial: torch / BLAS threads of every trial
+    :return: All trials, best first
+    """
+    if n_jobs is None:
+        n_jobs = max(1, (os.cpu_count() or 1) // threads_per_trial)
+    store = SweepStore(storage)
+    store.check_config(config)
+    finished = store.finished_trials()
+
+    # the params of a trial only depend on the sweep seed and the trial id, so a resumed sweep samples the same trials
+    pending = {}
+    for trial_id in range(config["num_trials"]):
+        rng = np.random.default_rng([config.get("seed", 0), trial_id])
+        params = sample_params(config["search_space"], rng)
+        if trial_id not in finished:
+            pending[trial_id] = params
+    print(f"{len(finished)} trials finished, {len(pending)} to run with {n_jobs} jobs")
+
+    start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=mp.get_context(start_method),
+        initializer=_limit_threads,
+        initargs=(threads_per_trial,),
+    ) as executor:
+        futures = {}
+        for trial_id, params in pending.items():
+            store.start_trial(trial_id, params)
+            future = executor.submit(_run_trial_safe, config, trial_id, params, storage, threads_per_trial)
+            futures[future] = trial_id
+        for future in concurrent.futures.as_completed(futures):
+            trial_id = futures[future]
+            result = future.result()
+            store.finish_trial(trial_id, **result)
+            value = "-" if result["value"] is None else f"{result['value']:.2f}"
+            print(f"trial {trial_id}: {result['state']}, reward {value}, {result['steps']} steps")
+            if result["state"] == "failed":
+                print(result["error"])
+
+    trials = store.trials()
+    store.close()
+    return trials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config", help="YAML file with the sweep config and search space")
+    parser.add_argument("--storage", default=None, help="SQLite file of the sweep, defaults to <config name>.db")
+    parser.add_argument("--n-jobs", type=int, default=None)
+    parser.add_argument("--threads-per-trial", type=int, default=1)
+    parser.add_argument("--top", type=int, default=5, help="Number of best trials to print")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    storage = args.storage or os.path.splitext(os.path.basename(args.config))[0] + ".db"
+    trials = run_sweep(config, storage, n_jobs=args.n_jobs, threads_per_trial=args.threads_per_trial)
+
+    print(f"\nbest trials of {storage}:")
+    for trial in trials[: args.top]:
+        value = "-" if trial["value"] is None else f"{trial['value']:.2f}"
+        print(f"trial {trial['trial_id']:>4} {trial['state']:>8} reward {value:>8} {trial['params']}")
+
+
+if __name__ == "__main__":
+    main()
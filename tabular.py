@@ -0,0 +1,194 @@
+"""
+Exact solutions of the FindTargetEnv grid world with a single static target.
+
+The state of the grid world that matters for rewards and termination is the agent cell, so the MDP has size**2
+states and 4 actions. Its transitions are deterministic: the transition tensor P[s, a, s'] is stored as
+next_states[s, a] (the only s' with P = 1), built from the action mapping of the env.
+Value iteration solves it in at most 2 * size sweeps over all (state, action) pairs at once, the solutions are
+cached per (size, target position, gamma, rewards).
+
+    solution = solve(size=5, target=(1, 3))
+    solution.values[agent_x, agent_y]      # optimal return from the agent cell
+    solution.policy[agent_x, agent_y]      # optimal action
+"""
+
+import functools
+from typing import NamedTuple
+
+import numpy as np
+
+from Environments.findTargetVecEnv import FindTargetVecEnv
+
+
+class GridMDP(NamedTuple):
+    """
+    The grid world as tabular MDP, state s is the agent cell x * size + y
+    """
+
+    size: int
+    target: tuple[int, int]
+    # (S, A) next state of every state and action
+    next_states: np.ndarray
+    # (S, A) reward of every state and action
+    rewards: np.ndarray
+    # (S, A) True if the transition ends the episode
+    dones: np.ndarray
+
+
+class TabularSolution(NamedTuple):
+    mdp: GridMDP
+    gamma: float
+    # (size, size, A) optimal action values
+    q_values: np.ndarray
+    # (size, size) optimal state values
+    values: np.ndarray
+    # (size, size) greedy optimal actions
+    policy: np.ndarray
+    iterations: int
+
+
+def build_mdp(
+    size: int,
+    target: tuple[int, int],
+    action_to_direction: np.ndarray = FindTargetVecEnv.action_to_direction,
+    step_reward: float = FindTargetVecEnv.step_reward,
+    target_reward: float = FindTargetVecEnv.target_reward,
+) -> GridMDP:
+    """
+    Builds the transition and reward tables of the grid world
+    :param size: The grid size
+    :param target: The target cell (x, y)
+    :param action_to_direction: (A, 2) movement of every action, moves off the grid leave the agent in place
+    :param step_reward: Reward of every step that does not reach the target
+    :param target_reward: Reward of the step that reaches the target
+    """
+    cells = np.stack(np.divmod(np.arange(size**2), size), axis=1)
+    new_cells = np.clip(cells[:, np.newaxis] + np.asarray(action_to_direction)[np.newaxis], 0, size - 1)
+    next_states = new_cells[..., 0] * size + new_cells[..., 1]
+    target_state = target[0] * size + target[1]
+    dones = next_states == target_state
+    rewards = np.where(dones, target_reward, step_reward).astype(float)
+    # the target cell is terminal: the agent never acts there
+    dones[target_state] = True
+    rewards[target_state] = 0
+    return GridMDP(size, tuple(int(t) for t in target), next_states, rewards, dones)
+
+
+def value_iteration(mdp: GridMDP, gamma: float = 0.99, tol: float = 1e-9, max_iterations: int = 10_000):
+    """
+    Synchronous value iteration over all states and actions at once
+    :return: The (S, A) optimal action values and the number of iterations
+    """
+    values = np.zeros(len(mdp.next_states))
+    continues = ~mdp.dones
+    for iteration in range(1, max_iterations + 1):
+        q_values = mdp.rewards + gamma * continues * values[mdp.next_states]
+        new_values = q_values.max(axis=1)
+        if np.max(np.abs(new_values - values)) <= tol:
+            return q_values, iteration
+        values = new_values
+    raise RuntimeError(f"value iteration did not converge in {max_iterations} iterations")
+
+
+def q_learning(
+    mdp: GridMDP,
+    gamma: float = 0.99,
+    learning_rate: float = 0.5,
+    num_updates: int = 200,
+    batch_size: int = 4096,
+    seed: int | None = None,
+) -> np.ndarray:
+    """
+    Model-free reference: tabular Q-learning on batches of uniformly sampled (state, action) transitions
+    :return: The (S, A) learned action values
+    """
+    rng = np.random.default_rng(seed)
+    num_states, num_actions = mdp.next_states.shape
+    q_values = np.zeros((num_states, num_actions))
+    for _ in range(num_updates):
+        states = rng.integers(num_states, size=batch_size)
+        actions = rng.integers(num_actions, size=batch_size)
+        next_values = q_values[mdp.next_states[states, actions]].max(axis=1)
+        targets = mdp.rewards[states, actions] + gamma * ~mdp.dones[states, actions] * next_values
+        # average the updates of duplicate (state, action) pairs in the batch
+        errors = np.zeros_like(q_values)
+        counts = np.zeros_like(q_values)
+        np.add.at(errors, (states, actions), targets - q_values[states, actions])
+        np.add.at(counts, (states, actions), 1)
+        q_values += learning_rate * errors / np.maximum(counts, 1)
+    return q_values
+
+
+@functools.lru_cache(maxsize=1024)
+def solve(
+    size: int,
+    target: tuple[int, int],
+    gamma: float = 0.99,
+    step_reward: float = FindTargetVecEnv.step_reward,
+    target_reward: float = FindTargetVecEnv.target_reward,
+) -> TabularSolution:
+    """
+    Solves the grid world exactly, the solution is cached per (size, target, gamma, rewards).
+    The returned arrays are read-only, they are shared between all callers.
+    :param target: The target cell as tuple (x, y)
+    """
+    mdp = build_mdp(size, tuple(int(t) for t in target), step_reward=step_reward, target_reward=target_reward)
+    q_values, iterations = value_iteration(mdp, gamma)
+    q_values = q_values.reshape(size, size, -1)
+    solution = TabularSolution(mdp, gamma, q_values, q_values.max(axis=2), q_values.argmax(axis=2), iterations)
+    for array in (q_values, solution.values, solution.policy):
+        array.flags.writeable = False
+    return solution
+
+
+def optimal_return(size: int, target: tuple[int, int], agent: tuple[int, int], gamma: float = 1.0) -> float:
+    """
+    :return: The return of an optimal episode from the agent cell (undiscounted by default)
+    """
+    return float(solve(size, tuple(target), gamma).values[agent[0], agent[1]])
+
+
+class OptimalPolicy:
+    """
+    Reference policy for FindTargetEnv (single static target), acts greedily on the cached optimal action values.
+    The target is not part of the observation, so the policy reads it from the env.
+    """
+
+    def __init__(self, env, gamma: float = 0.99):
+        """
+
+        :param env: A FindTargetEnv (or a wrapper of it)
+        """
+        self.env = env.unwrapped
+        self.gamma = gamma
+
+    def predict(self, observation: np.ndarray, state=None, episode_start=None, deterministic: bool = True):
+        """
+        Same interface as model.predict, observation[:2] is the agent location
+        """
+        target = tuple(self.env._targets.positions[0])
+        solution = solve(self.env.size, target, self.gamma)
+        return np.int64(solution.policy[observation[0], observation[1]]), None
+
+
+def episode_regrets(env, model, num_episodes: int, max_episode_steps: int = 50, deterministic: bool = True) -> np.ndarray:
+    """
+    Runs a model on a FindTargetEnv and compares every episode with the optimal return from the same start
+    :param env: A FindTargetEnv with a single static target (not wrapped in a TimeLimit)
+    :param model: Anything with a SB3 predict method
+    :return: The undiscounted regret (optimal return - return) of every episode
+    """
+    regrets = np.zeros(num_episodes)
+    unwrapped = env.unwrapped
+    for episode in range(num_episodes):
+        obs, _ = env.reset()
+        best = optimal_return(unwrapped.size, tuple(unwrapped._targets.positions[0]), tuple(unwrapped._agent_location))
+        episode_return = 0.0
+        for _ in range(max_episode_steps):
+            action, _ = model.predict(obs, deterministic=deterministic)
+            obs, reward, terminated, truncated, _ = env.step(int(action))
+            episode_return += reward
+            if terminated or truncated:
+                break
+        regrets[episode] = best - episode_return
+    return regrets
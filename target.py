@@ -32,6 +32,45 @@ class DirectionType(Enum):
     APPEAR = 9
 
 
+# Movement vector of every DirectionType, indexed by DirectionType.value
+MOVEMENT_VECTORS = np.array(
+    [
+        [0, 0],  # NONE
+        [0, -1],  # UP
+        [0, 1],  # DOWN
+        [-1, 0],  # LEFT
+        [1, 0],  # RIGHT
+        [-1, 1],  # DIAGONAL_LEFT_DOWN
+        [-1, -1],  # DIAGONAL_LEFT_UP
+        [1, 1],  # DIAGONAL_RIGHT_DOWN
+        [1, -1],  # DIAGONAL_RIGHT_UP
+        [0, 0],  # APPEAR
+    ],
+    dtype=int,
+)
+MOVEMENT_VECTORS.setflags(write=False)
+
+# Reversed DirectionType.value of every DirectionType, indexed by DirectionType.value
+REVERSED_DIRECTIONS = np.array(
+    [
+        DirectionType.NONE.value,
+        DirectionType.DOWN.value,
+        DirectionType.UP.value,
+        DirectionType.RIGHT.value,
+        DirectionType.LEFT.value,
+        DirectionType.DIAGONAL_RIGHT_UP.value,
+        DirectionType.DIAGONAL_RIGHT_DOWN.value,
+        DirectionType.DIAGONAL_LEFT_UP.value,
+        DirectionType.DIAGONAL_LEFT_DOWN.value,
+        DirectionType.NONE.value,  # APPEAR
+    ],
+    dtype=np.int8,
+)
+REVERSED_DIRECTIONS.setflags(write=False)
+
+_DIRECTION_TYPES = tuple(DirectionType)
+
+
 class Direction:
     """
     Class representing a specific movement direction.
@@ -44,6 +83,8 @@ class Direction:
         movement_vector() -> np.ndarray: Get the movement vector associated with the direction.
     """
 
+    __slots__ = ("direction_type",)
+
     def __init__(self, direction_type: DirectionType):
         """
         Initialize a Direction object with a given direction type.
@@ -57,63 +98,24 @@ class Direction:
         """
         Reverse the current direction.
         """
-        match self.direction_type:
-            case DirectionType.UP:
-                self.direction_type = DirectionType.DOWN
-            case DirectionType.DOWN:
-                self.direction_type = DirectionType.UP
-            case DirectionType.LEFT:
-                self.direction_type = DirectionType.RIGHT
-            case DirectionType.RIGHT:
-                self.direction_type = DirectionType.LEFT
-            case DirectionType.DIAGONAL_LEFT_DOWN:
-                self.direction_type = DirectionType.DIAGONAL_RIGHT_UP
-            case DirectionType.DIAGONAL_LEFT_UP:
-                self.direction_type = DirectionType.DIAGONAL_RIGHT_DOWN
-            case DirectionType.DIAGONAL_RIGHT_DOWN:
-                self.direction_type = DirectionType.DIAGONAL_LEFT_UP
-            case DirectionType.DIAGONAL_RIGHT_UP:
-                self.direction_type = DirectionType.DIAGONAL_LEFT_DOWN
-            case _:
-                self.direction_type = DirectionType.NONE
+        self.direction_type = _DIRECTION_TYPES[REVERSED_DIRECTIONS[self.direction_type.value]]
 
     def movement_vector(self):
         """
         Get the movement vector associated with the direction.
 
         Returns:
-            np.ndarray: A NumPy array representing the movement vector.
+            np.ndarray: A read-only NumPy array representing the movement vector.
                         For example, np.array([1, 0]) for rightward movement.
         """
-        match self.direction_type:
-            case DirectionType.UP:
-                return np.array([0, -1])
-            case DirectionType.DOWN:
-                return np.array([0, 1])
-            case DirectionType.RIGHT:
-                return np.array([1, 0])
-            case DirectionType.LEFT:
-                return np.array([-1, 0])
-            case DirectionType.DIAGONAL_LEFT_UP:
-                return np.array([-1, -1])
-            case DirectionType.DIAGONAL_LEFT_DOWN:
-                return np.array([-1, 1])
-            case DirectionType.DIAGONAL_RIGHT_UP:
-                return np.array([1, -1])
-            case DirectionType.DIAGONAL_RIGHT_DOWN:
-                return np.array([1, 1])
-            case DirectionType.NONE | DirectionType.APPEAR:
-                return np.array([0, 0])
-            case _:
-                return np.array([0, 0])
+        return MOVEMENT_VECTORS[self.direction_type.value]
 
     def __eq__(self, other):
         if isinstance(self, other.__class__):
-            return self.direction_type.name == other.direction_type.name
+            return self.direction_type is other.direction_type
         return False
 
 
-
 class Target:
     """
     Class representing a target.
@@ -139,6 +141,18 @@ class Target:
 
     """
 
+    __slots__ = (
+        "color",
+        "reward",
+        "position",
+        "velocity",
+        "movement",
+        "random_start",
+        "_org_position",
+        "steps_per_timestep",
+        "steps_until_next_steps",
+    )
+
     def __init__(
         self,
         color,
@@ -221,3 +235,164 @@ class Target:
         """
         self.position = new_position
 
+
+def _steps_per_timestep(velocities: np.ndarray) -> np.ndarray:
+    """
+    Number of steps per timestep for finite velocities, same rules as Target.__init__.
+    """
+    return np.where(velocities <= 0, 0, np.where(velocities >= 1, np.round(velocities), 1)).astype(int)
+
+
+class TargetStore:
+    """
+    Structure-of-arrays store for many targets, e.g. all targets of one env (shape (T,))
+    or of a batch of envs (shape (N, T)). All targets are advanced with one vectorized step
+    that follows the same rules as Target.step, using the MOVEMENT_VECTORS and REVERSED_DIRECTIONS tables.
+
+    Attributes (arrays, the leading shape is shared by all of them):
+        positions (np.ndarray): Current positions, shape (..., 2).
+        org_positions (np.ndarray): Original positions, shape (..., 2).
+        colors (np.ndarray): RGB colors as uint8, shape (..., 3).
+        rewards (np.ndarray): Rewards associated with the targets.
+        velocities (np.ndarray): Velocities of the targets.
+        directions (np.ndarray): DirectionType values of the targets' movement.
+        random_start (np.ndarray): Flags indicating if APPEAR targets reappear at random positions.
+        steps_per_timestep (np.ndarray): Number of steps a target moves in a single timestep.
+        steps_until_next_steps (np.ndarray): Steps remaining until a target moves again.
+        countdown_reloads (np.ndarray): Value steps_until_next_steps is reset to after a target moved.
+
+    Methods:
+        step(self, rng, size): Move all targets according to their configuration for one timestep.
+        reverse_directions(self, mask): Reverse the direction of the selected targets.
+        from_targets(targets) -> TargetStore: Create a store from Target objects.
+    """
+
+    __slots__ = (
+        "positions",
+        "org_positions",
+        "colors",
+        "rewards",
+        "velocities",
+        "directions",
+        "random_start",
+        "steps_per_timestep",
+        "steps_until_next_steps",
+        "countdown_reloads",
+    )
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        rewards=10,
+        velocities=0.0,
+        directions=DirectionType.NONE.value,
+        colors=(255, 0, 0),
+        random_start=False,
+    ):
+        """
+        Initialize a TargetStore. All parameters except positions are broadcast to the shape of the store.
+
+        Parameters:
+            positions (np.ndarray): Initial positions of the targets, shape (..., 2).
+            rewards: Rewards associated with the targets.
+            velocities: Velocities of the targets.
+            directions: DirectionType values of the targets' movement.
+            colors: RGB colors of the targets.
+            random_start: Flags indicating if APPEAR targets reappear at random positions.
+        """
+        self.positions = np.array(positions, dtype=int)
+        shape = self.positions.shape[:-1]
+        self.org_positions = self.positions.copy()
+        self.colors = np.broadcast_to(np.asarray(colors, dtype=np.uint8), shape + (3,)).copy()
+        self.rewards = np.broadcast_to(np.asarray(rewards, dtype=int), shape).copy()
+        self.velocities = np.broadcast_to(np.asarray(velocities, dtype=float), shape).copy()
+        self.directions = np.broadcast_to(np.asarray(directions, dtype=np.int8), shape).copy()
+        self.random_start = np.broadcast_to(np.asarray(random_start, dtype=bool), shape).copy()
+
+        # same rules as Target.__init__
+        velocities = np.where(np.isinf(self.velocities), 1.0, self.velocities)
+        slow = (velocities > 0) & (velocities < 1)
+        self.steps_per_timestep = _steps_per_timestep(velocities)
+        inverse = np.divide(1.0, velocities, out=np.ones_like(velocities), where=slow)
+        self.countdown_reloads = np.where(slow, np.round(inverse) - 1, 0).astype(int)
+        self.steps_until_next_steps = self.countdown_reloads.copy()
+
+    def reset(self, positions: np.ndarray, directions=None):
+        """
+        Restart all targets at new positions without allocating a new store.
+        Rewards, velocities, colors and random_start are kept, the movement counters start over.
+
+        Parameters:
+            positions (np.ndarray): New positions of the targets, same shape as the store's positions.
+            directions (optional): New DirectionType values, the current directions are kept if None.
+        """
+        self.positions[...] = positions
+        self.org_positions[...] = positions
+        if directions is not None:
+            self.directions[...] = directions
+        velocities = np.where(np.isinf(self.velocities), 1.0, self.velocities)
+        self.steps_per_timestep[...] = _steps_per_timestep(velocities)
+        self.steps_until_next_steps[...] = self.countdown_reloads
+
+    @staticmethod
+    def from_targets(targets: list[Target]) -> "TargetStore":
+        """
+        Create a store from Target objects.
+
+        Parameters:
+            targets (list[Target]): The targets, their current positions become the original positions.
+
+        Returns:
+            TargetStore: A store of shape (len(targets),).
+        """
+        return TargetStore(
+            positions=np.array([target.position for target in targets], dtype=int).reshape(-1, 2),
+            rewards=[target.reward for target in targets],
+            velocities=[target.velocity for target in targets],
+            directions=[target.movement.direction_type.value for target in targets],
+            colors=np.array([target.color for target in targets], dtype=np.uint8).reshape(-1, 3),
+            random_start=[target.random_start for target in targets],
+        )
+
+    def __len__(self):
+        return len(self.positions)
+
+    def step(self, rng: np.random.Generator = None, size: int = None):
+        """
+        Move all targets according to their configuration for one timestep.
+        :param rng (optional): Random number generator for APPEAR targets with random_start
+        :param size (optional): Grid size for APPEAR targets with random_start
+        Without rng and size, APPEAR targets with random_start toggle like the other APPEAR targets.
+        """
+        moving = (self.steps_until_next_steps == 0) & (self.steps_per_timestep > 0)
+        self.steps_until_next_steps -= self.steps_until_next_steps > 0
+
+        appear = self.directions == DirectionType.APPEAR.value
+        steps = np.where(moving & ~appear, self.steps_per_timestep, 0)
+        self.positions += MOVEMENT_VECTORS[self.directions] * steps[..., np.newaxis]
+
+        # APPEAR targets toggle between their original position and (-1, -1), an even number of toggles cancels out
+        toggle = moving & appear & (self.steps_per_timestep % 2 == 1)
+        if rng is not None and size is not None:
+            random = moving & appear & self.random_start
+            toggle &= ~self.random_start
+            if random.any():
+                self.positions[random] = rng.integers(0, size, size=(int(random.sum()), 2))
+        at_origin = (self.positions == self.org_positions).all(axis=-1, keepdims=True)
+        np.copyto(
+            self.positions,
+            np.where(at_origin, -1, self.org_positions),
+            where=toggle[..., np.newaxis],
+        )
+
+        np.copyto(self.steps_until_next_steps, self.countdown_reloads, where=moving)
+
+    def reverse_directions(self, mask: np.ndarray = None):
+        """
+        Reverse the direction of the selected targets' movement.
+        :param mask (optional): Boolean array selecting the targets, all targets if None
+        """
+        if mask is None:
+            self.directions[...] = REVERSED_DIRECTIONS[self.directions]
+        else:
+            self.directions[mask] = REVERSED_DIRECTIONS[self.directions[mask]]
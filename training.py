@@ -0,0 +1,197 @@
+import functools
+import time
+
+import gymnasium as gym
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv, VecMonitor
+
+from Environments.actionRepeat import ActionRepeatWrapper
+from Environments.findTargetSB3VecEnv import FindTargetSB3VecEnv
+from Environments.sharedMemoryVecEnv import SharedMemoryVecEnv
+from profiling import instrument_env
+from recording import FrameRecorder, RecordFramesWrapper
+
+VEC_ENV_BACKENDS = ("dummy", "subproc", "shm", "batched")
+# the env_kwargs that the batched backend supports
+BATCHED_ENV_KWARGS = ("size", "render_mode", "info_mode", "max_episode_steps")
+
+
+def register_find_target_env(env_id: str = "FindTargetEnv-v0"):
+    """
+    Registers the solved FindTargetEnv under env_id, if nothing is registered under that id yet
+    (e.g. the students' own FindTargetEnv from Environments/__init__.py)
+    """
+    if env_id not in gym.registry:
+        gym.register(
+            id=env_id,
+            entry_point="Environments.findTargetEnv_final25:FindTargetEnv",
+            max_episode_steps=50,
+        )
+
+
+def _make_env(
+    env_id: str,
+    rank: int = 0,
+    seed: int | None = None,
+    profile: bool = False,
+    action_repeat: int = 1,
+    record: dict | None = None,
+    **env_kwargs,
+) -> gym.Env:
+    # runs in the worker processes, which do not inherit the registration of the main process
+    if env_id == "FindTargetEnv-v0":
+        register_find_target_env(env_id)
+    env = gym.make(env_id, **env_kwargs)
+    if hasattr(env.unwrapped, "set_time_limit"):
+        # info_mode "episode_end" needs the time limit to fill the info of truncated episode ends
+        env.unwrapped.set_time_limit(env.spec.max_episode_steps)
+    if seed is not None:
+        # the env itself is seeded by the first reset of the vectorized env
+        env.action_space.seed(seed + rank)
+    if action_repeat > 1:
+        env = ActionRepeatWrapper(env, repeat=action_repeat)
+    if profile:
+        # records into the profiler of the process that runs the env
+        instrument_env(env)
+    if record is not None:
+        # the recorder thread is started in the process that runs the env
+        record = dict(record)
+        record_every = record.pop("record_every", 1)
+        env = RecordFramesWrapper(env, FrameRecorder(**record), record_every=record_every)
+    return Monitor(env)
+
+
+def make_training_env(
+    env_id: str = "FindTargetEnv-v0",
+    num_envs: int = 1,
+    vec_env: str = "dummy",
+    seed: int | None = None,
+    env_kwargs: dict | None = None,
+    start_method: str | None = None,
+    num_workers: int | None = None,
+    profile: bool = False,
+    action_repeat: int = 1,
+    record: dict | None = None,
+) -> VecEnv:
+    """
+    Creates num_envs copies of an env for training.
+    Env i is reset with seed + i and its action space is seeded with seed + i, so a run is reproducible
+    for a given seed, independent of the backend and the number of worker processes.
+
+    :param env_id: The gymnasium id of the env
+    :param num_envs: Number of envs that are stepped in parallel
+    :param vec_env: "dummy" (all envs in this process), "subproc" (one process per env, observations are pickled),
+        "shm" (num_workers processes, observations in shared memory) or
+        "batched" (FindTargetSB3VecEnv, all grid worlds in one array, only for FindTargetEnv)
+    :param seed: The base seed of the envs
+    :param env_kwargs: Keyword arguments for gym.make, "batched" only supports the BATCHED_ENV_KWARGS
+    :param start_method: Start method of the worker processes ("subproc" and "shm")
+    :param num_workers: Number of worker processes ("shm"), defaults to the number of cores
+    :param profile: Instrument the envs for profiling.ProfilingCallback (in their worker processes)
+    :param action_repeat: Repeat every action this many env steps (see ActionRepeatWrapper), not for "batched"
+    :param record: Records the frames of the first env with recording.RecordFramesWrapper, not for "batched".
+        Keyword arguments of recording.FrameRecorder and record_every,
+        e.g. {"directory": "frames", "encoder": "npz", "record_every": 10}. The env needs render_mode="rgb_array"
+    :return: The vectorized env, wrapped with a Monitor so the episode statistics are logged
+    """
+    assert vec_env in VEC_ENV_BACKENDS
+    env_kwargs = env_kwargs or {}
+    if env_id == "FindTargetEnv-v0":
+        register_find_target_env(env_id)
+    if vec_env == "batched":
+        assert env_id.startswith("FindTargetEnv"), "the batched backend only supports FindTargetEnv"
+        assert action_repeat == 1, "the batched backend does not support action repeat"
+        assert record is None, "the batched backend does not support recording"
+        unsupported = set(env_kwargs) - set(BATCHED_ENV_KWARGS)
+        assert not unsupported, f"the batched backend does not support {sorted(unsupported)}"
+        env = FindTargetSB3VecEnv(
+            num_envs=num_envs,
+            size=env_kwargs.get("size", 5),
+            max_episode_steps=env_kwargs.get("max_episode_steps") or gym.spec(env_id).max_episode_steps or 50,
+            render_mode=env_kwargs.get("render_mode"),
+            info_mode=env_kwargs.get("info_mode", "step"),
+        )
+        env.seed(seed)
+        if profile:
+            instrument_env(env)
+        return VecMonitor(env)
+
+    vec_env_cls, vec_env_kwargs = DummyVecEnv, None
+    if vec_env == "subproc":
+        vec_env_cls, vec_env_kwargs = SubprocVecEnv, {"start_method": start_method}
+    elif vec_env == "shm":
+        vec_env_cls = SharedMemoryVecEnv
+        vec_env_kwargs = {"start_method": start_method, "num_workers": num_workers}
+    # like stable_baselines3's make_vec_env, but the envs know their rank, so only the first one records
+    env_fns = [
+        functools.partial(
+            _make_env,
+            env_id,
+            rank=rank,
+            seed=seed,
+            profile=profile,
+            action_repeat=action_repeat,
+            record=record if rank == 0 else None,
+            **env_kwargs,
+        )
+        for rank in range(num_envs)
+    ]
+    env = vec_env_cls(env_fns, **(vec_env_kwargs or {}))
+    env.seed(seed)
+    return env
+
+
+class ThroughputCallback(BaseCallback):
+    """
+    Measures how many env steps per second are collected.
+    Logs the throughput of the rollout phase (env + policy forward pass only) and the overall throughput
+    (including the gradient updates) as throughput/rollout_fps and throughput/total_fps.
+    """
+
+    def __init__(self, verbose: int = 0):
+        super().__init__(verbose)
+        self.rollout_time = 0.0
+        self.rollout_steps = 0
+        self._start_time = 0.0
+        self._rollout_start_time = 0.0
+        self._rollout_start_steps = 0
+        self._start_steps = 0
+
+    def _on_training_start(self) -> None:
+        self._start_time = time.perf_counter()
+        self._start_steps = self.num_timesteps
+
+    def _on_rollout_start(self) -> None:
+        self._rollout_start_time = time.perf_counter()
+        self._rollout_start_steps = self.num_timesteps
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self.rollout_time += time.perf_counter() - self._rollout_start_time
+        self.rollout_steps += self.num_timesteps - self._rollout_start_steps
+        self.logger.record("throughput/rollout_fps", self.rollout_fps)
+        self.logger.record("throughput/total_fps", self.total_fps)
+
+    @property
+    def rollout_fps(self) -> float:
+        """
+        :return: Env steps per second during rollout collection
+        """
+        return self.rollout_steps / max(self.rollout_time, 1e-9)
+
+    @property
+    def total_fps(self) -> float:
+        """
+        :return: Env steps per second since the start of training
+        """
+        return (self.num_timesteps - self._start_steps) / max(time.perf_counter() - self._start_time, 1e-9)
+
+    def _on_training_end(self) -> None:
+        if self.verbose >= 1:
+            print(
+                f"{self.num_timesteps - self._start_steps} env steps, "
+                f"rollout: {self.rollout_fps:.0f} steps/s, total: {self.total_fps:.0f} steps/s"
+            )
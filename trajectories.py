@@ -0,0 +1,335 @@
+"""
+Trajectory datasets for offline RL and behaviour cloning.
+
+A dataset is a directory of chunked, memory-mapped .npy files. Every episode is stored as consecutive rows:
+one row per transition (observation, action, reward, terminated, truncated) followed by one row with the
+final observation, so next_obs of a transition is always the observation of the next row.
+
+    directory/
+        index.json                   chunk size, number of rows and the dtype / shape of every field
+        episodes.npy                 (E, 2) first row and number of transitions of every finished episode
+        chunk_00000_obs.npy          (chunk_size, *obs shape)
+        chunk_00000_actions.npy      (chunk_size, *action shape)
+        chunk_00000_rewards.npy      (chunk_size,) float32
+        chunk_00000_terminated.npy   (chunk_size,) bool
+        chunk_00000_truncated.npy    (chunk_size,) bool
+        chunk_00000_valid.npy        (chunk_size,) bool, False for the final observation rows
+        ...
+
+Record with RecordTrajectoriesWrapper(env, TrajectoryRecorder("data/find_target")),
+read with TrajectoryDataset("data/find_target").minibatches(256).
+"""
+
+import json
+import os
+
+import gymnasium as gym
+import numpy as np
+
+FIELDS = ("obs", "actions", "rewards", "terminated", "truncated", "valid")
+
+
+class TrajectoryRecorder:
+    """
+    Appends transitions to a dataset directory. The chunk files are preallocated memory maps,
+    so recording a step only writes a few values into mapped memory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        observation_space: gym.spaces.Space,
+        action_space: gym.spaces.Space,
+        chunk_size: int = 65536,
+    ):
+        """
+
+        :param directory: The dataset directory, it is created if it does not exist.
+            Recording into an existing dataset appends to it (the spaces have to match)
+        :param observation_space: The observation space of the recorded env
+        :param action_space: The action space of the recorded env
+        :param chunk_size: Rows per chunk file
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.field_specs = {
+            "obs": (np.dtype(observation_space.dtype).str, list(observation_space.shape)),
+            "actions": (np.dtype(action_space.dtype).str, list(action_space.shape)),
+            "rewards": (np.dtype(np.float32).str, []),
+            "terminated": (np.dtype(bool).str, []),
+            "truncated": (np.dtype(bool).str, []),
+            "valid": (np.dtype(bool).str, []),
+        }
+        self.chunk_size = chunk_size
+        self.num_rows = 0
+        self.episodes = []
+
+        index_path = os.path.join(directory, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index["fields"] != {name: list(spec) for name, spec in self.field_specs.items()}:
+                raise ValueError(f"{directory} contains a dataset with different spaces")
+            self.chunk_size = index["chunk_size"]
+            self.num_rows = index["num_rows"]
+            self.episodes = np.load(os.path.join(directory, "episodes.npy")).tolist()
+
+        self._chunk = None
+        self._arrays = {}
+        self._episode_start = None
+        # whether the last recorded transition terminated or truncated the current episode
+        self._episode_finished = False
+        self._closed = False
+
+    @property
+    def num_transitions(self) -> int:
+        return int(sum(length for _, length in self.episodes))
+
+    def _next_row(self) -> int:
+        """
+        :return: The offset of the next row in the current chunk, a new chunk is opened when the current one is full
+        """
+        chunk, offset = divmod(self.num_rows, self.chunk_size)
+        if chunk != self._chunk:
+            self._open_chunk(chunk)
+        self.num_rows += 1
+        return offset
+
+    def _open_chunk(self, chunk: int):
+        self.flush()
+        self._arrays = {}
+        for name, (dtype, shape) in self.field_specs.items():
+            path = _chunk_path(self.directory, chunk, name)
+            if os.path.exists(path):
+                self._arrays[name] = np.load(path, mmap_mode="r+")
+            else:
+                self._arrays[name] = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=np.dtype(dtype), shape=(self.chunk_size, *shape)
+                )
+        self._chunk = chunk
+
+    def start_episode(self, obs):
+        """
+        Starts a new episode with its first observation, an unfinished episode is ended first
+        """
+        self.end_episode()
+        self._episode_start = self.num_rows
+        self._episode_finished = False
+        self._row = self._next_row()
+        self._arrays["obs"][self._row] = obs
+        self._arrays["valid"][self._row] = False
+
+    def add_step(self, action, reward: float, terminated: bool, truncated: bool, next_obs):
+        """
+        Records the transition from the last observation with action and the next observation
+        """
+        assert self._episode_start is not None, "start_episode has to be called first"
+        arrays, row = self._arrays, self._row
+        arrays["actions"][row] = action
+        arrays["rewards"][row] = reward
+        arrays["terminated"][row] = terminated
+        arrays["truncated"][row] = truncated
+        arrays["valid"][row] = True
+        self._row = self._next_row()
+        self._arrays["obs"][self._row] = next_obs
+        self._arrays["valid"][self._row] = False
+        self._episode_finished = terminated or truncated
+        if self._episode_finished:
+            self.end_episode()
+
+    def end_episode(self):
+        """
+        Ends and indexes the current episode. If it neither terminated nor was truncated (the recording stopped
+        or the env was reset early), its last transition is marked as truncated, so it is not treated as a
+        regular transition of a longer episode
+        """
+        if self._episode_start is None:
+            return
+        length = self.num_rows - 1 - self._episode_start
+        if length > 0:
+            if not self._episode_finished:
+                self._mark_truncated(self.num_rows - 2)
+            self.episodes.append([self._episode_start, length])
+        self._episode_start = None
+
+    def _mark_truncated(self, row: int):
+        chunk, offset = divmod(row, self.chunk_size)
+        if chunk != self._chunk:
+            # the final observation row of the episode started a new chunk
+            self._open_chunk(chunk)
+        self._arrays["truncated"][offset] = True
+
+    def flush(self):
+        """
+        Writes the mapped chunk and the index to disk
+        """
+        for array in self._arrays.values():
+            array.flush()
+        episodes = np.array(self.episodes, dtype=np.int64).reshape(-1, 2)
+        np.save(os.path.join(self.directory, "episodes.npy"), episodes)
+        index = {
+            "chunk_size": self.chunk_size,
+            "num_rows": self.num_rows,
+            "fields": {name: list(spec) for name, spec in self.field_specs.items()},
+        }
+        with open(os.path.join(self.directory, "index.json"), "w") as f:
+            json.dump(index, f)
+
+    def close(self):
+        """
+        Ends the current episode and writes everything to disk.
+        An episode that is still running is indexed, its last transition is marked as truncated
+        """
+        if self._closed:
+            return
+        self.end_episode()
+        self.flush()
+        self._arrays = {}
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordTrajectoriesWrapper(gym.Wrapper):
+    """
+    Records all transitions of an env with a TrajectoryRecorder
+    """
+
+    def __init__(self, env: gym.Env, recorder: TrajectoryRecorder | str, chunk_size: int = 65536):
+        """
+
+        :param env: The env to record
+        :param recorder: The recorder, or the dataset directory for a new recorder
+        :param chunk_size: Rows per chunk file, if a new recorder is created
+        """
+        super().__init__(env)
+        if isinstance(recorder, str):
+            recorder = TrajectoryRecorder(recorder, env.observation_space, env.action_space, chunk_size)
+        self.recorder = recorder
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.recorder.start_episode(obs)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.recorder.add_step(action, reward, terminated, truncated, obs)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.recorder.close()
+        super().close()
+
+
+def _chunk_path(directory: str, chunk: int, name: str) -> str:
+    return os.path.join(directory, f"chunk_{chunk:05d}_{name}.npy")
+
+
+class TrajectoryDataset:
+    """
+    Reads a dataset written by TrajectoryRecorder. The chunk files are memory-mapped read-only,
+    only the rows of the requested minibatches are read from disk.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+        self.chunk_size = index["chunk_size"]
+        self.num_rows = index["num_rows"]
+        self.fields = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in index["fields"].items()}
+        self.episodes = np.load(os.path.join(directory, "episodes.npy"))
+        self.num_chunks = -(-self.num_rows // self.chunk_size)
+        self._arrays = [
+            {name: np.load(_chunk_path(directory, chunk, name), mmap_mode="r") for name in FIELDS}
+            for chunk in range(self.num_chunks)
+        ]
+
+    @property
+    def num_transitions(self) -> int:
+        return int(self.episodes[:, 1].sum())
+
+    @property
+    def num_episodes(self) -> int:
+        return len(self.episodes)
+
+    def transition_rows(self, chunks=None) -> np.ndarray:
+        """
+        :param chunks: Only the transitions that start in these chunks, defaults to all
+        :return: The global row of every transition of a finished episode
+        """
+        starts, lengths = self.episodes[:, 0], self.episodes[:, 1]
+        if chunks is not None:
+            first_chunk = starts // self.chunk_size
+            in_chunks = np.isin(first_chunk, chunks)
+            # episodes that span a chunk boundary belong to the chunk they start in
+            starts, lengths = starts[in_chunks], lengths[in_chunks]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(starts, lengths) + offsets
+
+    def gather(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Reads one field of the given global rows
+        """
+        dtype, shape = self.fields[name]
+        out = np.empty((len(rows), *shape), dtype=dtype)
+        chunks, offsets = np.divmod(rows, self.chunk_size)
+        for chunk in np.unique(chunks):
+            selected = chunks == chunk
+            out[selected] = self._arrays[chunk][name][offsets[selected]]
+        return out
+
+    def get_batch(self, rows: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        :param rows: Global rows of transitions
+        :return: obs, actions, rewards, next_obs, terminated, truncated of the transitions
+        """
+        return {
+            "obs": self.gather("obs", rows),
+            "actions": self.gather("actions", rows),
+            "rewards": self.gather("rewards", rows),
+            "next_obs": self.gather("obs", rows + 1),
+            "terminated": self.gather("terminated", rows),
+            "truncated": self.gather("truncated", rows),
+        }
+
+    def minibatches(
+        self,
+        batch_size: int,
+        shuffle: bool = True,
+        chunks_per_shuffle: int = 4,
+        drop_last: bool = False,
+        seed: int | None = None,
+    ):
+        """
+        Streams minibatches of transitions of finished episodes.
+        Shuffling is block-wise: the chunks are visited in random order and the transitions of
+        chunks_per_shuffle chunks at a time are shuffled together, so memory stays O(chunks_per_shuffle * chunk_size)
+        and every minibatch only touches a few chunk files.
+        :param batch_size: Transitions per minibatch
+        :param shuffle: Whether to shuffle, otherwise the transitions are returned in recording order
+        :param chunks_per_shuffle: Number of chunks whose transitions are shuffled together
+        :param drop_last: Drop the last incomplete minibatch
+        :param seed: Seed of the shuffling
+        :return: Iterator over batches as returned by get_batch
+        """
+        rng = np.random.default_rng(seed)
+        chunk_order = rng.permutation(self.num_chunks) if shuffle else np.arange(self.num_chunks)
+        remainder = np.zeros(0, dtype=np.int64)
+        for i in range(0, self.num_chunks, chunks_per_shuffle):
+            rows = np.concatenate([remainder, self.transition_rows(chunk_order[i : i + chunks_per_shuffle])])
+            if shuffle:
+                rng.shuffle(rows)
+            num_full = len(rows) // batch_size * batch_size
+            for start in range(0, num_full, batch_size):
+                batch_rows = rows[start : start + batch_size]
+                # sorted rows read the memory map sequentially, the order within a batch does not matter
+                yield self.get_batch(np.sort(batch_rows) if shuffle else batch_rows)
+            remainder = rows[num_full:]
+        if len(remainder) > 0 and not drop_last:
+            yield self.get_batch(np.sort(remainder) if shuffle else remainder)